@@ -5,9 +5,13 @@ Anthropic Claude API 异步客户端封装
 """
 import asyncio
 import json
+import time
 from typing import AsyncGenerator, List, Dict, Optional, Any
 import httpx
 
+from scripts.metrics import ERRORS
+from scripts.tracing import record_span
+
 
 class AnthropicClient:
     """Anthropic API 异步客户端"""
@@ -35,6 +39,19 @@ class AnthropicClient:
         }
         # system prompt 支持状态：None=未检测，True=支持，False=不支持
         self.support_system_prompt = support_system_prompt
+        # 连接池在第一次请求时创建，同一客户端的请求复用连接（超时按请求指定）
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _http_client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=120.0)
+        return self._http
+
+    async def aclose(self) -> None:
+        """关闭连接池（客户端不再使用时调用）"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
     def _convert_messages(
         self,
@@ -105,6 +122,47 @@ class AnthropicClient:
 
         return system_prompt, cleaned_messages
 
+    async def warm_up(self, timeout: float = 10.0) -> int:
+        """
+        提前建立到上游的连接（GET /v1/models，不消耗 token），连接留在连接池中供随后的请求复用
+
+        :return: 上游状态码（第三方代理未实现该接口时可能为 404，连接同样已建立）
+        """
+        response = await self._http_client().get(
+            f"{self.base_url}/v1/models", params={"limit": 1}, headers=self.headers, timeout=timeout)
+        return response.status_code
+
+    async def probe(self, model: str, timeout: float = 15.0) -> str:
+        """
+        低成本验证 API Key 与模型是否可用
+
+        先请求 GET /v1/models/{model}（不消耗 token）；第三方代理不支持该接口时，
+        退回到 max_tokens=1 的非流式请求。
+
+        :return: 使用的验证方式（"models" / "message"）
+        :raises httpx.HTTPStatusError: 上游返回错误
+        """
+        http_client = self._http_client()
+        response = await http_client.get(f"{self.base_url}/v1/models/{model}", headers=self.headers, timeout=timeout)
+        if response.status_code < 400:
+            return "models"
+        if response.status_code in (401, 403):
+            response.raise_for_status()
+        # 404 可能是代理未实现该接口，也可能是模型不存在，交给实际请求判断
+        response = await http_client.post(
+            f"{self.base_url}/v1/messages",
+            headers=self.headers,
+            json={"model": model, "max_tokens": 1, "messages": [{"role": "user", "content": "Hi"}]},
+            timeout=timeout,
+        )
+        if response.status_code >= 400:
+            raise httpx.HTTPStatusError(
+                f"HTTP {response.status_code}: {response.text}",
+                request=response.request,
+                response=response,
+            )
+        return "message"
+
     async def send_message_stream(
         self,
         model: str,
@@ -166,77 +224,84 @@ class AnthropicClient:
 
         # 发送异步请求
         try:
-            async with httpx.AsyncClient(timeout=120.0) as http_client:
-                async with http_client.stream(
-                    "POST",
-                    f"{self.base_url}/v1/messages",
-                    headers=self.headers,
-                    json=payload,
-                ) as response:
+            http_client = self._http_client()
+            request_started = time.perf_counter()
+            async with http_client.stream(
+                "POST",
+                f"{self.base_url}/v1/messages",
+                headers=self.headers,
+                json=payload,
+            ) as response:
+                # 上游响应头耗时（连接 + 排队 + 处理 prompt）
+                record_span("anthropic_request", request_started, status=response.status_code, model=model)
+                if debug:
+                    print(f"[DEBUG] Response status: {response.status_code}")
+                    print(f"[DEBUG] Response headers: {dict(response.headers)}")
+
+                # 检查错误
+                if response.status_code >= 400:
+                    error_body = await response.aread()
+                    error_text = error_body.decode('utf-8')
                     if debug:
-                        print(f"[DEBUG] Response status: {response.status_code}")
-                        print(f"[DEBUG] Response headers: {dict(response.headers)}")
+                        print(f"[DEBUG] Error response: {error_text}")
 
-                    # 检查错误
-                    if response.status_code >= 400:
-                        error_body = await response.aread()
-                        error_text = error_body.decode('utf-8')
+                    # 检测是否是 system prompt 不支持的错误
+                    if "system prompt not allowed" in error_text.lower():
                         if debug:
-                            print(f"[DEBUG] Error response: {error_text}")
-
-                        # 检测是否是 system prompt 不支持的错误
-                        if "system prompt not allowed" in error_text.lower():
+                            print("[DEBUG] 检测到 API 不支持 system prompt，自动重试...")
+                        # 标记为不支持
+                        self.support_system_prompt = False
+                        # 递归重试（这次会将 system 合并到消息中）
+                        async for chunk in self.send_message_stream(
+                            model=model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            top_p=top_p,
+                            top_k=top_k,
+                            debug=debug
+                        ):
+                            yield chunk
+                        return  # 重试成功，退出当前函数
+
+                    ERRORS.inc(type=f"http_{response.status_code}", upstream="anthropic")
+                    raise httpx.HTTPStatusError(
+                        f"HTTP {response.status_code}: {error_text}",
+                        request=response.request,
+                        response=response
+                    )
+
+                response.raise_for_status()
+
+                # 流式处理 SSE 响应
+                async for line in response.aiter_lines():
+                    line = line.strip()
+
+                    # 跳过空行和注释行
+                    if not line or line.startswith(":"):
+                        continue
+
+                    # 解析 SSE 格式
+                    if line.startswith("data: "):
+                        data_str = line[6:]  # 移除 "data: " 前缀
+
+                        # 检查是否结束
+                        if data_str == "[DONE]":
+                            break
+
+                        try:
+                            data = json.loads(data_str)
                             if debug:
-                                print("[DEBUG] 检测到 API 不支持 system prompt，自动重试...")
-                            # 标记为不支持
-                            self.support_system_prompt = False
-                            # 递归重试（这次会将 system 合并到消息中）
-                            async for chunk in self.send_message_stream(
-                                model=model,
-                                messages=messages,
-                                max_tokens=max_tokens,
-                                temperature=temperature,
-                                top_p=top_p,
-                                top_k=top_k,
-                                debug=debug
-                            ):
-                                yield chunk
-                            return  # 重试成功，退出当前函数
-
-                        raise httpx.HTTPStatusError(
-                            f"HTTP {response.status_code}: {error_text}",
-                            request=response.request,
-                            response=response
-                        )
-
-                    response.raise_for_status()
-
-                    # 流式处理 SSE 响应
-                    async for line in response.aiter_lines():
-                        line = line.strip()
-
-                        # 跳过空行和注释行
-                        if not line or line.startswith(":"):
+                                print(f"[DEBUG] Received chunk: {data.get('type', 'unknown')}")
+                            yield data
+                        except json.JSONDecodeError as e:
+                            if debug:
+                                print(f"[DEBUG] JSON decode error: {e}, data: {data_str[:100]}")
                             continue
-
-                        # 解析 SSE 格式
-                        if line.startswith("data: "):
-                            data_str = line[6:]  # 移除 "data: " 前缀
-
-                            # 检查是否结束
-                            if data_str == "[DONE]":
-                                break
-
-                            try:
-                                data = json.loads(data_str)
-                                if debug:
-                                    print(f"[DEBUG] Received chunk: {data.get('type', 'unknown')}")
-                                yield data
-                            except json.JSONDecodeError as e:
-                                if debug:
-                                    print(f"[DEBUG] JSON decode error: {e}, data: {data_str[:100]}")
-                                continue
         except httpx.HTTPError as e:
+            if not isinstance(e, httpx.HTTPStatusError):
+                # 连接失败 / 读取超时等（HTTP 状态错误已在上面计数）
+                ERRORS.inc(type=type(e).__name__, upstream="anthropic")
             if debug:
                 print(f"[DEBUG] HTTP error: {e}")
             raise
@@ -249,6 +314,7 @@ async def anthropic_stream_to_sse(
     temperature: float = 0.8,
     max_tokens: int = 4096,
     debug: bool = False,
+    stats: Optional[Dict[str, Any]] = None,
 ) -> AsyncGenerator[str, None]:
     """
     将 Anthropic 流式响应转换为与 OpenAI 兼容的 SSE 格式
@@ -259,8 +325,10 @@ async def anthropic_stream_to_sse(
     :param temperature: 温度参数
     :param max_tokens: 最大token数
     :param debug: 是否输出调试信息
+    :param stats: 可选字典，写入上游返回的用量（input_tokens / output_tokens）
     :yield: SSE 格式的字符串
     """
+    stats = stats if stats is not None else {}
     try:
         async for chunk in client.send_message_stream(
             model=model,
@@ -282,6 +350,17 @@ async def anthropic_stream_to_sse(
                         yield f"data: {payload}\n\n"
                         await asyncio.sleep(0.001)
 
+            elif event_type == "message_start":
+                usage = (chunk.get("message") or {}).get("usage") or {}
+                if "input_tokens" in usage:
+                    stats["input_tokens"] = usage["input_tokens"]
+
+            elif event_type == "message_delta":
+                # 用量为累计值，以最后一次为准
+                usage = chunk.get("usage") or {}
+                if "output_tokens" in usage:
+                    stats["output_tokens"] = usage["output_tokens"]
+
             elif event_type == "message_stop":
                 # 消息结束
                 yield 'data: {"event":"[DONE]"}\n\n'
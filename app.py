@@ -2,23 +2,23 @@ import asyncio
 import json
 import logging
 import os
+import re
+import time
 from datetime import datetime
+from functools import lru_cache
 from uuid import uuid4
-from typing import AsyncGenerator, List, Optional, Dict, Any
+from typing import AsyncGenerator, List, Optional, Dict, Any, Tuple
 
 import pytz
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from openai import AsyncOpenAI, OpenAIError
 from pydantic import BaseModel
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
+from starlette.middleware.gzip import GZipMiddleware
 from pathlib import Path
 
 # 导入 Anthropic 客户端
-from AnthropicClient import AnthropicClient, anthropic_stream_to_sse
 
 # 导入 dotenv
 try:
@@ -29,15 +29,66 @@ except ImportError:
 
 # 录制与转码工具（Playwright + FFmpeg）
 try:
-    from scripts.record_media import load_page_and_record, run_ffmpeg, which
+    from scripts.record_media import load_page_and_record, prewarm_browser, run_ffmpeg, which
 except Exception:
     load_page_and_record = None
+    prewarm_browser = None
     run_ffmpeg = None
     which = None
 
+try:
+    from scripts.segmented_record import record_segmented
+except Exception:
+    record_segmented = None
+
+# 渐进式 HLS 输出（录制过程中即可播放）
+try:
+    from scripts.live_stream import LiveEncoder, finalize_playlist
+except Exception:
+    LiveEncoder = None
+    finalize_playlist = None
+
+# 录制时的网络拦截（离线渲染节点）
+from scripts.network_policy import policy_from_env
+
+# 录制前的 HTML 静态预检
+from scripts.html_preflight import analyze_html, repair_html
+
+# 封面图 / 预览雪碧图 / WebVTT 缩略图
+from scripts.thumbnails import ThumbnailPlan, probe_duration, transcode_args
+
+# 运行指标（GET /metrics）与请求级追踪（X-Trace-Id / Server-Timing）
+from scripts import log_utils, metrics, profiling, tracing
+
+# 产物保留策略（后台清理 .recordings / output / .generated_html）
+from scripts.retention import RetentionManager, default_policies
+
 # 导入线程模块（用于配置管理）
 import threading
 
+# 模型配置档（profiles.json）与上游客户端池
+from scripts.model_profiles import (
+    DEFAULT_PROFILE, ClientPool, FileWatcher, ModelProfile, close_client, load_profiles_file, parse_profiles,
+)
+
+# /test-config 验证结果缓存、并发合并与限流
+from scripts.config_check import ProbeCache, RateLimited, RateLimiter, probe_key
+
+# 多 worker 共享状态（配置、录制任务记录、缓存），默认 SQLite WAL
+from scripts.shared_state import ChangeFeed, open_store, worker_id
+
+# 产物目录（生成 / 录制产物的索引与来源关系），供 GET /artifacts 查询
+from scripts.catalog import extract_html, file_entry, new_id, open_catalog, sha256_text
+
+# 静态资源：构建产物（哈希文件名 + br/gz 预压缩，python -m scripts.static_assets）
+from scripts.static_assets import PrecompressedStaticFiles
+
+# 录制产物文件服务（Range、强 ETag、条件请求）
+from scripts.media_files import media_files
+
+# 可续传的生成流（事件编号、环形缓冲、Last-Event-ID 重放）
+from scripts.generation_streams import GenerationStreams, ReplayUnavailable, parse_last_event_id
+
 # -----------------------------------------------------------------------
 # 0. 配置
 # -----------------------------------------------------------------------
@@ -51,6 +102,7 @@ class ConfigManager:
     _instance = None
     _config_path = "credentials.json"
     _env_config_path = ".env"
+    _profiles_path = os.getenv("PROFILES_PATH", "profiles.json")
 
     def __new__(cls):
         if cls._instance is None:
@@ -63,10 +115,17 @@ class ConfigManager:
             return
         self._initialized = True
         self._lock = threading.Lock()
+        self._file_profiles: Dict[str, ModelProfile] = {}
+        self._profiles: Dict[str, ModelProfile] = {}
+        self._default_profile = DEFAULT_PROFILE
         self.load_config()
+        # 配置文件按 mtime 热加载（最多每 2 秒检查一次）
+        self._watcher = FileWatcher(lambda: (self._env_config_path, self._config_path, self._profiles_path))
+        # 其他 worker 通过设置页保存的配置
+        self._feed = ChangeFeed(shared_store, ("config",))
 
     def load_config(self):
-        """加载配置，优先使用 .env，其次使用 credentials.json"""
+        """加载配置，优先使用设置页保存的配置（共享状态），其次 .env，最后 credentials.json"""
         # 创建局部logger避免初始化顺序问题
         import logging
         config_logger = logging.getLogger("ai_animation_config")
@@ -80,13 +139,25 @@ class ConfigManager:
         if not api_key or api_key == "sk-REPLACE_ME":
             try:
                 if os.path.exists(self._config_path):
-                    creds = json.load(open(self._config_path))
+                    with open(self._config_path, "r", encoding="utf-8") as f:
+                        creds = json.load(f)
                     api_key = creds.get("API_KEY", api_key)
                     base_url = creds.get("BASE_URL", base_url)
                     model = creds.get("MODEL", model)
             except Exception as e:
                 config_logger.error(f"加载 credentials.json 失败: {e}")
 
+        # 设置页保存的配置对所有 worker 生效
+        try:
+            stored = shared_store.get("config", "settings")
+        except Exception as e:
+            stored = None
+            config_logger.error(f"读取共享配置失败: {e}")
+        if stored:
+            api_key = stored.get("API_KEY") or api_key
+            base_url = stored.get("BASE_URL", base_url)
+            model = stored.get("MODEL") or model
+
         # 设置默认值
         self.API_KEY = api_key or ""
         self.BASE_URL = base_url or ""
@@ -101,23 +172,80 @@ class ConfigManager:
         else:
             config_logger.warning("未找到有效的 API Key 配置")
 
+        self._load_profiles(config_logger)
+
+    def _load_profiles(self, config_logger: logging.Logger):
+        """合并 .env / credentials.json 的默认配置与 profiles.json，整体替换配置快照"""
+        fallback = ModelProfile(DEFAULT_PROFILE, self.MODEL, self.API_KEY, self.BASE_URL, label="默认")
+        default_name = self._default_profile
+        try:
+            data = load_profiles_file(Path(self._profiles_path))
+            if data is None:
+                self._file_profiles, default_name = {}, DEFAULT_PROFILE
+            else:
+                self._file_profiles, default_name = parse_profiles(data, fallback)
+                config_logger.info(f"已加载配置档: {', '.join(self._file_profiles)}（默认: {default_name}）")
+        except (OSError, ValueError) as e:
+            # 格式错误时保留上一次成功加载的配置档
+            config_logger.error(f"加载 {self._profiles_path} 失败，沿用之前的配置档: {e}")
+
+        profiles = {DEFAULT_PROFILE: fallback, **self._file_profiles}
+        with self._lock:
+            self._profiles = profiles
+            self._default_profile = default_name if default_name in profiles else DEFAULT_PROFILE
+        client_pool.retain(profiles)
+
+    def _refresh(self):
+        """配置文件或共享配置变化时重新加载（节流，请求路径上通常只有一次时间比较）"""
+        now = time.monotonic()
+        files_changed = self._watcher.changed(now)
+        if self._feed.poll(now) or files_changed:
+            self.reload_config()
+
+    def resolve(self, profile: Optional[str] = None, model: Optional[str] = None) -> ModelProfile:
+        """
+        解析请求使用的配置档：profile 为空时使用默认配置档；指定 model 时沿用配置档的凭据只替换模型
+
+        :raises ValueError: 配置档不存在
+        """
+        self._refresh()
+        with self._lock:
+            profiles, default_name = self._profiles, self._default_profile
+        name = profile or default_name
+        selected = profiles.get(name)
+        if selected is None:
+            raise ValueError(f"未知的配置档: {name}（可选: {', '.join(profiles)}）")
+        if model and model != selected.model:
+            return selected.with_model(model)
+        return selected
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        self._refresh()
+        with self._lock:
+            profiles, default_name = self._profiles, self._default_profile
+        return [{**p.public(), "default": name == default_name} for name, p in profiles.items()]
+
     def save_env_config(self, api_key: str, base_url: str, model: str):
-        """保存配置到 .env 文件"""
+        """保存配置到共享状态（立即对所有 worker 生效）与 .env 文件（重启后生效）"""
         import logging
         config_logger = logging.getLogger("ai_animation_config")
         try:
-            # 创建或更新 .env 文件
-            env_vars = []
-
-            # 读取现有配置
+            shared_store.put("config", "settings", {"API_KEY": api_key, "BASE_URL": base_url, "MODEL": model})
+        except Exception as e:
+            config_logger.error(f"保存共享配置失败: {e}")
+            return False
+        try:
+            # 读取现有配置（去掉将被覆盖的三项）
+            existing_vars = {}
             if os.path.exists(self._env_config_path):
                 with open(self._env_config_path, 'r') as f:
-                    existing_vars = {}
                     for line in f:
                         line = line.strip()
                         if '=' in line and not line.startswith('#'):
                             key, _ = line.split('=', 1)
                             existing_vars[key] = line
+            for key in ("API_KEY", "BASE_URL", "MODEL"):
+                existing_vars.pop(key, None)
 
             # 更新或添加配置
             env_vars = list(existing_vars.values())
@@ -125,11 +253,13 @@ class ConfigManager:
             env_vars.append(f"BASE_URL={base_url}")
             env_vars.append(f"MODEL={model}")
 
-            # 写入文件
-            with open(self._env_config_path, 'w') as f:
+            # 先写临时文件再替换，其他 worker 不会读到写了一半的 .env
+            tmp_path = f"{self._env_config_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
                 f.write("# API 配置 - 不要提交到版本控制\n")
                 f.write("\n".join(env_vars))
                 f.write("\n")
+            os.replace(tmp_path, self._env_config_path)
 
             config_logger.info(".env 配置文件已更新")
             return True
@@ -145,6 +275,9 @@ class ConfigManager:
         if load_dotenv:
             load_dotenv(override=True)
         self.load_config()
+        if hasattr(self, "_watcher"):
+            self._watcher.reset()
+            self._feed.mark_seen()
         config_logger.info("配置重新加载完成")
 
     def get_config(self) -> Dict[str, str]:
@@ -153,13 +286,37 @@ class ConfigManager:
             "API_KEY": "****" if self.API_KEY else "",
             "BASE_URL": self.BASE_URL,
             "MODEL": self.MODEL,
-            "HAS_API_KEY": bool(self.API_KEY and self.API_KEY != "sk-REPLACE_ME")
+            "HAS_API_KEY": bool(self.API_KEY and self.API_KEY != "sk-REPLACE_ME"),
+            "DEFAULT_PROFILE": self._default_profile,
+            "PROFILES": self.list_profiles(),
         }
 
     def get_api_key(self) -> str:
         """获取 API Key（用于实际请求）"""
         return self.API_KEY
 
+def _openai_client(api_key: str, base_url: str):
+    # openai SDK 导入约 0.5 秒，首次创建客户端时才导入（不影响服务冷启动）
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=api_key, base_url=base_url or None)
+
+# 共享状态后端（STATE_URL），数据库在第一次写入时创建
+shared_store = open_store()
+
+# 产物目录（CATALOG_PATH），数据库在第一次写入时创建
+catalog = open_catalog()
+
+def _anthropic_client(api_key: str, base_url: str):
+    # AnthropicClient 依赖 httpx（导入约数十毫秒），同样在首次创建客户端时才导入
+    from AnthropicClient import AnthropicClient
+    return AnthropicClient(api_key=api_key, base_url=base_url if base_url else "https://api.anthropic.com")
+
+# 上游客户端按凭据复用（AsyncOpenAI / AnthropicClient 自带连接池，不再每个请求新建）
+client_pool = ClientPool({
+    "anthropic": _anthropic_client,
+    "openai": _openai_client,
+})
+
 # 创建全局配置管理器实例
 config_manager = ConfigManager()
 
@@ -173,28 +330,16 @@ def setup_logger():
     if logger.handlers:
         return logger
 
-    # 日志格式
-    log_format = logging.Formatter(
-        fmt='%(asctime)s [%(levelname)s] %(name)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+    # 控制台与文件写入在后台线程完成（QueueHandler/QueueListener），按 Asia/Shanghai 日期切换文件
+    # LOG_JSON=1 时文件输出为 JSON 行；LOG_BACKUP_DAYS>0 时删除更早的日志
+    file_handler = log_utils.setup_queued_logging(
+        logger,
+        Path(os.getenv("LOG_DIR", "logs")),
+        json_lines=os.getenv("LOG_JSON", "0") == "1",
+        backup_days=int(os.getenv("LOG_BACKUP_DAYS", "0")),
+        filters=[tracing.TraceIdFilter()],
     )
-
-    # 控制台处理器
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(log_format)
-    logger.addHandler(console_handler)
-
-    # 创建日志目录
-    log_dir = Path("logs")
-    log_dir.mkdir(parents=True, exist_ok=True)
-
-    # 文件处理器 - 按日期命名
-    log_file = log_dir / f"app_{datetime.now(shanghai_tz).strftime('%Y%m%d')}.log"
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(log_format)
-    logger.addHandler(file_handler)
+    log_file = file_handler.baseFilename
 
     logger.info("=" * 60)
     logger.info("日志系统初始化完成")
@@ -219,43 +364,129 @@ def is_anthropic_model(model_name: str) -> bool:
     """判断是否是 Anthropic Claude 模型"""
     return "claude" in model_name.lower()
 
-# 客户端初始化（延迟初始化，支持动态配置）
-anthropic_client = None
-openai_client = None
-
-def get_clients():
-    """动态获取客户端实例，支持配置更新"""
-    global anthropic_client, openai_client
-
-    # 重新获取配置
-    api_key = config_manager.get_api_key()
-    base_url = config_manager.BASE_URL
-    model = config_manager.MODEL
+def get_clients(profile: Optional[ModelProfile] = None):
+    """获取配置档对应的客户端（从客户端池复用），profile 为空时使用默认配置档"""
+    profile = profile or config_manager.resolve()
 
     # 如果没有有效的 API_KEY，返回 None
-    if not api_key or api_key == "sk-REPLACE_ME":
-        logger.warning("未配置有效的 API_KEY")
+    if not profile.has_api_key:
+        logger.warning(f"配置档 {profile.name} 未配置有效的 API_KEY")
         return None, None, None
 
-    # 根据模型类型创建客户端
-    if is_anthropic_model(model):
-        anthropic_client = AnthropicClient(
-            api_key=api_key,
-            base_url=base_url if base_url else "https://api.anthropic.com"
-        )
-        openai_client = None
-        logger.info(f"使用 Anthropic 接口，模型: {model}")
-        return anthropic_client, None, model
+    # 根据模型类型选择客户端
+    if is_anthropic_model(profile.model):
+        logger.info(f"使用 Anthropic 接口，配置档: {profile.name}，模型: {profile.model}")
+        return client_pool.get("anthropic", profile.api_key, profile.base_url), None, profile.model
     else:
-        openai_client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
-        anthropic_client = None
-        logger.info(f"使用 OpenAI 兼容接口，模型: {model}")
-        return None, openai_client, model
+        logger.info(f"使用 OpenAI 兼容接口，配置档: {profile.name}，模型: {profile.model}")
+        return None, client_pool.get("openai", profile.api_key, profile.base_url), profile.model
+
+@lru_cache(maxsize=None)
+def get_templates():
+    """页面模板（首次渲染时才导入 Jinja2）"""
+    from fastapi.templating import Jinja2Templates
+    templates = Jinja2Templates(directory="templates")
+    templates.env.globals["static_url"] = static_files.url_for
+    return templates
+
+# 产物清理：RETENTION_ENABLED=0 关闭，RETENTION_DRY_RUN=1 仅记录不删除
+# 多 worker 时只有持有租约的 worker 执行清理；进行中的录制任务（可能属于其他 worker）不会被删除
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))
+retention_manager = RetentionManager(
+    default_policies(),
+    interval=RETENTION_INTERVAL,
+    dry_run=os.getenv("RETENTION_DRY_RUN", "0") == "1",
+    logger=logger,
+    leader=lambda: shared_store.acquire_lease("retention", worker_id(), RETENTION_INTERVAL + 300),
+    on_delete=catalog.mark_deleted,
+)
+
+# 渐进式录制任务：job_id -> 状态（进程内保存本 worker 的任务，仅保留最近 RECORD_JOBS_MAX 个）；
+# 公开字段同时写入共享状态，任意 worker 都能查询
+RECORD_JOBS_MAX = 200
+RECORD_JOBS_NAMESPACE = "record_jobs"
+record_jobs: Dict[str, Dict[str, Any]] = {}
+
+
+def _publish_job(job: Dict[str, Any], **extra: Any) -> None:
+    try:
+        shared_store.put(RECORD_JOBS_NAMESPACE, job["job_id"], {
+            **{k: v for k, v in job.items() if not k.startswith("_")}, "worker": worker_id(), **extra})
+    except Exception as e:
+        logger.warning("[record_media] 写入共享任务记录失败: %s", e)
+
+
+def _shared_recording_paths() -> List[Path]:
+    """所有 worker 进行中的渐进式录制任务的输出目录"""
+    jobs = shared_store.items(RECORD_JOBS_NAMESPACE)
+    return [Path("output") / job_id for job_id, job in jobs.items() if job.get("status") == "recording"]
+
+
+retention_manager.add_protected_provider(_shared_recording_paths)
+
+# 生成流：客户端断开后上游继续生成 GENERATION_RESUME_GRACE 秒，期间可用 Last-Event-ID 续传
+generation_streams = GenerationStreams(
+    max_events=int(os.getenv("GENERATION_REPLAY_EVENTS", "8192")),
+    grace_seconds=float(os.getenv("GENERATION_RESUME_GRACE", "30")),
+    cancelled_event=f"data: {json.dumps({'error': '生成已取消：连接断开后未及时续传'}, ensure_ascii=False)}\n\n",
+    logger=logger,
+)
+
+# 后台预热：PREWARM=1（全部）或逗号分隔的 browser / llm，默认关闭
+PREWARM_TARGETS = ("browser", "llm")
+prewarm_tasks: set = set()
+
+
+def prewarm_targets() -> List[str]:
+    value = os.getenv("PREWARM", "").strip().lower()
+    if value in ("", "0", "false", "no"):
+        return []
+    if value in ("1", "true", "yes", "all"):
+        return list(PREWARM_TARGETS)
+    return [t for t in (v.strip() for v in value.split(",")) if t in PREWARM_TARGETS]
+
+
+async def _prewarm_llm() -> str:
+    """创建默认配置档的客户端（导入 SDK），再用模型列表接口建立连接（不消耗 token）"""
+    profile = config_manager.resolve()
+    if not profile.has_api_key:
+        return "skipped: 未配置 API Key"
+    if is_anthropic_model(profile.model):
+        # AnthropicClient 的连接池按客户端复用，建立的连接留给随后的请求
+        client = await asyncio.to_thread(client_pool.get, "anthropic", profile.api_key, profile.base_url)
+        async with client_pool.lease(client):
+            status = await client.warm_up()
+        return f"connection (HTTP {status})"
+    client = await asyncio.to_thread(client_pool.get, "openai", profile.api_key, profile.base_url)
+    # with_options 复制的客户端共用同一连接池，建立的连接留给随后的请求复用
+    async with client_pool.lease(client):
+        await client.with_options(timeout=10.0, max_retries=0).models.list()
+    return "connection"
+
+
+async def prewarm(targets: List[str], delay: float = 1.0) -> None:
+    """
+    服务开始接受请求后在后台执行，失败只记录日志
+
+    startup 事件完成后 uvicorn 才开始监听，这里先等待 delay 秒，避免与启动过程争抢 CPU。
+    """
+    await asyncio.sleep(delay)
+    for target in targets:
+        started = time.perf_counter()
+        try:
+            if target == "browser":
+                if prewarm_browser is None or not await prewarm_browser():
+                    result = "skipped: 未安装 Playwright"
+                else:
+                    result = "ok"
+            else:
+                result = await _prewarm_llm()
+            logger.info("预热 %s 完成（%s），耗时 %.0fms", target, result, (time.perf_counter() - started) * 1000)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("预热 %s 失败（不影响正常请求）: %s", target, e)
 
-templates = Jinja2Templates(directory="templates")
 
 # -----------------------------------------------------------------------
 # 1. FastAPI 初始化
@@ -270,6 +501,20 @@ async def startup_event():
     logger.info(f"FastAPI 版本: {FastAPI.__version__ if hasattr(FastAPI, '__version__') else 'unknown'}")
     logger.info(f"配置的模型: {MODEL}")
     logger.info(f"API Base URL: {BASE_URL if BASE_URL else '默认'}")
+    for directory in (".recordings", "output"):
+        try:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"创建目录 {directory} 失败: {str(e)}")
+    if os.getenv("RETENTION_ENABLED", "1") != "0":
+        retention_manager.start()
+        logger.info("产物清理任务已启动，间隔: %ss", retention_manager.interval)
+    targets = prewarm_targets()
+    if targets:
+        task = asyncio.create_task(prewarm(targets, float(os.getenv("PREWARM_DELAY", "1"))))
+        prewarm_tasks.add(task)
+        task.add_done_callback(prewarm_tasks.discard)
+        logger.info("后台预热已安排: %s", ", ".join(targets))
     logger.info("=" * 60)
 
 # 应用关闭事件
@@ -277,34 +522,83 @@ async def startup_event():
 async def shutdown_event():
     logger.info("=" * 60)
     logger.info("应用正在关闭...")
+    for task in list(prewarm_tasks):
+        task.cancel()
+    generation_streams.cancel_all()
+    retention_manager.stop()
+    try:
+        shared_store.release_lease("retention", worker_id())
+    except Exception:
+        pass
+    shared_store.close()
+    catalog.close()
+    await client_pool.close_all()
     logger.info("=" * 60)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["GET", "POST"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "X-Trace-Id", "X-Profile", "X-Admin-Token", "Last-Event-ID"],
+    expose_headers=["X-Trace-Id", "Server-Timing", "X-Profile-Id", "X-Generation-Id", "X-Artifact-Id"],
 )
 
 logger.info("CORS 中间件已配置")
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-# 挂载录制输出目录，便于前端直接下载
-try:
-    Path(".recordings").mkdir(parents=True, exist_ok=True)
-    app.mount("/recordings", StaticFiles(directory=".recordings"), name="recordings")
-    logger.info("挂载录制目录: .recordings")
+# 单请求采样分析：仅在配置 ADMIN_TOKEN 时启用（位于追踪中间件内层，结果以 trace_id 命名）
+if profiling.admin_token():
+    app.add_middleware(
+        profiling.ProfilingMiddleware,
+        interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+        keep=int(os.getenv("PROFILE_KEEP", "50")),
+    )
+    logger.info("请求采样分析已启用（X-Profile: 1 + X-Admin-Token）")
+
+class SelectiveGZipMiddleware:
+    """
+    GZipMiddleware 外加按路径跳过：SSE 生成流与录制产物（Range / 206）的请求不经过压缩层
 
-    Path("output").mkdir(parents=True, exist_ok=True)
-    app.mount("/output", StaticFiles(directory="output"), name="output")
-    logger.info("挂载输出目录: output")
-except Exception as e:
-    logger.warning(f"挂载静态目录失败: {str(e)}")
-    pass
+    不依赖 Starlette 版本的默认排除类型（较早的版本会压缩并缓冲 text/event-stream，流式输出失效）。
+    """
+
+    def __init__(self, app: Any, skip_prefixes: Tuple[str, ...] = (), **gzip_options: Any):
+        self.app = app
+        self.gzip = GZipMiddleware(app, **gzip_options)
+        self.skip_prefixes = skip_prefixes
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] == "http" and scope["path"].startswith(self.skip_prefixes):
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+
+# 响应压缩：非流式的 HTML / JSON 等超过 COMPRESS_MIN_SIZE 字节时 gzip；
+# /generate（SSE）与 /recordings、/output（音视频 Range 请求）不经过压缩层，
+# 已带 Content-Encoding 的预压缩静态资源不重复压缩
+if os.getenv("RESPONSE_COMPRESSION", "1") != "0":
+    app.add_middleware(
+        SelectiveGZipMiddleware,
+        skip_prefixes=("/generate", "/recordings/", "/output/"),
+        minimum_size=int(os.getenv("COMPRESS_MIN_SIZE", "1024")),
+        compresslevel=int(os.getenv("COMPRESS_LEVEL", "6")),
+    )
+
+# 追踪中间件放在最外层，覆盖整个请求（包括 CORS 处理）
+app.add_middleware(tracing.TracingMiddleware)
+
+static_files = PrecompressedStaticFiles(directory="static")
+app.mount("/static", static_files, name="static")
+# 挂载录制输出目录，便于前端直接下载与拖动播放（Range / 内容哈希 ETag / 304；目录在启动事件中创建）
+app.mount("/recordings", media_files(".recordings", catalog), name="recordings")
+app.mount("/output", media_files("output", catalog), name="output")
 
 class ChatRequest(BaseModel):
     topic: str
     history: Optional[List[dict]] = None
+    # 指定配置档（profiles.json 中的名称）与 / 或模型；为空时使用默认配置档
+    profile: Optional[str] = None
+    model: Optional[str] = None
 
 class RecordRequest(BaseModel):
     url: Optional[str] = None
@@ -316,7 +610,7 @@ class RecordRequest(BaseModel):
     fps: int = 24
     duration: float = 10.0
     start_delay: float = 0.0
-    wait_until: str = "networkidle"  # load | domcontentloaded | networkidle
+    wait_until: str = "ready"  # load | domcontentloaded | networkidle | ready（domcontentloaded + 就绪信号）
     timeout: int = 30000
     background: Optional[str] = None
     headless: bool = True
@@ -332,6 +626,33 @@ class RecordRequest(BaseModel):
     end_event: Optional[str] = None
     end_function: Optional[str] = None
     end_timeout: Optional[int] = None
+    # 画面连续 N 秒无变化即结束录制，并裁掉尾部静止帧
+    idle_seconds: Optional[float] = None
+    idle_trim: bool = True
+    # 分段并行录制：1 为普通录制，>1 为指定段数，0 为按 CPU 核数自动分段（需指定 duration）
+    segments: int = 1
+    seam_threshold: float = 0.08
+    # 网络拦截：None 时使用环境变量 RECORD_OFFLINE（默认离线，外部请求立即中止）
+    offline: Optional[bool] = None
+    allow_hosts: Optional[List[str]] = None
+    # 录制前静态预检：拒绝/修复损坏的 HTML，未指定结束条件时自动推导
+    preflight: bool = True
+    # 封面图 + 预览雪碧图 + WebVTT 缩略图轨道（与 mp4 共用一次解码）
+    thumbnails: bool = False
+    thumbnail_count: int = 20
+    poster_format: str = "jpg"  # jpg | webp
+    # 渐进式输出：立即返回任务 ID 与 HLS 播放列表地址，录制结束后合并为 mp4
+    stream: bool = False
+    stream_segment_seconds: float = 2.0
+    # 产物目录：来源生成的产物 ID（/generate 响应头 X-Artifact-Id）与主题
+    generation_id: Optional[str] = None
+    topic: Optional[str] = None
+
+# 录制任务 ID（时间戳 + 随机后缀）；产物地址含任务 ID 时唯一
+JOB_ID_PATTERN = re.compile(r"\d{8}-\d{6}-[0-9a-f]{8}")
+
+# 客户端显式指定任一字段时，不再使用预检推导的结束策略
+END_CONDITION_FIELDS = {"end_selector", "end_event", "end_function", "end_timeout", "idle_seconds"}
 
 # -----------------------------------------------------------------------
 # 2. 核心：流式生成器 (现在会使用 history，支持双接口)
@@ -340,16 +661,21 @@ async def llm_event_stream(
     topic: str,
     history: Optional[List[dict]] = None,
     model: str = None,
+    stats: Optional[Dict[str, Any]] = None,
+    profile: Optional[ModelProfile] = None,
 ) -> AsyncGenerator[str, None]:
     """
     使用 OpenAI 或 Anthropic 接口生成流式响应
     根据模型名称自动选择接口
+
+    :param model: 可选，覆盖配置档中的模型名
+    :param stats: 可选字典，写入所用上游（upstream）与上游返回的用量
+    :param profile: 请求开始时解析的配置档（为空时使用默认配置档），生成期间配置变化不影响本次请求
     """
     history = history or []
-
-    # 使用配置的模型，如果未指定
-    if model is None:
-        model = MODEL
+    stats = stats if stats is not None else {}
+    if profile is None:
+        profile = config_manager.resolve(model=model)
 
     # 系统提示词（结构化角色设定 + 约束 + 输出格式）
     system_prompt = f"""# Role: 精美动态动画生成专家
@@ -486,8 +812,8 @@ async def llm_event_stream(
         {"role": "user", "content": topic},
     ]
 
-    # 动态获取客户端
-    anthropic_cli, openai_cli, current_model = get_clients()
+    # 获取配置档对应的客户端（客户端池复用）
+    anthropic_cli, openai_cli, model = get_clients(profile)
 
     # 如果没有有效的客户端，返回错误
     if anthropic_cli is None and openai_cli is None:
@@ -496,53 +822,63 @@ async def llm_event_stream(
         yield f"data: {json.dumps({'error': error_msg}, ensure_ascii=False)}\n\n"
         return
 
-    # 使用当前配置的模型
-    model = current_model
-
     # 根据模型类型选择接口
-    if is_anthropic_model(model):
-        # 使用 Anthropic 接口
-        logger.info(f"使用 Anthropic 接口生成内容，模型: {model}")
-        logger.info(f"主题: {topic[:100]}...")  # 只记录前100个字符
-        try:
-            async for sse_chunk in anthropic_stream_to_sse(
-                client=anthropic_cli,
-                model=model,
-                messages=messages,
-                temperature=0.8,
-                max_tokens=4096,
-            ):
-                yield sse_chunk
-            logger.info("Anthropic 接口流式响应完成")
-        except Exception as e:
-            logger.error(f"Anthropic 接口调用失败: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-    else:
-        # 使用 OpenAI 兼容接口
-        logger.info(f"使用 OpenAI 兼容接口生成内容，模型: {model}")
-        logger.info(f"主题: {topic[:100]}...")  # 只记录前100个字符
-        try:
-            response = await openai_cli.chat.completions.create(
-                model=model,
-                messages=messages,
-                stream=True,
-                temperature=0.8,
-            )
-        except OpenAIError as e:
-            logger.error(f"OpenAI 接口调用失败: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-            return
-
-        # 流式输出
-        async for chunk in response:
-            token = chunk.choices[0].delta.content or ""
-            if token:
-                payload = json.dumps({"token": token}, ensure_ascii=False)
-                yield f"data: {payload}\n\n"
-                await asyncio.sleep(0.001)
-
-        logger.info("OpenAI 接口流式响应完成")
-        yield 'data: {"event":"[DONE]"}\n\n'
+    stats["upstream"] = "anthropic" if is_anthropic_model(model) else "openai"
+    tracing.set_attr("model", model)
+    tracing.set_attr("profile", profile.name)
+    tracing.set_attr("upstream", stats["upstream"])
+    # 生成期间占用客户端：配置重新加载后被移出客户端池的客户端等本次生成结束再关闭
+    async with client_pool.lease(anthropic_cli or openai_cli):
+        if is_anthropic_model(model):
+            # 使用 Anthropic 接口
+            from AnthropicClient import anthropic_stream_to_sse  # 已由客户端池导入，这里只是取引用
+            logger.info(f"使用 Anthropic 接口生成内容，模型: {model}")
+            logger.info(f"主题: {topic[:100]}...")  # 只记录前100个字符
+            try:
+                async for sse_chunk in anthropic_stream_to_sse(
+                    client=anthropic_cli,
+                    model=model,
+                    messages=messages,
+                    temperature=profile.temperature,
+                    max_tokens=profile.max_tokens or 4096,
+                    stats=stats,
+                ):
+                    yield sse_chunk
+                logger.info("Anthropic 接口流式响应完成")
+            except Exception as e:
+                metrics.ERRORS.inc(type=type(e).__name__, upstream="anthropic")
+                logger.error(f"Anthropic 接口调用失败: {str(e)}", exc_info=True)
+                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        else:
+            # 使用 OpenAI 兼容接口
+            logger.info(f"使用 OpenAI 兼容接口生成内容，模型: {model}")
+            logger.info(f"主题: {topic[:100]}...")  # 只记录前100个字符
+            from openai import OpenAIError  # 已由客户端池导入，这里只是取引用
+            try:
+                extra = {"max_tokens": profile.max_tokens} if profile.max_tokens else {}
+                response = await openai_cli.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    temperature=profile.temperature,
+                    **extra,
+                )
+            except OpenAIError as e:
+                metrics.ERRORS.inc(type=type(e).__name__, upstream="openai")
+                logger.error(f"OpenAI 接口调用失败: {str(e)}", exc_info=True)
+                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                return
+
+            # 流式输出
+            async for chunk in response:
+                token = chunk.choices[0].delta.content or ""
+                if token:
+                    payload = json.dumps({"token": token}, ensure_ascii=False)
+                    yield f"data: {payload}\n\n"
+                    await asyncio.sleep(0.001)
+
+            logger.info("OpenAI 接口流式响应完成")
+            yield 'data: {"event":"[DONE]"}\n\n'
 
 # -----------------------------------------------------------------------
 # 3. 路由 (CHANGED: Now a POST request)
@@ -562,37 +898,206 @@ async def generate(
     logger.info(f"主题长度: {len(chat_request.topic)} 字符")
     logger.info(f"历史消息数: {len(chat_request.history) if chat_request.history else 0}")
 
+    # 在请求开始时确定配置档，生成期间的配置变更不影响本次请求
+    try:
+        profile = config_manager.resolve(chat_request.profile, chat_request.model)
+    except ValueError as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
+
     accumulated_response = ""  # for caching flow results
+    gen_stats: Dict[str, Any] = {}
+    # 生成流 id 由服务端随机生成（不可猜测，与客户端可指定的 Trace ID 无关），持有者才能续传（GET /generate/{id}）
+    generation_id = uuid4().hex
+    # 产物目录中的生成记录 id 由服务端分配（不使用客户端可指定的 Trace ID），生成成功后写入；
+    # 录制时以 RecordRequest.generation_id 回传，关联来源
+    artifact_id = new_id("generation")
 
     async def event_generator():
         nonlocal accumulated_response
+        started = time.perf_counter()
+        first_token_at: Optional[float] = None
+        deltas = 0
+        tokens: List[str] = []
+        outcome = "cancelled"
         try:
-            async for chunk in llm_event_stream(chat_request.topic, chat_request.history):
+            async for chunk in llm_event_stream(chat_request.topic, chat_request.history, stats=gen_stats, profile=profile):
                 accumulated_response += chunk
-                if await request.is_disconnected():
-                    logger.warning(f"客户端 {client_host} 断开连接")
-                    break
+                if chunk.startswith('data: {"token"'):
+                    deltas += 1
+                    tokens.append(json.loads(chunk[len("data: "):])["token"])
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        metrics.GENERATION_TTFT.observe(
+                            first_token_at - started, upstream=gen_stats.get("upstream", "unknown"))
+                elif chunk.startswith('data: {"error"'):
+                    outcome = "error"
                 yield chunk
+            else:
+                if outcome != "error":
+                    outcome = "ok"
         except Exception as e:
+            outcome = "error"
             logger.error(f"事件生成器错误: {str(e)}", exc_info=True)
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            _observe_generation(gen_stats, started, first_token_at, deltas, outcome)
+        if outcome == "ok":
+            ttft_ms = round((first_token_at - started) * 1000, 1) if first_token_at is not None else None
+            await asyncio.to_thread(
+                _catalog_generation, artifact_id, generation_id, chat_request.topic, profile,
+                "".join(tokens), gen_stats, ttft_ms)
+
+    async def traced_events():
+        # 生成可能在请求的 Trace 写出之后才结束：沿用请求的 Trace ID，单独写一条 Trace
+        with tracing.trace(tracing.current_trace_id(), name="generation", generation_id=generation_id):
+            async for chunk in event_generator():
+                yield chunk
 
+    # 上游生成在后台任务中运行，本响应只是订阅者；客户端断开不会立即中止生成
+    stream = generation_streams.start(generation_id, traced_events())
+    return StreamingResponse(
+        _stream_to_client(stream, 0, client_host),
+        headers={**SSE_HEADERS, "X-Generation-Id": generation_id, "X-Artifact-Id": artifact_id},
+    )
 
-    async def wrapped_stream():
-        async for chunk in event_generator():
-            yield chunk
-        logger.info(f"请求完成 - 来自: {client_host}")
 
-    headers = {
-        "Cache-Control": "no-store",
-        "Content-Type": "text/event-stream; charset=utf-8",
-        "X-Accel-Buffering": "no",
-    }
-    return StreamingResponse(wrapped_stream(), headers=headers)
+SSE_HEADERS = {
+    "Cache-Control": "no-store",
+    "Content-Type": "text/event-stream; charset=utf-8",
+    "X-Accel-Buffering": "no",
+}
+
+
+async def _stream_to_client(stream: Any, after: int, client_host: str) -> AsyncGenerator[str, None]:
+    """把生成流中编号 after 之后的事件发送给客户端"""
+    with metrics.STREAMS_IN_FLIGHT.track_inprogress():
+        try:
+            async for event in generation_streams.subscribe(stream, after):
+                yield event
+        except ReplayUnavailable as e:
+            yield f"data: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+        finally:
+            if not stream.done:
+                logger.warning(
+                    f"客户端 {client_host} 断开连接，生成 {stream.generation_id} 继续运行 "
+                    f"{generation_streams.grace_seconds}s 等待续传")
+    logger.info(f"请求完成 - 来自: {client_host}")
+
+
+@app.get("/generate/{generation_id}")
+async def resume_generation(generation_id: str, request: Request):
+    """
+    续传生成流：重放 Last-Event-ID（请求头，或查询参数 last_event_id）之后的事件，再继续接收实时事件
+    """
+    client_host = request.client.host if request.client else "unknown"
+    stream = generation_streams.get(generation_id)
+    if stream is None:
+        return JSONResponse({"ok": False, "error": "生成不存在或已过期"}, status_code=404)
+    try:
+        after = parse_last_event_id(
+            request.headers.get("last-event-id") or request.query_params.get("last_event_id"))
+    except ValueError:
+        return JSONResponse({"ok": False, "error": "Last-Event-ID 必须是非负整数"}, status_code=400)
+    if not stream.replayable(after):
+        return JSONResponse({"ok": False, "error": "请求的事件已超出重放缓冲，无法续传"}, status_code=410)
+    logger.info(f"续传生成 {generation_id}（Last-Event-ID: {after}）- 来自: {client_host}")
+    return StreamingResponse(
+        _stream_to_client(stream, after, client_host),
+        headers={**SSE_HEADERS, "X-Generation-Id": generation_id},
+    )
+
+def _observe_generation(
+    gen_stats: Dict[str, Any],
+    started: float,
+    first_token_at: Optional[float],
+    deltas: int,
+    outcome: str,
+) -> None:
+    """记录一次生成的耗时、输出量与速率（上游未返回用量时按增量块计数）"""
+    upstream = gen_stats.get("upstream", "unknown")
+    ended = time.perf_counter()
+    metrics.GENERATION_DURATION.observe(ended - started, upstream=upstream, outcome=outcome)
+    tokens = gen_stats.get("output_tokens") or deltas
+    if tokens:
+        metrics.GENERATION_TOKENS.inc(tokens, upstream=upstream)
+    if first_token_at is not None and tokens and ended > first_token_at:
+        metrics.GENERATION_TOKENS_PER_SECOND.observe(tokens / (ended - first_token_at), upstream=upstream)
+    ttft_ms = round((first_token_at - started) * 1000, 1) if first_token_at is not None else None
+    tracing.record_span("llm_stream", started, ended, upstream=upstream, outcome=outcome, tokens=tokens, ttft_ms=ttft_ms)
+
+
+def _catalog_generation(
+    artifact_id: str,
+    generation_id: str,
+    topic: str,
+    profile: ModelProfile,
+    text: str,
+    gen_stats: Dict[str, Any],
+    ttft_ms: Optional[float],
+) -> None:
+    """登记一次成功的生成（内容哈希取自输出中的 HTML 代码块，用于关联之后的录制）"""
+    html = extract_html(text)
+    try:
+        catalog.add({
+            "id": artifact_id,
+            "kind": "generation",
+            "topic": topic,
+            "model": profile.model,
+            "profile": profile.name,
+            "sha256": sha256_text(html) if html else None,
+            "size_bytes": len(html.encode("utf-8")) if html else None,
+            "meta": {
+                "upstream": gen_stats.get("upstream"),
+                "output_tokens": gen_stats.get("output_tokens"),
+                "ttft_ms": ttft_ms,
+                "generation_id": generation_id,
+                "trace_id": tracing.current_trace_id() or None,
+            },
+        })
+    except Exception as e:
+        logger.warning("登记生成记录失败: %s", e)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus 文本格式的运行指标"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def _admin_error(request: Request) -> Optional[JSONResponse]:
+    """管理员令牌校验：请求头 X-Admin-Token 或查询参数 admin_token"""
+    if not profiling.admin_token():
+        return JSONResponse({"ok": False, "error": "未配置 ADMIN_TOKEN，管理接口已关闭"}, status_code=404)
+    token = request.headers.get("x-admin-token") or request.query_params.get("admin_token")
+    if not profiling.check_admin(token):
+        return JSONResponse({"ok": False, "error": "管理员令牌无效"}, status_code=403)
+    return None
+
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """已保存的采样结果（最近的在前）"""
+    error = _admin_error(request)
+    if error:
+        return error
+    return JSONResponse({"ok": True, "profiles": await asyncio.to_thread(profiling.list_profiles)})
+
+
+@app.get("/admin/profiles/{trace_id}")
+async def get_profile(trace_id: str, request: Request):
+    """collapsed stack 文本，可直接交给 flamegraph.pl 或导入 speedscope"""
+    error = _admin_error(request)
+    if error:
+        return error
+    path = profiling.profile_path(trace_id)
+    if path is None:
+        return JSONResponse({"ok": False, "error": "未找到该 trace_id 的采样结果"}, status_code=404)
+    return PlainTextResponse(await asyncio.to_thread(path.read_text, encoding="utf-8"))
+
 
 @app.get("/", response_class=HTMLResponse)
 async def read_index(request: Request):
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "index.html", {
             "request": request,
             "time": datetime.now(shanghai_tz).strftime("%Y%m%d%H%M%S")})
@@ -603,22 +1108,172 @@ async def read_index(request: Request):
 
 @app.post("/record")
 async def record_media(req: RecordRequest):
+    if req.out and JOB_ID_PATTERN.search(Path(req.out).name):
+        # 含任务 ID 的文件名只由服务端生成，其地址可长期缓存（immutable），不允许客户端覆盖
+        return JSONResponse({"ok": False, "error": "输出文件名不能包含任务 ID 格式（YYYYMMDD-HHMMSS-xxxxxxxx）"},
+                            status_code=400)
+    if req.stream:
+        return await _start_stream_job(req)
+    # 任务执行期间，其产物不会被后台清理任务删除
+    with retention_manager.protect() as protect_path:
+        return await _record_media(req, protect_path)
+
+
+async def _start_stream_job(req: RecordRequest) -> JSONResponse:
+    """启动后台渐进式录制任务，立即返回播放列表与状态查询地址"""
+    if load_page_and_record is None or LiveEncoder is None:
+        return JSONResponse({
+            "ok": False,
+            "error": "未安装 Playwright 录制组件，请安装: pip install playwright && playwright install chromium",
+        }, status_code=500)
+    if req.segments != 1:
+        return JSONResponse({"ok": False, "error": "渐进式输出不支持分段录制"}, status_code=400)
+
+    job_id = f"{datetime.now(shanghai_tz).strftime('%Y%m%d-%H%M%S')}-{uuid4().hex[:8]}"
+    encoder = LiveEncoder(
+        Path("output") / job_id,
+        width=req.width,
+        height=req.height,
+        fps=req.fps,
+        segment_seconds=req.stream_segment_seconds,
+    )
+    playlist_url = f"/output/{job_id}/{encoder.playlist.name}"
+    record_jobs[job_id] = {
+        "job_id": job_id,
+        "status": "recording",
+        "playlist_url": playlist_url,
+        "created_at": datetime.now(shanghai_tz).isoformat(),
+        "_encoder": encoder,
+    }
+    # 仅保留最近的任务记录（进行中的任务不淘汰）
+    for old_id in list(record_jobs)[:-RECORD_JOBS_MAX]:
+        if record_jobs[old_id]["status"] != "recording":
+            record_jobs.pop(old_id, None)
+    # 共享状态写入（SQLite 事务可能等待其他 worker 的锁）不在事件循环上执行
+    await asyncio.to_thread(_publish_job, record_jobs[job_id])
+    try:
+        await asyncio.to_thread(
+            shared_store.prune, RECORD_JOBS_NAMESPACE, RECORD_JOBS_MAX,
+            lambda job: job.get("status") == "recording",
+        )
+    except Exception as e:
+        logger.warning("[record_media] 清理共享任务记录失败: %s", e)
+
+    # 合并后的 mp4 是渐进式输出的最终产物
+    req = req.model_copy(update={"mp4": True})
+    metrics.QUEUE_DEPTH.inc(queue="record_jobs")
+    record_jobs[job_id]["_task"] = asyncio.create_task(_run_stream_job(job_id, req, encoder))
+    logger.info("[record_media] 渐进式录制任务已启动: %s", job_id)
+    return JSONResponse({
+        "ok": True,
+        "job_id": job_id,
+        "status": "recording",
+        "playlist_url": playlist_url,
+        "status_url": f"/record/jobs/{job_id}",
+    }, status_code=202)
+
+
+async def _run_stream_job(job_id: str, req: RecordRequest, encoder: Any) -> None:
+    job = record_jobs[job_id]
+    # 任务在响应返回后继续执行：沿用请求的 Trace ID，单独写一条 Trace
+    with tracing.trace(tracing.current_trace_id(), name="record_job", job_id=job_id), \
+            retention_manager.protect(encoder.out_dir) as protect_path:
+        try:
+            resp = await _record_media(req, protect_path, job_id=job_id, live=encoder)
+            body = json.loads(resp.body)
+        except Exception as e:
+            logger.error("[record_media] 渐进式录制任务失败: %s", e)
+            body = {"ok": False, "error": f"录制失败: {e}"}
+        finally:
+            # 录制异常中断时也要结束编码进程
+            try:
+                await encoder.stop()
+            except Exception:
+                pass
+    metrics.QUEUE_DEPTH.dec(queue="record_jobs")
+    job["status"] = "done" if body.get("ok") else "failed"
+    job["result"] = body
+    job["finished_at"] = datetime.now(shanghai_tz).isoformat()
+    job.pop("_task", None)
+    await asyncio.to_thread(_publish_job, job, live=encoder.describe())
+
+
+@app.get("/record/jobs/{job_id}")
+async def record_job_status(job_id: str):
+    """查询渐进式录制任务状态（任务可能由其他 worker 执行）"""
+    job = record_jobs.get(job_id)
+    if job is None:
+        shared = await asyncio.to_thread(shared_store.get, RECORD_JOBS_NAMESPACE, job_id)
+        if shared is None:
+            return JSONResponse({"ok": False, "error": "任务不存在"}, status_code=404)
+        shared["ok"] = True
+        shared["playlist_ready"] = Path(shared["playlist_url"].lstrip("/")).exists()
+        return JSONResponse(shared)
+    data = {k: v for k, v in job.items() if not k.startswith("_")}
+    encoder = job["_encoder"]
+    data["ok"] = True
+    data["playlist_ready"] = encoder.playlist.exists()
+    data["live"] = encoder.describe()
+    return JSONResponse(data)
+
+
+async def _record_media(
+    req: RecordRequest,
+    protect_path,
+    job_id: Optional[str] = None,
+    live: Optional[Any] = None,
+) -> JSONResponse:
     if load_page_and_record is None:
         return JSONResponse({
             "ok": False,
             "error": "未安装 Playwright 录制组件，请安装: pip install playwright && playwright install chromium",
         }, status_code=500)
 
+    # 录制前静态预检：拒绝明显损坏的输入、补全被截断的文档、推导结束策略
+    html_text = req.html_text
+    preflight: Optional[Dict[str, Any]] = None
+    if req.preflight and (html_text or req.html):
+        source = html_text
+        if source is None:
+            try:
+                source = Path(req.html).read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError):
+                source = None  # 交由后续的存在性检查报错
+        if source is not None:
+            with tracing.span("preflight"):
+                preflight = analyze_html(source)
+            if not preflight["ok"]:
+                return JSONResponse({
+                    "ok": False,
+                    "error": f"HTML 预检未通过: {'；'.join(preflight['errors'])}",
+                    "preflight": preflight,
+                }, status_code=400)
+            if html_text is not None:
+                html_text, preflight["repairs"] = repair_html(html_text, preflight)
+            update: Dict[str, Any] = {}
+            if not (req.model_fields_set & END_CONDITION_FIELDS):
+                update.update(preflight["end_strategy"])
+            if req.segments != 1 and "duration" not in req.model_fields_set and preflight["estimated_duration"]:
+                update["duration"] = preflight["estimated_duration"]
+            if update:
+                req = req.model_copy(update=update)
+            logger.info(
+                "[record_media] 预检: 截断=%s 外部资源=%d 完结标记=%s 估算时长=%s 结束策略=%s",
+                preflight["truncated"], len(preflight["external_resources"]),
+                preflight["has_finish_marker"], preflight["estimated_duration"], update or "客户端指定",
+            )
+
     # 规范化 URL（本地 HTML 简化为 file://）或接收原始 HTML 文本
     url = req.url
     temp_html_path: Optional[Path] = None
-    if req.html_text:
+    if html_text:
         try:
             temp_dir = Path(".generated_html").resolve()
             temp_dir.mkdir(parents=True, exist_ok=True)
             ts = datetime.now(shanghai_tz).strftime("%Y%m%d-%H%M%S")
             temp_html_path = (temp_dir / f"generated-{ts}-{uuid4().hex[:8]}.html").resolve()
-            temp_html_path.write_text(req.html_text, encoding="utf-8")
+            protect_path(temp_html_path)
+            temp_html_path.write_text(html_text, encoding="utf-8")
             url = temp_html_path.as_uri()
             logger.info("[record_media] 已保存临时 HTML: %s", temp_html_path)
         except Exception as e:
@@ -633,32 +1288,71 @@ async def record_media(req: RecordRequest):
     if not url:
         return JSONResponse({"ok": False, "error": "必须提供 url 或 html"}, status_code=400)
 
-    out_dir = Path(".recordings")
+    # 每个任务使用独立的录制目录，视频路径直接取自页面的视频句柄
+    job_id = job_id or f"{datetime.now(shanghai_tz).strftime('%Y%m%d-%H%M%S')}-{uuid4().hex[:8]}"
+    tracing.set_attr("job_id", job_id)
+    out_dir = Path(".recordings") / job_id
     out_dir.mkdir(parents=True, exist_ok=True)
+    protect_path(out_dir)
 
     logger.info("[record_media] 开始录制，加载 URL: %s", url)
 
+    network_policy = policy_from_env(req.offline)
+    network_policy.allow_hosts.extend(h.lower() for h in (req.allow_hosts or []))
+    if url.startswith(("http://", "https://")):
+        network_policy.allow_origin_of(url)
+
+    segment_info: Optional[Dict[str, Any]] = None
+    record_stats: Dict[str, Any] = {}
     try:
-        webm_path = await load_page_and_record(
-            url=url,
-            out_dir=out_dir,
-            width=req.width,
-            height=req.height,
-            fps=req.fps,
-            headless=req.headless,
-            slow_mo=req.slow_mo,
-            wait_until=req.wait_until,
-            timeout=req.timeout,
-            start_delay=req.start_delay,
-            duration=req.duration,
-            background=req.background,
-            script_steps=req.script_steps,
-            end_selector=req.end_selector,
-            end_event=req.end_event,
-            end_function=req.end_function,
-            end_timeout=req.end_timeout,
-        )
+        if req.segments != 1:
+            if record_segmented is None:
+                return JSONResponse({"ok": False, "error": "分段录制组件不可用"}, status_code=500)
+            segment_info = await record_segmented(
+                url=url,
+                out_dir=out_dir,
+                width=req.width,
+                height=req.height,
+                fps=req.fps,
+                headless=req.headless,
+                wait_until=req.wait_until,
+                timeout=req.timeout,
+                duration=req.duration,
+                segments=req.segments,
+                background=req.background,
+                seam_threshold=req.seam_threshold,
+                network_policy=network_policy,
+            )
+            webm_path = segment_info.pop("path")
+            if not segment_info["seams_ok"]:
+                logger.warning("[record_media] 分段接缝检测未通过: %s", segment_info["seams"])
+        else:
+            webm_path = await load_page_and_record(
+                url=url,
+                out_dir=out_dir,
+                width=req.width,
+                height=req.height,
+                fps=req.fps,
+                headless=req.headless,
+                slow_mo=req.slow_mo,
+                wait_until=req.wait_until,
+                timeout=req.timeout,
+                start_delay=req.start_delay,
+                duration=req.duration,
+                background=req.background,
+                script_steps=req.script_steps,
+                end_selector=req.end_selector,
+                end_event=req.end_event,
+                end_function=req.end_function,
+                end_timeout=req.end_timeout,
+                idle_seconds=req.idle_seconds,
+                idle_trim=req.idle_trim,
+                network_policy=network_policy,
+                stats=record_stats,
+                live=live,
+            )
     except Exception as e:
+        metrics.ERRORS.inc(type=type(e).__name__, upstream="playwright")
         logger.error("[record_media] 录制失败: %s", e)
         return JSONResponse({"ok": False, "error": f"录制失败: {e}"}, status_code=500)
 
@@ -666,13 +1360,53 @@ async def record_media(req: RecordRequest):
     if req.out:
         base_name = Path(req.out).with_suffix("").name
     else:
-        base_name = f"capture-{datetime.now(shanghai_tz).strftime('%Y%m%d-%H%M%S')}-{uuid4().hex[:8]}"
+        # 以任务 ID 命名，地址只属于本次录制（可 immutable 缓存）
+        base_name = f"capture-{job_id}"
     # 生成可下载 URL（通过 /recordings 挂载）
     webm_name = Path(webm_path).name
-    result: Dict[str, Any] = {"ok": True, "webm": str(webm_path), "webm_url": f"/recordings/{webm_name}"}
+    result: Dict[str, Any] = {
+        "ok": True,
+        "job_id": job_id,
+        "webm": str(webm_path),
+        "webm_url": f"/recordings/{job_id}/{webm_name}",
+    }
+    if segment_info is not None:
+        result["segmented"] = segment_info
+    if network_policy.stats["blocked"]:
+        logger.info("[record_media] 已拦截外部请求: %s", network_policy.stats["blocked_hosts"])
+    if preflight is not None:
+        result["preflight"] = preflight
+    if record_stats:
+        result["recording"] = record_stats
+        logger.info("[record_media] 录制结束方式: %s", record_stats)
+    if live is not None:
+        result["playlist_url"] = f"/output/{job_id}/{live.playlist.name}"
 
     output_dir: Optional[Path] = None
 
+    # 缩略图规划：时长优先取录制统计，其次分段/请求参数，最后探测文件
+    thumb_plan: Optional[ThumbnailPlan] = None
+    if req.thumbnails:
+        if which is None or which("ffmpeg") is None:
+            return JSONResponse({"ok": False, "error": "未找到 ffmpeg，可执行不在 PATH 中"}, status_code=500)
+        output_dir = Path("output")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        video_seconds = record_stats.get("video_seconds")
+        if not video_seconds and segment_info is not None:
+            video_seconds = req.duration
+        if not video_seconds:
+            video_seconds = probe_duration(which("ffmpeg"), Path(webm_path)) or req.duration
+        thumb_plan = ThumbnailPlan(
+            output_dir / base_name,
+            duration=float(video_seconds),
+            width=req.width,
+            height=req.height,
+            count=req.thumbnail_count,
+            poster_format=req.poster_format,
+        )
+        for path in (thumb_plan.poster, thumb_plan.sprite, thumb_plan.vtt):
+            protect_path(path)
+
     # mp4
     if req.mp4:
         if which is None or which("ffmpeg") is None:
@@ -680,8 +1414,16 @@ async def record_media(req: RecordRequest):
         output_dir = Path("output")
         output_dir.mkdir(parents=True, exist_ok=True)
         mp4_path = output_dir / f"{base_name}.mp4"
+        protect_path(mp4_path)
         try:
-            run_ffmpeg(["-i", str(webm_path), "-c:v", "libx264", "-pix_fmt", "yuv420p", str(mp4_path)])
+            if live is not None:
+                # 渐进式输出：直接合并已编码的 HLS 分片，无需再次转码
+                keep = (record_stats.get("live") or {}).get("keep_seconds")
+                finalize_playlist(live.playlist, mp4_path, keep)
+            elif thumb_plan is not None:
+                run_ffmpeg(transcode_args(Path(webm_path), mp4_path, thumb_plan))
+            else:
+                run_ffmpeg(["-i", str(webm_path), "-c:v", "libx264", "-pix_fmt", "yuv420p", str(mp4_path)])
         except Exception as e:
             logger.error("[record_media] mp4 转码失败: %s", e)
             return JSONResponse({"ok": False, "error": f"mp4 转码失败: {e}"}, status_code=500)
@@ -695,6 +1437,21 @@ async def record_media(req: RecordRequest):
         result["mp4"] = str(mp4_path)
         result["mp4_url"] = f"/output/{mp4_path.name}"
 
+    # 缩略图：未导出 mp4（或 mp4 由 HLS 分片合并而来）时单独解码一次
+    if thumb_plan is not None:
+        try:
+            if not req.mp4 or live is not None:
+                run_ffmpeg(transcode_args(Path(webm_path), None, thumb_plan))
+            thumb_plan.write_vtt()
+        except Exception as e:
+            logger.error("[record_media] 缩略图生成失败: %s", e)
+            return JSONResponse({"ok": False, "error": f"缩略图生成失败: {e}"}, status_code=500)
+        logger.info("[record_media] 生成封面与雪碧图: %s, %s", thumb_plan.poster, thumb_plan.sprite)
+        result["thumbnails"] = thumb_plan.describe()
+        result["poster_url"] = f"/output/{thumb_plan.poster.name}"
+        result["sprite_url"] = f"/output/{thumb_plan.sprite.name}"
+        result["vtt_url"] = f"/output/{thumb_plan.vtt.name}"
+
     # gif
     if req.gif:
         if which is None or which("ffmpeg") is None:
@@ -705,6 +1462,8 @@ async def record_media(req: RecordRequest):
         base_path = output_dir / base_name
         palette = base_path.with_suffix(".png")
         gif_path = base_path.with_suffix(".gif")
+        protect_path(palette)
+        protect_path(gif_path)
         try:
             run_ffmpeg([
                 "-i", str(webm_path),
@@ -724,8 +1483,106 @@ async def record_media(req: RecordRequest):
         result["gif"] = str(gif_path)
         result["gif_url"] = f"/output/{gif_path.name}"
 
+    await asyncio.to_thread(_catalog_recording, req, result, temp_html_path, thumb_plan, live)
     return JSONResponse(result)
 
+
+def _catalog_recording(
+    req: RecordRequest,
+    result: Dict[str, Any],
+    temp_html_path: Optional[Path],
+    thumb_plan: Optional[Any],
+    live: Optional[Any],
+) -> None:
+    """
+    登记一次录制的全部产物：html → recording(webm) → mp4 / gif / playlist / poster / sprite / vtt
+
+    录制的上游为请求指定的生成记录，未指定时按 HTML 内容哈希匹配最近的生成记录。
+    """
+    try:
+        job_id = result["job_id"]
+        parent = catalog.get(req.generation_id) if req.generation_id else None
+        if parent is not None and parent["kind"] != "generation":
+            parent = None
+        if parent is None and req.html_text:
+            parent = catalog.find_by_sha256(sha256_text(req.html_text), kind="generation")
+        topic = req.topic or (parent or {}).get("topic")
+        common = {"job_id": job_id, "topic": topic,
+                  "model": (parent or {}).get("model"), "profile": (parent or {}).get("profile")}
+
+        entries = []
+        parent_id = parent["id"] if parent else None
+        if temp_html_path is not None:
+            html_entry = file_entry("html", temp_html_path, parent_id=parent_id, **common)
+            entries.append(html_entry)
+            parent_id = html_entry["id"]
+        recording = result.get("recording") or {}
+        webm_entry = file_entry(
+            "recording", Path(result["webm"]), parent_id=parent_id, url=result["webm_url"],
+            width=req.width, height=req.height, fps=req.fps, duration=recording.get("video_seconds"),
+            meta={k: v for k, v in recording.items() if k != "live"}, **common,
+        )
+        entries.append(webm_entry)
+
+        children = [("mp4", result.get("mp4"), result.get("mp4_url")), ("gif", result.get("gif"), result.get("gif_url"))]
+        if live is not None:
+            children.append(("playlist", str(live.playlist), result.get("playlist_url")))
+        if thumb_plan is not None:
+            children += [
+                ("poster", str(thumb_plan.poster), result.get("poster_url")),
+                ("sprite", str(thumb_plan.sprite), result.get("sprite_url")),
+                ("vtt", str(thumb_plan.vtt), result.get("vtt_url")),
+            ]
+        for kind, path, url in children:
+            if path:
+                entries.append(file_entry(
+                    kind, Path(path), parent_id=webm_entry["id"], url=url,
+                    width=req.width if kind in ("mp4", "playlist") else None,
+                    height=req.height if kind in ("mp4", "playlist") else None,
+                    duration=webm_entry["duration"] if kind in ("mp4", "gif", "playlist") else None,
+                    **common,
+                ))
+        catalog.add_many(entries)
+        result["artifact_id"] = webm_entry["id"]
+    except Exception as e:
+        logger.warning("[record_media] 登记产物失败: %s", e)
+
+
+# -----------------------------------------------------------------------
+# 3.2 产物目录：GET /artifacts
+# -----------------------------------------------------------------------
+
+@app.get("/artifacts")
+async def list_artifacts(
+    kind: Optional[str] = None,
+    q: Optional[str] = None,
+    model: Optional[str] = None,
+    job_id: Optional[str] = None,
+    parent_id: Optional[str] = None,
+    include_deleted: bool = False,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+):
+    """按创建时间倒序分页列出产物（只查询索引，不遍历产物目录）；next_cursor 为空表示没有更多"""
+    try:
+        items, next_cursor = await asyncio.to_thread(
+            catalog.search, kind=kind, q=q, model=model, job_id=job_id, parent_id=parent_id,
+            include_deleted=include_deleted, limit=limit, cursor=cursor,
+        )
+    except ValueError as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
+    return JSONResponse({"ok": True, "items": items, "next_cursor": next_cursor})
+
+
+@app.get("/artifacts/{artifact_id}")
+async def get_artifact(artifact_id: str):
+    """单个产物及其来源（ancestors）与派生产物（descendants）"""
+    item = await asyncio.to_thread(catalog.get, artifact_id)
+    if item is None:
+        return JSONResponse({"ok": False, "error": "产物不存在"}, status_code=404)
+    item.update(await asyncio.to_thread(catalog.lineage, artifact_id))
+    return JSONResponse({"ok": True, **item})
+
 # -----------------------------------------------------------------------
 # 3.5 配置管理路由
 # -----------------------------------------------------------------------
@@ -769,9 +1626,86 @@ async def update_config(config_req: ConfigUpdateRequest, request: Request):
     else:
         return JSONResponse({"ok": False, "error": "保存配置失败"}, status_code=500)
 
+# /test-config 结果缓存与限流（命中缓存的请求不计入限流）
+config_probe_cache = ProbeCache(
+    ok_ttl=float(os.getenv("TEST_CONFIG_CACHE_TTL", "600")),
+    fail_ttl=float(os.getenv("TEST_CONFIG_FAIL_TTL", "60")),
+    store=shared_store,
+)
+config_probe_limiter = RateLimiter(int(os.getenv("TEST_CONFIG_RATE_LIMIT", "10")), window=60.0)
+
+
+def _upstream_status(error: Exception) -> Optional[int]:
+    """从 httpx / openai 异常中取出上游 HTTP 状态码"""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _describe_probe_error(error: Exception) -> str:
+    error_msg = str(error)
+    # 提取关键错误信息
+    if "401" in error_msg or "Unauthorized" in error_msg:
+        error_msg = "API Key 无效或已过期"
+    elif "404" in error_msg or "not found" in error_msg.lower():
+        error_msg = "模型名称不存在或无法访问"
+    elif "429" in error_msg or "rate limit" in error_msg.lower():
+        error_msg = "请求频率超限，请稍后重试"
+    elif "quota" in error_msg.lower() or "billing" in error_msg.lower():
+        error_msg = "API 配额不足或计费问题"
+    return error_msg
+
+
+async def probe_config(api_key: str, base_url: str, model: str):
+    """
+    验证一组配置，返回 (结果, 是否可缓存)
+
+    优先使用不消耗 token 的模型查询接口，不支持时退回 max_tokens=1 的请求。
+    凭据已被某个配置档使用时复用池中的客户端（共用连接）；未保存的凭据使用临时客户端，
+    验证结束即关闭，不进入客户端池。
+    """
+    kind = "anthropic" if is_anthropic_model(model) else "openai"
+    base_client = client_pool.peek(kind, api_key, base_url)
+    temporary = base_client is None
+    if temporary:
+        base_client = client_pool.create(kind, api_key, base_url)
+    try:
+        # 池中的客户端在验证期间被移出池时，等验证结束再关闭
+        async with client_pool.lease(base_client):
+            if kind == "anthropic":
+                method = await base_client.probe(model)
+            else:
+                from openai import OpenAIError
+                client = base_client.with_options(timeout=15.0, max_retries=0)
+                try:
+                    await client.models.retrieve(model)
+                    method = "models"
+                except OpenAIError as e:
+                    if _upstream_status(e) in (401, 403):
+                        raise
+                    # 部分兼容接口未实现模型查询，改用最小请求
+                    await client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": "Hi"}],
+                        max_tokens=1,
+                    )
+                    method = "completion"
+    except Exception as e:
+        status = _upstream_status(e)
+        logger.error(f"测试连接失败: {str(e)}")
+        # 只缓存明确的失败（密钥 / 权限 / 模型），超时、限流与上游故障允许立即重试
+        return {"ok": False, "error": f"测试失败: {_describe_probe_error(e)}"}, status in (400, 401, 403, 404)
+    finally:
+        if temporary:
+            await close_client(base_client)
+
+    logger.info(f"测试连接成功 - 模型: {model}（{method}）")
+    return {"ok": True, "message": f"测试成功！模型 '{model}' 可正常访问", "model": model}, True
+
+
 @app.post("/test-config")
 async def test_config(config_req: ConfigUpdateRequest, request: Request):
-    """测试 API 配置是否有效（实际发起请求验证）"""
+    """测试 API 配置是否有效（结果缓存，相同参数的并发测试只请求一次上游）"""
     client_host = request.client.host if request.client else "unknown"
     logger.info(f"测试配置 - 来自: {client_host}")
 
@@ -782,74 +1716,25 @@ async def test_config(config_req: ConfigUpdateRequest, request: Request):
     if not config_req.model:
         return JSONResponse({"ok": False, "error": "模型名称不能为空"}, status_code=400)
 
-    # 临时创建客户端进行测试
-    temp_api_key = config_req.api_key
-    temp_base_url = config_req.base_url or ""
-    temp_model = config_req.model
-
+    base_url = config_req.base_url or ""
+    key = probe_key(config_req.api_key, base_url, config_req.model)
     try:
-        # 根据模型类型创建临时客户端
-        if is_anthropic_model(temp_model):
-            test_client = AnthropicClient(
-                api_key=temp_api_key,
-                base_url=temp_base_url if temp_base_url else "https://api.anthropic.com"
-            )
-            # 发送一个简单的测试请求
-            messages = [
-                {"role": "user", "content": "Hi"}
-            ]
-            # 使用同步方式测试
-            test_response = None
-            async def _test():
-                async for chunk in anthropic_stream_to_sse(
-                    client=test_client,
-                    model=temp_model,
-                    messages=messages,
-                    temperature=0.1,
-                    max_tokens=10,
-                ):
-                    nonlocal test_response
-                    if not test_response:
-                        test_response = chunk
-                    break  # 只取第一个chunk就退出
-            await _test()
-
-        else:
-            test_client = AsyncOpenAI(
-                api_key=temp_api_key,
-                base_url=temp_base_url
-            )
-            # 发送一个简单的测试请求
-            response = await test_client.chat.completions.create(
-                model=temp_model,
-                messages=[{"role": "user", "content": "Hi"}],
-                max_tokens=10,
-                temperature=0.1,
-            )
-            test_response = response.choices[0].message.content
-
-        logger.info(f"测试连接成功 - 模型: {temp_model}")
-        return JSONResponse({
-            "ok": True,
-            "message": f"测试成功！模型 '{temp_model}' 可正常访问",
-            "model": temp_model
-        })
-    except Exception as e:
-        logger.error(f"测试连接失败: {str(e)}")
-        error_msg = str(e)
-        # 提取关键错误信息
-        if "401" in error_msg or "Unauthorized" in error_msg:
-            error_msg = "API Key 无效或已过期"
-        elif "404" in error_msg or "not found" in error_msg.lower():
-            error_msg = "模型名称不存在或无法访问"
-        elif "429" in error_msg or "rate limit" in error_msg.lower():
-            error_msg = "请求频率超限，请稍后重试"
-        elif "quota" in error_msg.lower() or "billing" in error_msg.lower():
-            error_msg = "API 配额不足或计费问题"
-        return JSONResponse({
-            "ok": False,
-            "error": f"测试失败: {error_msg}"
-        }, status_code=400)
+        # 只有需要请求上游（未命中缓存、也没有进行中的相同验证）时才计入限流
+        result, source = await config_probe_cache.run(
+            key,
+            lambda: probe_config(config_req.api_key, base_url, config_req.model),
+            admit=lambda: config_probe_limiter.hit(client_host),
+        )
+    except RateLimited as e:
+        metrics.CONFIG_TESTS.inc(source="rate_limited")
+        return JSONResponse(
+            {"ok": False, "error": "测试过于频繁，请稍后重试"},
+            status_code=429,
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+        )
+    metrics.CONFIG_TESTS.inc(source=source)
+    tracing.set_attr("config_test", source)
+    return JSONResponse({**result, "cached": source == "cache"}, status_code=200 if result["ok"] else 400)
 
 # -----------------------------------------------------------------------
 # 4. 启动逻辑
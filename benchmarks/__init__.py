@@ -0,0 +1,6 @@
+"""
+性能基准：本地模拟上游 + 负载生成（完全离线，不消耗真实 API 配额）
+
+    python -m benchmarks.mock_llm --port 9100 --ttft 0.4 --tps 60
+    python -m benchmarks.load_generate --concurrency 8 --requests 200
+"""
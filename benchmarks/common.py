@@ -0,0 +1,248 @@
+"""
+基准测试共用工具：百分位、进程资源采样、运行环境信息与结果输出
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import psutil  # 可选：跨平台的 CPU / 内存读取
+except ImportError:
+    psutil = None
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """线性插值百分位，q 取 0~1"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(values: Sequence[float], scale: float = 1.0, digits: int = 1) -> Dict[str, Optional[float]]:
+    """p50 / p95 / p99 / 均值 / 最大值（scale 用于单位换算，如秒 -> 毫秒）"""
+    def fmt(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * scale, digits)
+
+    return {
+        "count": len(values),
+        "p50": fmt(percentile(values, 0.5)),
+        "p95": fmt(percentile(values, 0.95)),
+        "p99": fmt(percentile(values, 0.99)),
+        "mean": fmt(sum(values) / len(values)) if values else None,
+        "max": fmt(max(values)) if values else None,
+    }
+
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    """进程累计 CPU 时间（用户态 + 内核态，秒）"""
+    if psutil is not None:
+        try:
+            times = psutil.Process(pid).cpu_times()
+            return times.user + times.system
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # comm 字段可能含空格，从最后一个 ')' 之后再切分
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def process_rss_bytes(pid: int) -> Optional[int]:
+    """进程当前常驻内存（字节）"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def child_pids(pid: int) -> List[int]:
+    """进程的所有后代（浏览器、FFmpeg 等子进程）"""
+    if psutil is not None:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+    parents: Dict[int, int] = {}
+    for entry in Path("/proc").iterdir() if Path("/proc").is_dir() else []:
+        if not entry.name.isdigit():
+            continue
+        try:
+            fields = (entry / "stat").read_text().rsplit(")", 1)[1].split()
+            parents[int(entry.name)] = int(fields[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    found: List[int] = []
+    frontier = [pid]
+    while frontier:
+        current = frontier.pop()
+        for child, parent in parents.items():
+            if parent == current:
+                found.append(child)
+                frontier.append(child)
+    return found
+
+
+def tree_rss_bytes(pid: int) -> Optional[int]:
+    """进程及其全部后代的 RSS 之和（共享页会重复计算，仅用于对比趋势）"""
+    own = process_rss_bytes(pid)
+    if own is None:
+        return None
+    return own + sum(process_rss_bytes(child) or 0 for child in child_pids(pid))
+
+
+class ResourceSampler:
+    """后台线程定期采样一组进程的 CPU 时间与 RSS，记录峰值（tree=True 时 RSS 包含子进程）"""
+
+    def __init__(self, pids: Sequence[int], interval: float = 0.2, tree: bool = False):
+        self.pids = list(pids)
+        self.interval = interval
+        self.tree = tree
+        self.peak_rss: Dict[int, int] = {}
+        self.cpu_start: Dict[int, Optional[float]] = {}
+        self.cpu_end: Dict[int, Optional[float]] = {}
+        self.rss_start: Dict[int, Optional[int]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _rss(self, pid: int) -> Optional[int]:
+        return tree_rss_bytes(pid) if self.tree else process_rss_bytes(pid)
+
+    def _sample(self) -> None:
+        for pid in self.pids:
+            rss = self._rss(pid)
+            if rss is not None and rss > self.peak_rss.get(pid, 0):
+                self.peak_rss[pid] = rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "ResourceSampler":
+        for pid in self.pids:
+            self.cpu_start[pid] = process_cpu_seconds(pid)
+            self.rss_start[pid] = self._rss(pid)
+        self._sample()
+        self._thread = threading.Thread(target=self._run, name="bench-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[int, Dict[str, Any]]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        result = {}
+        for pid in self.pids:
+            self.cpu_end[pid] = process_cpu_seconds(pid)
+            start, end = self.cpu_start.get(pid), self.cpu_end.get(pid)
+            result[pid] = {
+                "cpu_seconds": round(end - start, 3) if start is not None and end is not None else None,
+                "rss_start_mb": _mb(self.rss_start.get(pid)),
+                "rss_peak_mb": _mb(self.peak_rss.get(pid)),
+                "rss_end_mb": _mb(self._rss(pid)),
+            }
+        return result
+
+
+def _mb(value: Optional[int]) -> Optional[float]:
+    return None if value is None else round(value / 1024 / 1024, 1)
+
+
+def environment() -> Dict[str, Any]:
+    """运行环境（用于跨提交 / 跨机器对比结果）"""
+    def git(*args: str) -> Optional[str]:
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=10,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git("rev-parse", "HEAD"),
+        "git_dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_result(result: Dict[str, Any], output: Optional[str]) -> Optional[Path]:
+    """写入 JSON 结果文件（output 为 None 时不写）"""
+    if not output:
+        return None
+    path = Path(output)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+def free_port() -> int:
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_http(url: str, timeout: float = 30.0, proc: Optional[subprocess.Popen] = None) -> None:
+    """轮询直到 URL 可访问（子进程提前退出时立即报错）"""
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"子进程已退出（code={proc.returncode}）: {' '.join(map(str, proc.args))}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise TimeoutError(f"等待服务就绪超时: {url}")
+
+
+def stop_process(proc: Optional[subprocess.Popen], timeout: float = 10.0) -> None:
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def print_table(rows: List[List[Any]], headers: List[str]) -> None:
+    """简单的等宽表格输出"""
+    cells = [[("-" if v is None else str(v)) for v in row] for row in rows]
+    widths = [max(len(str(h)), *(len(r[i]) for r in cells)) if cells else len(str(h)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
@@ -0,0 +1,156 @@
+"""
+冷启动耗时与导入预算检查
+
+每轮在全新的子进程中执行 `import app`（-X importtime），报告导入耗时中位数与累计耗时最多的模块，
+并检查：
+- 导入耗时中位数不超过 --budget-ms
+- 重型模块（openai、httpx 与 AnthropicClient、Playwright、Jinja2、PyYAML、imageio-ffmpeg）没有在导入阶段被加载
+
+--serve 额外测量从启动 uvicorn 到首个请求成功的耗时。任一检查失败时退出码为 1，可直接用于 CI。
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 7 --budget-ms 800 --serve --output bench/import.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+try:
+    from benchmarks import common
+except ImportError:  # 以 python benchmarks/import_time.py 方式运行时
+    import common
+
+# 只应在首次使用时导入的模块
+LAZY_MODULES = ("openai", "httpx", "AnthropicClient", "playwright", "jinja2", "yaml", "imageio_ffmpeg")
+
+_PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import app\n"
+    "elapsed = time.perf_counter() - started\n"
+    "loaded = sorted({name.split('.')[0] for name in sys.modules})\n"
+    "print(json.dumps({'seconds': elapsed, 'modules': loaded}))\n"
+)
+
+
+def _env(workdir: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "RETENTION_ENABLED": "0",
+        "PREWARM": "0",
+    }
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int]]:
+    """解析 -X importtime 输出，返回 [(带缩进的模块名, 累计微秒)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|", 2)
+            # "|" 之后固定一个空格，其后的缩进表示导入层级
+            rows.append((name[1:].rstrip(), int(cumulative)))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure_import(workdir: str) -> Dict[str, Any]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        cwd=common.ROOT, env=_env(workdir), capture_output=True, text=True, timeout=120,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import app 失败:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["importtime"] = parse_importtime(proc.stderr)
+    return result
+
+
+def measure_serve(workdir: str) -> float:
+    """启动 uvicorn 到 GET /metrics 成功的耗时（秒）"""
+    port = common.free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=common.ROOT, env=_env(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        common.wait_http(f"http://127.0.0.1:{port}/metrics", timeout=60, proc=proc)
+        return time.perf_counter() - started
+    finally:
+        common.stop_process(proc)
+
+
+def top_modules(runs: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """各模块累计导入耗时取多轮中位数，按耗时排序（只列出由 app 直接导入的模块）"""
+    samples: Dict[str, List[int]] = {}
+    for run in runs:
+        for name, cumulative in run["importtime"]:
+            # 缩进两个空格 = 由 app 直接导入
+            if name.startswith("  ") and not name.startswith("   "):
+                samples.setdefault(name.strip(), []).append(cumulative)
+    rows = [{"module": name, "ms": round(common.percentile(values, 0.5) / 1000, 1)} for name, values in samples.items()]
+    rows.sort(key=lambda row: row["ms"], reverse=True)
+    return rows[:limit]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="import app 冷启动耗时与导入预算检查")
+    parser.add_argument("--repeat", "-r", type=int, default=5, help="测量轮数，取中位数（默认 5）")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="导入耗时中位数上限（毫秒，默认 1000）")
+    parser.add_argument("--serve", action="store_true", help="同时测量 uvicorn 启动到首个请求成功的耗时")
+    parser.add_argument("--top", type=int, default=10, help="列出耗时最多的直接依赖数量")
+    parser.add_argument("--output", "-o", default=None, help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-import-")
+    runs = [measure_import(workdir) for _ in range(args.repeat)]
+    import_seconds = [run["seconds"] for run in runs]
+    eager = sorted(set(LAZY_MODULES) & set(runs[-1]["modules"]))
+    serve = [measure_serve(workdir) for _ in range(args.repeat)] if args.serve else []
+
+    report: Dict[str, Any] = {
+        "import_ms": common.summarize(import_seconds, scale=1000),
+        "budget_ms": args.budget_ms,
+        "eager_heavy_modules": eager,
+        "top_modules": top_modules(runs, args.top),
+    }
+    if serve:
+        report["serve_ready_ms"] = common.summarize(serve, scale=1000)
+    failures = []
+    if report["import_ms"]["p50"] > args.budget_ms:
+        failures.append(f"导入耗时中位数 {report['import_ms']['p50']}ms 超出预算 {args.budget_ms}ms")
+    if eager:
+        failures.append(f"导入阶段加载了应延迟导入的模块: {', '.join(eager)}")
+    report["failures"] = failures
+
+    print(f"\nimport app: p50 {report['import_ms']['p50']}ms  max {report['import_ms']['max']}ms"
+          f"（预算 {args.budget_ms}ms，{args.repeat} 轮）")
+    if serve:
+        print(f"uvicorn 就绪: p50 {report['serve_ready_ms']['p50']}ms  max {report['serve_ready_ms']['max']}ms")
+    print()
+    common.print_table([[row["module"], row["ms"]] for row in report["top_modules"]], ["模块", "ms"])
+    print()
+    for failure in failures:
+        print(f"失败: {failure}")
+
+    path = common.write_result(
+        {"benchmark": "import_time", "environment": common.environment(), "params": vars(args), "report": report},
+        args.output,
+    )
+    if path:
+        print(f"结果已写入: {path}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
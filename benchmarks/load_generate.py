@@ -0,0 +1,241 @@
+"""
+/generate 负载测试
+
+默认在本机启动模拟上游（benchmarks.mock_llm）与应用（uvicorn app:app），应用通过环境变量
+API_KEY / BASE_URL / MODEL 指向模拟上游，全程离线；也可用 --target 压测已运行的服务
+（配合 --server-pid 采集其 CPU / 内存）。
+
+报告：TTFT 与端到端耗时的 p50/p95/p99、吞吐、每个流消耗的服务端 CPU、服务端内存峰值。
+
+    python -m benchmarks.load_generate --concurrency 8 --requests 200
+    python -m benchmarks.load_generate --upstream openai --tps 120 --error-rate 0.05 --output bench/generate.json
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+try:
+    from benchmarks import common
+    from benchmarks.mock_llm import add_config_args
+except ImportError:  # 以 python benchmarks/load_generate.py 方式运行时
+    import common
+    from mock_llm import add_config_args
+
+MOCK_MODELS = {"anthropic": "claude-mock", "openai": "gpt-mock"}
+
+
+class StreamResult:
+    def __init__(self) -> None:
+        self.status: Optional[int] = None
+        self.ttft: Optional[float] = None
+        self.total: Optional[float] = None
+        self.tokens = 0
+        self.error: Optional[str] = None
+        self.done = False
+
+
+async def run_stream(client: httpx.AsyncClient, url: str, topic: str) -> StreamResult:
+    """发起一次 /generate 并解析 SSE，记录首 token 与结束时间"""
+    result = StreamResult()
+    started = time.perf_counter()
+    try:
+        async with client.stream("POST", url, json={"topic": topic, "history": []}) as response:
+            result.status = response.status_code
+            if response.status_code >= 400:
+                await response.aread()
+                result.error = f"http_{response.status_code}"
+                return result
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                if line.startswith('data: {"token"'):
+                    result.tokens += 1
+                    if result.ttft is None:
+                        result.ttft = time.perf_counter() - started
+                elif line.startswith('data: {"error"'):
+                    result.error = "stream_error"
+                elif "[DONE]" in line:
+                    result.done = True
+        if result.error is None and not result.done:
+            result.error = "incomplete"
+    except httpx.HTTPError as e:
+        result.error = type(e).__name__
+    finally:
+        result.total = time.perf_counter() - started
+    return result
+
+
+async def drive(target: str, concurrency: int, requests: int, duration: Optional[float] = None) -> Dict[str, Any]:
+    """以固定并发持续发起请求，直到完成 requests 个或达到 duration 秒"""
+    url = target.rstrip("/") + "/generate"
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    timeout = httpx.Timeout(300.0, connect=10.0)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        results: List[StreamResult] = []
+        issued = 0
+        deadline = time.perf_counter() + duration if duration else None
+        started = time.perf_counter()
+
+        async def worker(worker_id: int) -> None:
+            nonlocal issued
+            while True:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                if deadline is None and issued >= requests:
+                    return
+                issued += 1
+                results.append(await run_stream(client, url, f"benchmark topic {worker_id}-{issued}"))
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {"results": results, "elapsed": elapsed}
+
+
+def build_report(run: Dict[str, Any], server: Optional[Dict[str, Any]], mock_stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    results: List[StreamResult] = run["results"]
+    elapsed = run["elapsed"]
+    ok = [r for r in results if r.error is None]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r.error is not None:
+            errors[r.error] = errors.get(r.error, 0) + 1
+    tokens = sum(r.tokens for r in results)
+
+    report: Dict[str, Any] = {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": errors,
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else None,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+        "tokens_per_second": round(tokens / elapsed, 1) if elapsed else None,
+        "ttft_ms": common.summarize([r.ttft for r in ok if r.ttft is not None], scale=1000),
+        "e2e_ms": common.summarize([r.total for r in ok], scale=1000),
+    }
+    if server is not None:
+        cpu = server.get("cpu_seconds")
+        report["server"] = {
+            **server,
+            "cpu_ms_per_stream": round(cpu * 1000 / len(results), 2) if cpu is not None and results else None,
+            "cpu_utilization": round(cpu / elapsed, 3) if cpu is not None and elapsed else None,
+        }
+    if mock_stats is not None:
+        report["upstream"] = mock_stats
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n请求: {report['requests']}  成功: {report['ok']}  错误: {report['errors'] or 0}  "
+          f"耗时: {report['elapsed_seconds']}s  吞吐: {report['throughput_rps']} req/s  "
+          f"输出: {report['tokens_per_second']} token/s\n")
+    rows = [[name, s["count"], s["p50"], s["p95"], s["p99"], s["mean"], s["max"]]
+            for name, s in (("TTFT (ms)", report["ttft_ms"]), ("端到端 (ms)", report["e2e_ms"]))]
+    common.print_table(rows, ["", "n", "p50", "p95", "p99", "mean", "max"])
+    server = report.get("server")
+    if server:
+        print(f"\n服务端 CPU: {server['cpu_seconds']}s（每个流 {server['cpu_ms_per_stream']} ms，"
+              f"利用率 {server['cpu_utilization']}）  RSS: {server['rss_start_mb']} → 峰值 {server['rss_peak_mb']} MB")
+    print()
+
+
+def start_stack(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    """启动模拟上游与应用子进程，返回 {"mock":…, "app":…, "target":…}"""
+    mock_port = common.free_port()
+    app_port = common.free_port()
+    mock_cmd = [
+        sys.executable, "-m", "benchmarks.mock_llm", "--port", str(mock_port),
+        "--ttft", str(args.ttft), "--ttft-jitter", str(args.ttft_jitter), "--tps", str(args.tps),
+        "--tokens", str(args.tokens), "--error-rate", str(args.error_rate),
+        "--error-status", str(args.error_status), "--midstream-error-rate", str(args.midstream_error_rate),
+        "--seed", str(args.seed),
+    ]
+    mock = subprocess.Popen(mock_cmd, cwd=common.ROOT)
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    common.wait_http(f"{mock_url}/_mock/stats", proc=mock)
+
+    env = {
+        **os.environ,
+        "API_KEY": "sk-benchmark-mock",
+        "BASE_URL": mock_url if args.upstream == "anthropic" else f"{mock_url}/v1",
+        "MODEL": args.model or MOCK_MODELS[args.upstream],
+        "RETENTION_ENABLED": "0",
+        "LOG_DIR": os.path.join(workdir, "logs"),
+    }
+    app_cmd = [
+        sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(app_port),
+        "--log-level", "warning", "--no-access-log",
+    ]
+    app_log = open(os.path.join(workdir, "app.stdout.log"), "wb")
+    app = subprocess.Popen(app_cmd, cwd=common.ROOT, env=env, stdout=app_log, stderr=subprocess.STDOUT)
+    target = f"http://127.0.0.1:{app_port}"
+    try:
+        common.wait_http(f"{target}/metrics", timeout=60, proc=app)
+    except Exception:
+        common.stop_process(mock)
+        raise
+    return {"mock": mock, "mock_url": mock_url, "app": app, "target": target, "app_log": app_log}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="/generate 负载测试（默认使用本地模拟上游，完全离线）")
+    parser.add_argument("--concurrency", "-c", type=int, default=8, help="并发流数量（默认 8）")
+    parser.add_argument("--requests", "-n", type=int, default=100, help="请求总数（默认 100）")
+    parser.add_argument("--duration", type=float, default=None, help="按时长运行（秒），设置后忽略 --requests")
+    parser.add_argument("--warmup", type=int, default=2, help="正式计时前的预热请求数")
+    parser.add_argument("--upstream", choices=sorted(MOCK_MODELS), default="anthropic", help="模拟上游协议")
+    parser.add_argument("--model", default=None, help="覆盖模型名（需与 --upstream 对应的协议一致）")
+    parser.add_argument("--target", default=None, help="压测已运行的服务（如 http://127.0.0.1:8000），不启动模拟上游")
+    parser.add_argument("--server-pid", type=int, default=None, help="--target 模式下采集该进程的 CPU / 内存")
+    parser.add_argument("--output", "-o", default=None, help="结果 JSON 路径")
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    stack = None
+    workdir = tempfile.mkdtemp(prefix="bench-generate-")
+    try:
+        if args.target:
+            target, server_pid = args.target, args.server_pid
+        else:
+            stack = start_stack(args, workdir)
+            target, server_pid = stack["target"], stack["app"].pid
+            print(f"模拟上游: {stack['mock_url']}  应用: {target}  日志: {workdir}")
+
+        # 预热请求不计入结果与上游统计
+        if args.warmup:
+            asyncio.run(drive(target, 1, args.warmup))
+        if stack is not None:
+            httpx.post(f"{stack['mock_url']}/_mock/reset")
+
+        sampler = common.ResourceSampler([server_pid]).start() if server_pid else None
+        run = asyncio.run(drive(target, args.concurrency, args.requests, args.duration))
+        server = sampler.stop()[server_pid] if sampler else None
+        mock_stats = httpx.get(f"{stack['mock_url']}/_mock/stats").json() if stack else None
+
+        report = build_report(run, server, mock_stats)
+        result = {
+            "benchmark": "generate",
+            "environment": common.environment(),
+            "params": {k: v for k, v in vars(args).items() if k != "output"},
+            "report": report,
+        }
+        print_report(report)
+        path = common.write_result(result, args.output)
+        if path:
+            print(f"结果已写入: {path}")
+        return 0 if report["ok"] else 1
+    finally:
+        if stack is not None:
+            common.stop_process(stack["app"])
+            common.stop_process(stack["mock"])
+            stack["app_log"].close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+录制产物（/output）并发播放基准
+
+在 output/ 下生成一个测试视频文件（随机内容），启动应用（uvicorn app:app）后模拟多个观看者并发：
+- 每个观看者先请求开头一段（Range: bytes=0-），随后随机拖动并按段读取（Range 请求）
+- 每个观看者结束前用 If-None-Match 重新验证一次（期望 304）
+
+报告：总吞吐（MB/s）、每次 Range 请求耗时的 p50/p95/p99、状态码分布、服务端 CPU 与内存；抽样校验返回内容
+与文件一致。--chunk-size 设置服务端读取块大小（MEDIA_CHUNK_SIZE），便于对比。
+
+    python -m benchmarks.media_serve --viewers 50 --duration 15
+    python -m benchmarks.media_serve --size-mb 256 --range-kb 2048 --chunk-size 65536 -o bench/media.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+try:
+    from benchmarks import common
+except ImportError:  # 以 python benchmarks/media_serve.py 方式运行时
+    import common
+
+
+def write_media(path: Path, size_mb: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+
+async def viewer(
+    client: httpx.AsyncClient,
+    url: str,
+    size: int,
+    range_bytes: int,
+    deadline: float,
+    rng: random.Random,
+    expected: Path,
+    stats: Dict[str, Any],
+) -> None:
+    offset = 0
+    etag = None
+    with open(expected, "rb") as f:
+        while time.monotonic() < deadline:
+            if rng.random() < 0.2:
+                offset = rng.randrange(0, size - 1)  # 拖动进度条
+            end = min(size, offset + range_bytes) - 1
+            started = time.perf_counter()
+            try:
+                resp = await client.get(url, headers={"Range": f"bytes={offset}-{end}"})
+            except httpx.HTTPError as e:
+                stats["errors"][type(e).__name__] += 1
+                continue
+            stats["latency"].append(time.perf_counter() - started)
+            stats["status"][resp.status_code] += 1
+            stats["bytes"] += len(resp.content)
+            etag = resp.headers.get("etag") or etag
+            if rng.random() < 0.02:
+                f.seek(offset)
+                if f.read(end - offset + 1) != resp.content:
+                    stats["mismatch"] += 1
+            offset = end + 1 if end + 1 < size else 0
+    if etag:
+        resp = await client.get(url, headers={"If-None-Match": etag})
+        stats["status"][resp.status_code] += 1
+
+
+async def drive(url: str, path: Path, viewers: int, duration: float, range_bytes: int, seed: int) -> Dict[str, Any]:
+    size = path.stat().st_size
+    stats: Dict[str, Any] = {"latency": [], "status": Counter(), "errors": Counter(), "bytes": 0, "mismatch": 0}
+    limits = httpx.Limits(max_connections=viewers, max_keepalive_connections=viewers)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(
+            viewer(client, url, size, range_bytes, deadline, random.Random(seed + i), path, stats)
+            for i in range(viewers)
+        ))
+        stats["elapsed"] = time.perf_counter() - started
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="/output 产物并发播放（Range / 304）基准")
+    parser.add_argument("--viewers", "-c", type=int, default=32, help="并发观看者数量（默认 32）")
+    parser.add_argument("--duration", type=float, default=10.0, help="运行时长（秒，默认 10）")
+    parser.add_argument("--size-mb", type=int, default=64, help="测试文件大小（MB，默认 64）")
+    parser.add_argument("--range-kb", type=int, default=1024, help="每次 Range 请求的大小（KB，默认 1024）")
+    parser.add_argument("--chunk-size", type=int, default=None, help="服务端读取块大小（字节，默认使用应用默认值）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", default=None, help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-media-")
+    media = common.ROOT / "output" / f"bench-media-{uuid.uuid4().hex[:8]}.mp4"
+    port = common.free_port()
+    env = {**os.environ, "LOG_DIR": os.path.join(workdir, "logs"), "RETENTION_ENABLED": "0", "PREWARM": "0"}
+    if args.chunk_size:
+        env["MEDIA_CHUNK_SIZE"] = str(args.chunk_size)
+    app = None
+    try:
+        write_media(media, args.size_mb)
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=common.ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        target = f"http://127.0.0.1:{port}"
+        common.wait_http(f"{target}/metrics", timeout=60, proc=app)
+        url = f"{target}/output/{media.name}"
+        head = httpx.head(url)
+        print(f"文件: {media.name}  {args.size_mb} MB  ETag: {head.headers.get('etag')}  "
+              f"Cache-Control: {head.headers.get('cache-control')}")
+
+        sampler = common.ResourceSampler([app.pid]).start()
+        stats = asyncio.run(drive(url, media, args.viewers, args.duration, args.range_kb * 1024, args.seed))
+        server = sampler.stop()[app.pid]
+    finally:
+        common.stop_process(app)
+        media.unlink(missing_ok=True)
+
+    megabytes = stats["bytes"] / 1024 / 1024
+    report: Dict[str, Any] = {
+        "throughput_mb_s": round(megabytes / stats["elapsed"], 1),
+        "transferred_mb": round(megabytes, 1),
+        "range_requests": len(stats["latency"]),
+        "latency_ms": common.summarize(stats["latency"], scale=1000),
+        "status": {str(k): v for k, v in sorted(stats["status"].items())},
+        "errors": dict(stats["errors"]),
+        "content_mismatch": stats["mismatch"],
+        "server": server,
+    }
+    failures: List[str] = []
+    if stats["mismatch"]:
+        failures.append(f"{stats['mismatch']} 个 Range 响应内容与文件不一致")
+    if set(report["status"]) - {"206", "304"}:
+        failures.append(f"出现非预期状态码: {report['status']}")
+    report["failures"] = failures
+
+    print(f"\n{args.viewers} 个观看者 / {args.duration}s: {report['throughput_mb_s']} MB/s，"
+          f"{report['range_requests']} 次 Range 请求，状态码 {report['status']}")
+    common.print_table(
+        [["Range 耗时 (ms)", report["latency_ms"]["p50"], report["latency_ms"]["p95"], report["latency_ms"]["p99"]]],
+        ["", "p50", "p95", "p99"],
+    )
+    print(f"服务端 CPU {server['cpu_seconds']}s，内存峰值 {server['rss_peak_mb']} MB")
+    for failure in failures:
+        print(f"失败: {failure}")
+
+    path = common.write_result(
+        {"benchmark": "media_serve", "environment": common.environment(), "params": vars(args), "report": report},
+        args.output,
+    )
+    if path:
+        print(f"结果已写入: {path}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
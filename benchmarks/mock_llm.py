@@ -0,0 +1,278 @@
+"""
+本地模拟 LLM 上游（离线）
+
+同一端口同时提供：
+- Anthropic Messages：POST /v1/messages（stream=true 时为 SSE：message_start → content_block_delta* → message_stop）
+- OpenAI Chat Completions：POST /v1/chat/completions（stream=true 时为 chat.completion.chunk + [DONE]），GET /v1/models
+
+可配置首 token 延迟（TTFT）、输出速率、输出长度与错误注入：
+- error_rate：在开始输出前直接返回 error_status
+- midstream_error_rate：输出到一半中断（Anthropic 发送 error 事件，OpenAI 直接断开连接）
+
+运行中可通过 POST /_mock/config 修改参数，GET /_mock/stats 查看请求计数。
+
+    python -m benchmarks.mock_llm --port 9100 --ttft 0.4 --tps 60 --tokens 600
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 模拟输出：一段完整的动画 HTML，按 token_chars 个字符切分为 token
+_HTML_SECTION = """<section class="scene" style="animation-delay: {i}s">
+  <svg viewBox="0 0 1280 720"><circle cx="{x}" cy="360" r="80" fill="#4a90e2"><animate attributeName="r" values="60;90;60" dur="2s" repeatCount="indefinite"/></circle></svg>
+  <p class="subtitle">第 {i} 段讲解 · Scene {i}</p>
+</section>
+"""
+_HTML_HEAD = """```html
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head><meta charset="UTF-8"><title>Mock Animation</title>
+<style>#animation-container{{width:1280px;height:720px;position:relative;overflow:hidden}}</style></head>
+<body><div id="animation-container">
+"""
+_HTML_TAIL = """</div>
+<script>setTimeout(() => window.markAnimationFinished && window.markAnimationFinished(), 3000);</script>
+</body></html>
+```"""
+
+
+class MockConfig:
+    def __init__(
+        self,
+        ttft: float = 0.4,
+        ttft_jitter: float = 0.1,
+        tps: float = 60.0,
+        tokens: int = 600,
+        token_chars: int = 4,
+        error_rate: float = 0.0,
+        error_status: int = 529,
+        midstream_error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.ttft = ttft
+        self.ttft_jitter = ttft_jitter
+        self.tps = tps
+        self.tokens = tokens
+        self.token_chars = token_chars
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.midstream_error_rate = midstream_error_rate
+        self.random = random.Random(seed or None)
+
+    def update(self, values: Dict[str, Any]) -> None:
+        for key, value in values.items():
+            if key in ("random",) or not hasattr(self, key):
+                raise ValueError(f"未知参数: {key}")
+            setattr(self, key, type(getattr(self, key))(value))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in vars(self).items() if k != "random"}
+
+    def token_list(self) -> List[str]:
+        text = _HTML_HEAD
+        i = 0
+        while len(text) < self.tokens * self.token_chars:
+            text += _HTML_SECTION.format(i=i, x=200 + (i * 97) % 900)
+            i += 1
+        body = text[: max(0, self.tokens * self.token_chars - len(_HTML_TAIL))] + _HTML_TAIL
+        return [body[j:j + self.token_chars] for j in range(0, len(body), self.token_chars)]
+
+    def first_token_delay(self) -> float:
+        return max(0.0, self.ttft + self.random.uniform(-self.ttft_jitter, self.ttft_jitter))
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    counters = {"requests": 0, "streams": 0, "injected_errors": 0, "midstream_errors": 0, "completed": 0, "in_flight": 0}
+
+    async def paced(tokens: List[str]) -> AsyncIterator[tuple]:
+        """按 TTFT + 固定速率输出 token；以绝对时间调度，避免 sleep 误差累积"""
+        start = time.perf_counter() + config.first_token_delay()
+        interval = 1.0 / config.tps if config.tps > 0 else 0.0
+        cut = len(tokens) // 2 if config.random.random() < config.midstream_error_rate else None
+        for i, token in enumerate(tokens):
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if cut is not None and i == cut:
+                counters["midstream_errors"] += 1
+                yield None, i
+                return
+            yield token, i
+
+    def injected_error(kind: str) -> JSONResponse:
+        counters["injected_errors"] += 1
+        if kind == "anthropic":
+            body = {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded (mock)"}}
+        else:
+            body = {"error": {"message": "Service unavailable (mock)", "type": "server_error", "code": None}}
+        return JSONResponse(body, status_code=config.error_status)
+
+    def counted(stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        async def wrapper() -> AsyncIterator[str]:
+            counters["streams"] += 1
+            counters["in_flight"] += 1
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                counters["in_flight"] -= 1
+        return wrapper()
+
+    @app.post("/v1/messages")
+    async def anthropic_messages(request: Request):
+        counters["requests"] += 1
+        body = await request.json()
+        if config.random.random() < config.error_rate:
+            return injected_error("anthropic")
+        model = body.get("model", "claude-mock")
+        tokens = config.token_list()[: max(1, int(body.get("max_tokens") or config.tokens))]
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+
+        def event(name: str, data: Dict[str, Any]) -> str:
+            return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.first_token_delay() + len(tokens) / max(config.tps, 1e-6))
+            counters["completed"] += 1
+            return JSONResponse({
+                "id": message_id, "type": "message", "role": "assistant", "model": model,
+                "content": [{"type": "text", "text": "".join(tokens)}],
+                "stop_reason": "end_turn",
+                "usage": {"input_tokens": 100, "output_tokens": len(tokens)},
+            })
+
+        async def stream() -> AsyncIterator[str]:
+            yield event("message_start", {"type": "message_start", "message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+                "stop_reason": None, "usage": {"input_tokens": 100, "output_tokens": 1}}})
+            yield event("content_block_start", {"type": "content_block_start", "index": 0,
+                                                "content_block": {"type": "text", "text": ""}})
+            yield event("ping", {"type": "ping"})
+            async for token, i in paced(tokens):
+                if token is None:
+                    yield event("error", {"type": "error", "error": {
+                        "type": "overloaded_error", "message": "Overloaded (mock, mid-stream)"}})
+                    return
+                yield event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                    "delta": {"type": "text_delta", "text": token}})
+            yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield event("message_delta", {"type": "message_delta",
+                                          "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                          "usage": {"output_tokens": len(tokens)}})
+            yield event("message_stop", {"type": "message_stop"})
+            counters["completed"] += 1
+
+        return StreamingResponse(counted(stream()), media_type="text/event-stream")
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        counters["requests"] += 1
+        body = await request.json()
+        if config.random.random() < config.error_rate:
+            return injected_error("openai")
+        model = body.get("model", "gpt-mock")
+        limit = body.get("max_tokens") or body.get("max_completion_tokens") or config.tokens
+        tokens = config.token_list()[: max(1, int(limit))]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.first_token_delay() + len(tokens) / max(config.tps, 1e-6))
+            counters["completed"] += 1
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": len(tokens), "total_tokens": 100 + len(tokens)},
+            })
+
+        def chunk(delta: Dict[str, Any], finish_reason: Any = None) -> str:
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        async def stream() -> AsyncIterator[str]:
+            yield chunk({"role": "assistant", "content": ""})
+            async for token, i in paced(tokens):
+                if token is None:
+                    # 模拟上游连接中断：不发送结束标记直接断开
+                    raise ConnectionResetError("mock mid-stream disconnect")
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+            counters["completed"] += 1
+
+        return StreamingResponse(counted(stream()), media_type="text/event-stream")
+
+    @app.get("/v1/models")
+    async def openai_models():
+        return {"object": "list", "data": [{"id": "gpt-mock", "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/_mock/stats")
+    async def mock_stats():
+        return {**counters, "config": config.as_dict()}
+
+    @app.post("/_mock/config")
+    async def mock_config(request: Request):
+        try:
+            config.update(await request.json())
+        except (ValueError, TypeError) as e:
+            return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
+        return {"ok": True, "config": config.as_dict()}
+
+    @app.post("/_mock/reset")
+    async def mock_reset():
+        for key in counters:
+            if key != "in_flight":
+                counters[key] = 0
+        return {"ok": True}
+
+    return app
+
+
+def add_config_args(parser: argparse.ArgumentParser) -> None:
+    """模拟上游参数（load_generate 复用同一组参数）"""
+    parser.add_argument("--ttft", type=float, default=0.4, help="首 token 延迟（秒，默认 0.4）")
+    parser.add_argument("--ttft-jitter", type=float, default=0.1, help="首 token 延迟的随机抖动（秒）")
+    parser.add_argument("--tps", type=float, default=60.0, help="每个流的输出速率（token/秒，默认 60）")
+    parser.add_argument("--tokens", type=int, default=600, help="每次输出的 token 数（默认 600）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="开始输出前返回错误的比例（0~1）")
+    parser.add_argument("--error-status", type=int, default=529, help="注入错误的 HTTP 状态码（默认 529）")
+    parser.add_argument("--midstream-error-rate", type=float, default=0.0, help="输出中途中断的比例（0~1）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（0 表示不固定）")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        ttft=args.ttft,
+        ttft_jitter=args.ttft_jitter,
+        tps=args.tps,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        midstream_error_rate=args.midstream_error_rate,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="本地模拟 LLM 上游（Anthropic / OpenAI 流式协议）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_config_args(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+录制性能基准
+
+对示例动画（examples/*.html）与合成压力页面（大量 SVG 路径 / 大量 CSS 动画）依次运行
+load_page_and_record 与转码（mp4 / gif），报告：
+
+- 浏览器启动、页面就绪、录制窗口、关闭上下文耗时（取自 tracing span）
+- 实时系数（录制耗时 / 视频时长）
+- 帧统计：webm 实际帧数、期望帧数、缺失帧（期望 - 实际）、重复帧（连续相同画面）
+- FFmpeg 转码耗时、本进程及子进程（浏览器 / FFmpeg）的 RSS 峰值、各输出文件大小
+
+结果写入 JSON（含 git 提交与机器信息），--compare 可与之前的结果对比。
+
+    python -m benchmarks.record_bench --duration 8 --mp4 --gif -o bench/record.json
+    python -m benchmarks.record_bench --cases svg_heavy,css_heavy --stress-count 3000 --compare bench/record.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from benchmarks import common
+except ImportError:  # 以 python benchmarks/record_bench.py 方式运行时
+    import common
+
+sys.path.insert(0, str(common.ROOT))
+from scripts import tracing  # noqa: E402
+from scripts.network_policy import NetworkPolicy  # noqa: E402
+from scripts.record_media import FFMPEG_BIN, load_page_and_record, transcode_outputs  # noqa: E402
+
+EXAMPLES = {
+    "demo": common.ROOT / "examples" / "demo.html",
+    "demo_simple": common.ROOT / "examples" / "demo_simple.html",
+    "22": common.ROOT / "examples" / "22.html",
+}
+_FRAME_RE = re.compile(r"frame=\s*(\d+)")
+_FPS_RE = re.compile(r"(\d+(?:\.\d+)?) fps")
+
+
+def svg_heavy_page(count: int) -> str:
+    """大量独立动画的 SVG 路径（考验光栅化）"""
+    paths = []
+    for i in range(count):
+        x, y = (i * 37) % 1280, (i * 53) % 720
+        paths.append(
+            f'<path d="M{x} {y} q 40 -60 80 0 t 80 0" stroke="hsl({i % 360},70%,50%)" stroke-width="2" fill="none">'
+            f'<animateTransform attributeName="transform" type="rotate" from="0 {x} {y}" to="360 {x} {y}" '
+            f'dur="{2 + i % 5}s" repeatCount="indefinite"/></path>'
+        )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="UTF-8"><title>svg_heavy</title>'
+        '<style>body{margin:0;background:#fff}</style></head><body>'
+        f'<svg width="1280" height="720" viewBox="0 0 1280 720">{"".join(paths)}</svg></body></html>'
+    )
+
+
+def css_heavy_page(count: int) -> str:
+    """大量并发 CSS 动画（变换 + 阴影 + 滤镜，考验合成与重绘）"""
+    cells = "".join(
+        f'<div class="c" style="left:{(i * 29) % 1240}px;top:{(i * 17) % 680}px;'
+        f'background:hsl({i % 360},70%,60%);animation-delay:-{(i % 20) / 10}s"></div>'
+        for i in range(count)
+    )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="UTF-8"><title>css_heavy</title><style>'
+        'body{margin:0;width:1280px;height:720px;position:relative;overflow:hidden;background:#f6f7fb}'
+        '.c{position:absolute;width:40px;height:40px;border-radius:8px;box-shadow:0 4px 12px rgba(0,0,0,.3);'
+        'filter:blur(0.5px);animation:spin 2s ease-in-out infinite alternate}'
+        '@keyframes spin{from{transform:rotate(0) scale(.6);opacity:.4}to{transform:rotate(180deg) scale(1.2);opacity:1}}'
+        f'</style></head><body>{cells}</body></html>'
+    )
+
+
+STRESS_PAGES: Dict[str, Callable[[int], str]] = {
+    "svg_heavy": svg_heavy_page,
+    "css_heavy": css_heavy_page,
+}
+
+
+def count_frames(path: Path) -> Dict[str, Optional[float]]:
+    """webm 的实际帧数、去重后的帧数与标称帧率（各需一次解码）"""
+    def run(extra: List[str]) -> str:
+        proc = subprocess.run(
+            [FFMPEG_BIN, "-hide_banner", "-i", str(path), *extra, "-f", "null", "-"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        return proc.stderr or ""
+
+    plain = run(["-map", "0:v:0"])
+    # mpdecimate 丢弃与前一帧几乎相同的帧，剩余帧数即"有新画面"的帧数
+    unique = run(["-map", "0:v:0", "-vf", "mpdecimate", "-fps_mode", "vfr"])
+    frames = _FRAME_RE.findall(plain)
+    unique_frames = _FRAME_RE.findall(unique)
+    fps = _FPS_RE.search(plain)
+    return {
+        "frames": int(frames[-1]) if frames else None,
+        "unique_frames": int(unique_frames[-1]) if unique_frames else None,
+        "nominal_fps": float(fps.group(1)) if fps else None,
+    }
+
+
+async def record_case(name: str, url: str, out_dir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    """录制并转码一个用例，返回单次结果"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stats: Dict[str, Any] = {}
+    quiet = io.StringIO()
+    sampler = common.ResourceSampler([os.getpid()], interval=0.1, tree=True).start()
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"case": name}
+    try:
+        with tracing.trace(name="record_bench", case=name) as current:
+            webm = await load_page_and_record(
+                url=url,
+                out_dir=out_dir,
+                width=args.width,
+                height=args.height,
+                fps=args.fps,
+                headless=True,
+                slow_mo=0,
+                wait_until=args.wait_until,
+                timeout=args.timeout,
+                start_delay=0.0,
+                duration=args.duration,
+                background=None,
+                script_steps=None,
+                network_policy=NetworkPolicy(offline=True),
+                stats=stats,
+            )
+            recorded = time.perf_counter()
+            transcode_started = time.perf_counter()
+            # run_ffmpeg 会打印完整的 FFmpeg 输出，基准运行时收起
+            with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet):
+                outputs = transcode_outputs(webm, out_dir / "output", mp4=args.mp4, gif=args.gif)
+            transcode_seconds = time.perf_counter() - transcode_started
+        spans = current.to_record()["spans"]
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["resources"] = sampler.stop()[os.getpid()]
+        return result
+    resources = sampler.stop()[os.getpid()]
+
+    def span_ms(span_name: str) -> Optional[float]:
+        matched = [s["duration_ms"] for s in spans if s["name"] == span_name]
+        return round(sum(matched), 1) if matched else None
+
+    record_seconds = recorded - started
+    video_seconds = stats.get("video_seconds") or 0
+    frames = count_frames(webm)
+    expected = round(video_seconds * frames["nominal_fps"]) if frames["nominal_fps"] else None
+    sizes = {"webm": webm.stat().st_size}
+    for kind, path in outputs.items():
+        sizes[kind] = Path(path).stat().st_size
+
+    result.update({
+        "browser_launch_ms": span_ms("browser_launch"),
+        "page_ready_ms": span_ms("page_load"),
+        "capture_ms": span_ms("end_wait"),
+        "context_close_ms": span_ms("context_close"),
+        "record_seconds": round(record_seconds, 3),
+        "video_seconds": video_seconds,
+        "realtime_factor": round(record_seconds / video_seconds, 3) if video_seconds else None,
+        "frames": frames["frames"],
+        "expected_frames": expected,
+        "dropped_frames": max(0, expected - frames["frames"]) if expected is not None and frames["frames"] is not None else None,
+        "duplicate_frames": (frames["frames"] - frames["unique_frames"])
+        if frames["frames"] is not None and frames["unique_frames"] is not None else None,
+        "ffmpeg_ms": span_ms("ffmpeg"),
+        "transcode_seconds": round(transcode_seconds, 3),
+        "rss_peak_mb": resources["rss_peak_mb"],
+        "output_bytes": sizes,
+        "ended_by": stats.get("ended_by"),
+    })
+    return result
+
+
+def aggregate(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """同一用例多次运行取中位数（字典 / 字符串字段取最后一次）"""
+    ok = [r for r in runs if "error" not in r]
+    summary: Dict[str, Any] = {"runs": len(runs), "errors": [r["error"] for r in runs if "error" in r]}
+    if not ok:
+        return summary
+    for key, value in ok[-1].items():
+        if value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)):
+            values = [r[key] for r in ok if isinstance(r.get(key), (int, float))]
+            summary[key] = round(common.percentile(values, 0.5), 3) if values else None
+        else:
+            summary[key] = value
+    return summary
+
+
+COMPARE_KEYS = [
+    "browser_launch_ms", "page_ready_ms", "realtime_factor", "dropped_frames",
+    "duplicate_frames", "transcode_seconds", "rss_peak_mb",
+]
+
+
+def print_summary(cases: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None) -> None:
+    headers = ["case", "launch ms", "ready ms", "rt factor", "frames", "dropped", "dup", "ffmpeg ms", "rss MB", "mp4 KB", "gif KB"]
+    rows = []
+    for name, s in cases.items():
+        if "frames" not in s:
+            rows.append([name, *(["ERR"] + [None] * (len(headers) - 2))])
+            continue
+        sizes = s.get("output_bytes") or {}
+        rows.append([
+            name, s.get("browser_launch_ms"), s.get("page_ready_ms"), s.get("realtime_factor"),
+            s.get("frames"), s.get("dropped_frames"), s.get("duplicate_frames"), s.get("ffmpeg_ms"),
+            s.get("rss_peak_mb"),
+            round(sizes["mp4"] / 1024) if "mp4" in sizes else None,
+            round(sizes["gif"] / 1024) if "gif" in sizes else None,
+        ])
+    print()
+    common.print_table(rows, headers)
+    for name, s in cases.items():
+        for error in s.get("errors") or []:
+            print(f"  ✗ {name}: {error}")
+
+    if baseline:
+        base_cases = baseline.get("cases", {})
+        base_commit = (baseline.get("environment") or {}).get("git_commit") or "?"
+        print(f"\n对比基线 {base_commit[:10]}（正值表示变大 / 变慢）")
+        rows = []
+        for name, s in cases.items():
+            old = base_cases.get(name)
+            if not old:
+                continue
+            row: List[Any] = [name]
+            for key in COMPARE_KEYS:
+                new_v, old_v = s.get(key), old.get(key)
+                if isinstance(new_v, (int, float)) and isinstance(old_v, (int, float)) and old_v:
+                    row.append(f"{(new_v - old_v) / old_v * 100:+.1f}%")
+                else:
+                    row.append(None)
+            rows.append(row)
+        common.print_table(rows, ["case", *COMPARE_KEYS])
+    print()
+
+
+async def run(args: argparse.Namespace, workdir: Path) -> Dict[str, Dict[str, Any]]:
+    cases: Dict[str, Dict[str, Any]] = {}
+    for name in args.cases:
+        if name in EXAMPLES:
+            url = EXAMPLES[name].resolve().as_uri()
+        else:
+            page = workdir / f"{name}.html"
+            page.write_text(STRESS_PAGES[name](args.stress_count), encoding="utf-8")
+            url = page.resolve().as_uri()
+        runs = []
+        for i in range(args.repeat):
+            print(f"▶ {name} ({i + 1}/{args.repeat})", flush=True)
+            runs.append(await record_case(name, url, workdir / f"{name}-{i}", args))
+        cases[name] = aggregate(runs)
+        cases[name]["samples"] = runs
+    return cases
+
+
+def main() -> int:
+    all_cases = [*EXAMPLES, *STRESS_PAGES]
+    parser = argparse.ArgumentParser(description="录制性能基准（示例动画 + 合成压力页面）")
+    parser.add_argument("--cases", default=",".join(all_cases), help=f"逗号分隔的用例（默认全部: {','.join(all_cases)}）")
+    parser.add_argument("--repeat", type=int, default=1, help="每个用例运行次数（报告取中位数）")
+    parser.add_argument("--duration", type=float, default=8.0, help="每次录制时长（秒，默认 8）")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=int, default=24)
+    parser.add_argument("--wait-until", default="ready", help="页面就绪判断（同 record_media --wait-until）")
+    parser.add_argument("--timeout", type=int, default=30000)
+    parser.add_argument("--mp4", action="store_true", help="测量 mp4 转码")
+    parser.add_argument("--gif", action="store_true", help="测量 gif 转码（palettegen + paletteuse）")
+    parser.add_argument("--stress-count", type=int, default=1500, help="压力页面中的元素数量（默认 1500）")
+    parser.add_argument("--keep", action="store_true", help="保留录制产物（默认运行结束后删除临时目录）")
+    parser.add_argument("--output", "-o", default=None, help="结果 JSON 路径")
+    parser.add_argument("--compare", default=None, help="与之前的结果 JSON 对比")
+    args = parser.parse_args()
+
+    args.cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in args.cases if c not in EXAMPLES and c not in STRESS_PAGES]
+    if unknown:
+        parser.error(f"未知用例: {', '.join(unknown)}（可选: {', '.join(all_cases)}）")
+    if not FFMPEG_BIN:
+        parser.error("未检测到 FFmpeg，可设置环境变量 FFMPEG_PATH 或安装 ffmpeg/imageio-ffmpeg")
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8")) if args.compare else None
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-record-"))
+    try:
+        cases = asyncio.run(run(args, workdir))
+    finally:
+        if args.keep:
+            print(f"录制产物: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "benchmark": "record",
+        "environment": common.environment(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "keep")},
+        "cases": cases,
+    }
+    print_summary(cases, baseline)
+    path = common.write_result(result, args.output)
+    if path:
+        print(f"结果已写入: {path}")
+    return 0 if all(not c.get("errors") for c in cases.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
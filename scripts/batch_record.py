@@ -0,0 +1,403 @@
+"""
+清单驱动的批量录制（record_media.py --manifest）
+
+清单为 YAML/JSON，可以是条目列表，也可以是 {"defaults": {...}, "items": [...]}：
+
+    defaults:
+      width: 1280
+      height: 720
+      mp4: true
+      end_event: recording:finished
+      end_timeout: 180000
+    items:
+      - html: lessons/01.html
+      - html: lessons/02.html
+        name: lesson-02
+        gif: true
+        idle_seconds: 3
+
+字段名与命令行参数一致（下划线形式）；优先级：命令行 < defaults < 条目。
+相对路径（html / script / out）以清单文件所在目录为基准。
+
+所有条目共享少量浏览器实例（每个条目使用独立的上下文），录制完成后立即释放录制槽位，
+转码在独立的队列中进行，与后续条目的录制重叠执行。结束后输出 JSON 汇总报告。
+"""
+import asyncio
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import yaml
+
+try:
+    from scripts.record_media import (
+        async_playwright, load_page_and_record, load_script_steps, metrics, transcode_outputs, which,
+    )
+except ImportError:  # 以 python scripts/record_media.py 方式运行时
+    from record_media import async_playwright, load_page_and_record, load_script_steps, metrics, transcode_outputs, which
+
+# 条目中允许出现的字段
+ENTRY_KEYS = {
+    "name", "url", "html", "width", "height", "fps", "duration", "start_delay", "wait_until", "timeout",
+    "background", "script", "script_steps", "out", "mp4", "gif", "gif_fps", "gif_width", "gif_dither",
+    "end_selector", "end_event", "end_function", "end_timeout", "idle_seconds", "idle_trim",
+    "offline", "allow_hosts", "deny_hosts",
+}
+_PATH_KEYS = ("html", "script", "out")
+# 每个浏览器实例承载的并发上下文数
+CONTEXTS_PER_BROWSER = 4
+
+
+def defaults_from_args(args: Any) -> Dict[str, Any]:
+    """把命令行参数转换为条目默认值"""
+    return {
+        "width": args.width,
+        "height": args.height,
+        "fps": args.fps,
+        "duration": args.duration,
+        "start_delay": args.start_delay,
+        "wait_until": args.wait_until,
+        "timeout": args.timeout,
+        "background": args.background,
+        "script": args.script,
+        "mp4": args.mp4,
+        "gif": args.gif,
+        "gif_fps": args.gif_fps,
+        "gif_width": args.gif_width,
+        "gif_dither": args.gif_dither,
+        "end_selector": args.end_selector,
+        "end_event": args.end_event,
+        "end_function": args.end_function,
+        "end_timeout": args.end_timeout,
+        "idle_seconds": args.idle_seconds,
+        "idle_trim": not args.no_idle_trim,
+        "offline": args.offline,
+        "allow_hosts": list(args.allow_host),
+        "deny_hosts": list(args.deny_host),
+    }
+
+
+def load_manifest(path: Path, base_defaults: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """读取清单并合并默认值，返回条目列表（无效条目带 error 字段，不中断整批）"""
+    text = path.read_text(encoding="utf-8")
+    data = json.loads(text) if path.suffix.lower() == ".json" else yaml.safe_load(text)
+    if isinstance(data, list):
+        defaults, items = {}, data
+    elif isinstance(data, dict):
+        defaults, items = data.get("defaults") or {}, data.get("items") or []
+    else:
+        raise ValueError("清单格式错误：应为条目列表或包含 items 的对象")
+
+    root = path.resolve().parent
+    entries: List[Dict[str, Any]] = []
+    used_names: Dict[str, int] = {}
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {"html": item}
+        entry: Dict[str, Any] = {**(base_defaults or {}), **defaults, **(item or {})}
+        entry["index"] = index
+        errors = []
+        unknown = set(defaults) | set(item or {})
+        unknown -= ENTRY_KEYS
+        if unknown:
+            errors.append(f"未知字段: {', '.join(sorted(unknown))}")
+        if bool(entry.get("url")) == bool(entry.get("html")):
+            errors.append("url 与 html 必须且只能指定一个")
+        for key in _PATH_KEYS:
+            if entry.get(key) and not Path(entry[key]).is_absolute():
+                entry[key] = str(root / entry[key])
+
+        source = entry.get("html") or entry.get("url") or ""
+        name = str(entry.get("name") or (Path(entry["out"]).stem if entry.get("out") else Path(source).stem) or f"item{index}")
+        # 同名条目追加序号，避免输出互相覆盖
+        if name in used_names:
+            used_names[name] += 1
+            name = f"{name}-{used_names[name]}"
+        else:
+            used_names[name] = 0
+        entry["name"] = name
+        if errors:
+            entry["error"] = "；".join(errors)
+        entries.append(entry)
+    return entries
+
+
+class BrowserPool:
+    """共享浏览器池：按需启动，每个浏览器最多承载 CONTEXTS_PER_BROWSER 个并发录制"""
+
+    def __init__(self, playwright: Any, size: int, headless: bool = True, slow_mo: int = 0):
+        self._playwright = playwright
+        self.size = max(1, size)
+        self.headless = headless
+        self.slow_mo = slow_mo
+        self.launched = 0
+        self._browsers: List[Any] = []
+        self._load: Dict[int, int] = {}
+        self._lock = asyncio.Lock()
+
+    async def _pick(self) -> Any:
+        async with self._lock:
+            # 剔除已断开（崩溃）的浏览器
+            for browser in [b for b in self._browsers if not b.is_connected()]:
+                self._browsers.remove(browser)
+                self._load.pop(id(browser), None)
+                metrics.BROWSERS.dec()
+            if len(self._browsers) < self.size and all(self._load[id(b)] > 0 for b in self._browsers):
+                browser = await self._playwright.chromium.launch(headless=self.headless, slow_mo=self.slow_mo)
+                self._browsers.append(browser)
+                self._load[id(browser)] = 0
+                self.launched += 1
+                metrics.BROWSERS.inc()
+            browser = min(self._browsers, key=lambda b: self._load[id(b)])
+            self._load[id(browser)] += 1
+            return browser
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        browser = await self._pick()
+        try:
+            yield browser
+        finally:
+            if id(browser) in self._load:
+                self._load[id(browser)] -= 1
+
+    async def close(self) -> None:
+        for browser in self._browsers:
+            with contextlib.suppress(Exception):
+                await browser.close()
+            metrics.BROWSERS.dec()
+        self._browsers.clear()
+
+
+class TranscodeQueue:
+    """FFmpeg 转码队列：固定数量的工作线程依次处理，与录制并行"""
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self.max_depth = 0
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self) -> None:
+        while True:
+            fn, future = await self._queue.get()
+            metrics.QUEUE_DEPTH.set(self._queue.qsize(), queue="transcode")
+            try:
+                result = await asyncio.to_thread(fn)
+                if not future.cancelled():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, fn: Callable[[], Any]) -> Awaitable[Any]:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((fn, future))
+        metrics.QUEUE_DEPTH.set(self._queue.qsize(), queue="transcode")
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return future
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def _run_entry(
+    entry: Dict[str, Any],
+    run_dir: Path,
+    output_dir: Path,
+    slots: asyncio.Semaphore,
+    pool: BrowserPool,
+    transcoder: TranscodeQueue,
+) -> Dict[str, Any]:
+    index, name = entry["index"], entry["name"]
+    item: Dict[str, Any] = {
+        "index": index,
+        "name": name,
+        "source": entry.get("html") or entry.get("url"),
+        "ok": False,
+    }
+    timings: Dict[str, float] = {}
+    item["timings"] = timings
+    queued = time.monotonic()
+    if entry.get("error"):
+        item["error"] = entry["error"]
+        return item
+
+    try:
+        url = entry.get("url")
+        if entry.get("html"):
+            html_path = Path(entry["html"])
+            if not html_path.exists():
+                raise FileNotFoundError(f"本地 HTML 不存在: {html_path}")
+            url = html_path.resolve().as_uri()
+        steps = entry.get("script_steps")
+        if steps is None and entry.get("script"):
+            steps = load_script_steps(Path(entry["script"]))
+
+        policy = None
+        if entry.get("offline") or entry.get("allow_hosts") or entry.get("deny_hosts"):
+            try:
+                from scripts.network_policy import NetworkPolicy
+            except ImportError:
+                from network_policy import NetworkPolicy
+            policy = NetworkPolicy(
+                offline=bool(entry.get("offline")),
+                allow_hosts=entry.get("allow_hosts"),
+                deny_hosts=entry.get("deny_hosts"),
+            )
+            if entry.get("url"):
+                policy.allow_origin_of(entry["url"])
+
+        stats: Dict[str, Any] = {}
+        async with slots:
+            started = time.monotonic()
+            timings["wait"] = round(started - queued, 3)
+            async with pool.acquire() as browser:
+                webm_path = await load_page_and_record(
+                    url=url,
+                    out_dir=run_dir / f"{index:03d}-{name}",
+                    width=int(entry["width"]),
+                    height=int(entry["height"]),
+                    fps=int(entry["fps"]),
+                    headless=pool.headless,
+                    slow_mo=pool.slow_mo,
+                    wait_until=entry["wait_until"],
+                    timeout=int(entry["timeout"]),
+                    start_delay=float(entry.get("start_delay") or 0),
+                    duration=float(entry["duration"]),
+                    background=entry.get("background"),
+                    script_steps=steps,
+                    end_selector=entry.get("end_selector"),
+                    end_event=entry.get("end_event"),
+                    end_function=entry.get("end_function"),
+                    end_timeout=entry.get("end_timeout"),
+                    idle_seconds=entry.get("idle_seconds"),
+                    idle_trim=entry.get("idle_trim", True),
+                    network_policy=policy,
+                    stats=stats,
+                    browser=browser,
+                )
+            timings["record"] = round(time.monotonic() - started, 3)
+        item["webm"] = str(webm_path)
+        item["recording"] = stats
+
+        # 录制槽位已释放，转码进入队列与后续录制并行
+        if entry.get("mp4") or entry.get("gif"):
+            base = Path(entry["out"]).with_suffix("") if entry.get("out") else output_dir / name
+            base.parent.mkdir(parents=True, exist_ok=True)
+            submitted = time.monotonic()
+
+            def transcode() -> Dict[str, Any]:
+                begun = time.monotonic()
+                outputs = transcode_outputs(
+                    webm_path, base,
+                    mp4=bool(entry.get("mp4")), gif=bool(entry.get("gif")),
+                    gif_fps=int(entry["gif_fps"]), gif_width=int(entry["gif_width"]),
+                    gif_dither=entry["gif_dither"],
+                )
+                return {"outputs": outputs, "wait": begun - submitted, "seconds": time.monotonic() - begun}
+
+            done = await transcoder.submit(transcode)
+            timings["transcode_wait"] = round(done["wait"], 3)
+            timings["transcode"] = round(done["seconds"], 3)
+            item["outputs"] = {
+                kind: {"path": path, "bytes": os.path.getsize(path)} for kind, path in done["outputs"].items()
+            }
+        item["ok"] = True
+    except Exception as e:
+        item["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        timings["total"] = round(time.monotonic() - queued, 3)
+    status = "OK" if item["ok"] else f"失败: {item.get('error')}"
+    print(f"[{index + 1}] {name}: {status} ({timings['total']}s)", flush=True)
+    return item
+
+
+async def run_manifest(
+    entries: List[Dict[str, Any]],
+    concurrency: int,
+    transcode_workers: int,
+    headless: bool = True,
+    slow_mo: int = 0,
+    output_dir: Path = Path("output"),
+) -> Dict[str, Any]:
+    """并发执行清单条目，返回汇总报告"""
+    if async_playwright is None:
+        raise RuntimeError("未安装 Playwright，请先 pip install playwright 并 playwright install chromium")
+    if any(entry.get("mp4") or entry.get("gif") for entry in entries) and not which("ffmpeg"):
+        raise RuntimeError("未找到 ffmpeg，可执行不在 PATH 中")
+
+    concurrency = max(1, concurrency)
+    run_dir = Path(".recordings") / f"batch-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    started = time.monotonic()
+
+    slots = asyncio.Semaphore(concurrency)
+    transcoder = TranscodeQueue(transcode_workers)
+    transcoder.start()
+    async with async_playwright() as p:
+        pool = BrowserPool(p, math.ceil(concurrency / CONTEXTS_PER_BROWSER), headless=headless, slow_mo=slow_mo)
+        try:
+            items = await asyncio.gather(*[
+                _run_entry(entry, run_dir, output_dir, slots, pool, transcoder) for entry in entries
+            ])
+        finally:
+            await pool.close()
+            await transcoder.close()
+
+    failed = [item for item in items if not item["ok"]]
+    return {
+        "started_at": started_at,
+        "total_seconds": round(time.monotonic() - started, 3),
+        "concurrency": concurrency,
+        "transcode_workers": transcoder.workers,
+        "browsers_launched": pool.launched,
+        "max_transcode_queue": transcoder.max_depth,
+        "recordings_dir": str(run_dir),
+        "count": len(items),
+        "succeeded": len(items) - len(failed),
+        "failed": len(failed),
+        "items": items,
+    }
+
+
+def run_from_args(args: Any) -> int:
+    """record_media.py --manifest 入口，返回进程退出码"""
+    manifest = Path(args.manifest)
+    if not manifest.exists():
+        print(f"清单文件不存在: {manifest}", file=sys.stderr)
+        return 1
+    try:
+        entries = load_manifest(manifest, defaults_from_args(args))
+    except (ValueError, yaml.YAMLError) as e:
+        print(f"清单解析失败: {e}", file=sys.stderr)
+        return 1
+
+    workers = args.transcode_workers or max(1, (os.cpu_count() or 2) // 2)
+    report = asyncio.run(run_manifest(
+        entries,
+        concurrency=args.concurrency,
+        transcode_workers=workers,
+        headless=args.headless,
+        slow_mo=args.slow_mo,
+    ))
+    report["manifest"] = str(manifest)
+
+    report_path = Path(args.report) if args.report else manifest.with_name(f"{manifest.stem}.report.json")
+    report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"批量录制完成: 成功 {report['succeeded']} / {report['count']}，耗时 {report['total_seconds']}s")
+    print(f"汇总报告: {report_path}")
+    return 0 if report["failed"] == 0 else 1
@@ -0,0 +1,451 @@
+"""
+产物目录（SQLite 索引）
+
+记录每个产物的主题、模型、哈希、尺寸、时长、大小与来源关系：
+
+    generation（一次 /generate 的 HTML 输出）
+      └─ html（录制时写入 .generated_html 的页面）
+           └─ recording（.recordings/<job_id>/*.webm）
+                ├─ mp4 / gif / playlist
+                └─ poster / sprite / vtt
+
+列表与搜索只查询索引（按 created_at, id 的游标分页），不遍历文件系统；产物被清理后标记
+deleted_at 而不是删除记录。主题搜索使用 FTS5（trigram 分词，支持中文子串），不可用或
+关键词少于 3 个字符时退回 LIKE。
+
+已有产物可用命令行导入一次：
+
+    python -m scripts.catalog --scan
+    python -m scripts.catalog --search 勾股定理 --kind mp4
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from scripts.shared_state import connect_sqlite
+except ImportError:  # 以 python scripts/catalog.py 方式运行时
+    from shared_state import connect_sqlite
+
+DEFAULT_CATALOG_PATH = ".state/catalog.db"
+
+KINDS = ("generation", "html", "recording", "mp4", "gif", "playlist", "poster", "sprite", "vtt")
+# 扫描已有文件时按扩展名推断类型
+_EXTENSION_KINDS = {
+    ".html": "html", ".webm": "recording", ".mp4": "mp4", ".gif": "gif", ".m3u8": "playlist",
+    ".jpg": "poster", ".webp": "poster", ".vtt": "vtt",
+}
+
+_COLUMNS = (
+    "id", "kind", "parent_id", "job_id", "topic", "model", "profile", "path", "url", "sha256",
+    "size_bytes", "width", "height", "fps", "duration", "created_at", "deleted_at", "meta",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    parent_id TEXT,
+    job_id TEXT,
+    topic TEXT,
+    model TEXT,
+    profile TEXT,
+    path TEXT,
+    url TEXT,
+    sha256 TEXT,
+    size_bytes INTEGER,
+    width INTEGER,
+    height INTEGER,
+    fps REAL,
+    duration REAL,
+    created_at REAL NOT NULL,
+    deleted_at REAL,
+    meta TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_created ON artifacts (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_kind_created ON artifacts (kind, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_parent ON artifacts (parent_id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_job ON artifacts (job_id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_sha256 ON artifacts (sha256);
+CREATE INDEX IF NOT EXISTS idx_artifacts_path ON artifacts (path);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS artifacts_fts USING fts5(topic, model, content='artifacts', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS artifacts_fts_insert AFTER INSERT ON artifacts BEGIN
+    INSERT INTO artifacts_fts (rowid, topic, model) VALUES (new.rowid, new.topic, new.model);
+END;
+CREATE TRIGGER IF NOT EXISTS artifacts_fts_delete AFTER DELETE ON artifacts BEGIN
+    INSERT INTO artifacts_fts (artifacts_fts, rowid, topic, model) VALUES ('delete', old.rowid, old.topic, old.model);
+END;
+CREATE TRIGGER IF NOT EXISTS artifacts_fts_update AFTER UPDATE OF topic, model ON artifacts BEGIN
+    INSERT INTO artifacts_fts (artifacts_fts, rowid, topic, model) VALUES ('delete', old.rowid, old.topic, old.model);
+    INSERT INTO artifacts_fts (rowid, topic, model) VALUES (new.rowid, new.topic, new.model);
+END;
+"""
+
+
+def new_id(kind: str) -> str:
+    return f"{kind}-{uuid.uuid4().hex[:16]}"
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def sha256_file(path: Path, chunk_size: int = 1 << 20) -> Optional[str]:
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def extract_html(text: str) -> Optional[str]:
+    """从模型完整输出中取出 ```html 代码块（与前端的解析方式一致）"""
+    start = text.find("```")
+    if start < 0:
+        return None
+    body = text[start + 3:]
+    if body.startswith("html\n"):
+        body = body[len("html\n"):]
+    end = body.find("```")
+    return body[:end] if end >= 0 else body
+
+
+def file_entry(kind: str, path: Path, **fields: Any) -> Dict[str, Any]:
+    """为磁盘上的文件构造目录条目（大小与 SHA-256 取自文件，文件不存在时为空）"""
+    path = Path(path)
+    try:
+        size: Optional[int] = path.stat().st_size
+    except OSError:
+        size = None
+    return {
+        "id": fields.pop("id", None) or new_id(kind),
+        "kind": kind,
+        "path": str(path.resolve()),
+        "size_bytes": size,
+        "sha256": sha256_file(path) if size is not None and path.is_file() else None,
+        **fields,
+    }
+
+
+def encode_cursor(created_at: float, artifact_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at!r}|{artifact_id}".encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """:raises ValueError: 游标格式错误"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, artifact_id = raw.split("|", 1)
+        return float(created_at), artifact_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
+
+class ArtifactCatalog:
+    """产物目录；数据库在第一次写入时创建，多个 worker 可共用同一个文件（WAL）"""
+
+    def __init__(self, path: Path, root: Optional[Path] = None):
+        self.path = Path(path)
+        self.root = (root or Path.cwd()).resolve()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.fts = False
+
+    def _connect(self, create: bool) -> Optional[sqlite3.Connection]:
+        if self._conn is not None:
+            return self._conn
+        if not create and not self.path.exists():
+            return None
+        conn = connect_sqlite(self.path)
+        conn.executescript(_SCHEMA)
+        try:
+            conn.executescript(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite 未编译 FTS5 或不支持 trigram 分词（< 3.34），搜索退回 LIKE
+            self.fts = False
+        conn.row_factory = sqlite3.Row
+        self._conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def add_many(self, entries: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        在一个事务中写入多个新条目，返回条目 id
+
+        条目只新增、不覆盖：id 已存在时整个事务回滚。
+
+        :raises sqlite3.IntegrityError: id 已存在
+        """
+        rows = []
+        now = time.time()
+        for entry in entries:
+            if entry.get("kind") not in KINDS:
+                raise ValueError(f"未知的产物类型: {entry.get('kind')}")
+            row = {column: entry.get(column) for column in _COLUMNS}
+            row["id"] = row["id"] or new_id(row["kind"])
+            row["created_at"] = row["created_at"] or now
+            row["meta"] = json.dumps(entry["meta"], ensure_ascii=False) if entry.get("meta") else None
+            rows.append(row)
+        if not rows:
+            return []
+        placeholders = ", ".join(f":{column}" for column in _COLUMNS)
+        with self._lock:
+            conn = self._connect(create=True)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    f"INSERT INTO artifacts ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+                    rows,
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return [row["id"] for row in rows]
+
+    def add(self, entry: Dict[str, Any]) -> str:
+        return self.add_many([entry])[0]
+
+    def mark_deleted(self, path: str) -> int:
+        """文件或目录被删除后，标记其（及目录下）的条目"""
+        if not self.path.exists():
+            return 0
+        resolved = str(Path(path).resolve())
+        with self._lock:
+            conn = self._connect(create=True)
+            return conn.execute(
+                "UPDATE artifacts SET deleted_at = ? WHERE deleted_at IS NULL AND (path = ? OR path LIKE ? ESCAPE '\\')",
+                (time.time(), resolved, _like_prefix(resolved.rstrip(os.sep) + os.sep)),
+            ).rowcount
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def _public(self, row: sqlite3.Row) -> Dict[str, Any]:
+        item = dict(row)
+        item["meta"] = json.loads(item["meta"]) if item["meta"] else {}
+        path = item.get("path")
+        if path:
+            try:
+                item["path"] = str(Path(path).relative_to(self.root))
+            except ValueError:
+                pass
+        return item
+
+    def get(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return None
+            row = conn.execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+        return self._public(row) if row else None
+
+    def find_by_sha256(self, sha256: str, kind: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """最近一个内容哈希相同的条目"""
+        sql = "SELECT * FROM artifacts WHERE sha256 = ?"
+        params: List[Any] = [sha256]
+        if kind:
+            sql += " AND kind = ?"
+            params.append(kind)
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return None
+            row = conn.execute(sql + " ORDER BY created_at DESC LIMIT 1", params).fetchone()
+        return self._public(row) if row else None
+
+    def find_by_path(self, path: str) -> Optional[Dict[str, Any]]:
+        """最近登记的、未被删除的同路径条目（path 为原始绝对路径）"""
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT * FROM artifacts WHERE path = ? AND deleted_at IS NULL ORDER BY created_at DESC LIMIT 1",
+                (str(Path(path).resolve()),),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def search(
+        self,
+        kind: Optional[str] = None,
+        q: Optional[str] = None,
+        model: Optional[str] = None,
+        job_id: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        include_deleted: bool = False,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按创建时间倒序分页查询，返回 (条目, 下一页游标)
+
+        :param q: 主题 / 模型关键词（空格分隔，全部匹配）
+        :raises ValueError: 游标格式错误
+        """
+        limit = max(1, min(int(limit), 200))
+        where: List[str] = []
+        params: List[Any] = []
+        join = ""
+        if kind:
+            where.append("a.kind = ?")
+            params.append(kind)
+        if model:
+            where.append("a.model = ?")
+            params.append(model)
+        if job_id:
+            where.append("a.job_id = ?")
+            params.append(job_id)
+        if parent_id:
+            where.append("a.parent_id = ?")
+            params.append(parent_id)
+        if not include_deleted:
+            where.append("a.deleted_at IS NULL")
+        if cursor:
+            created_at, artifact_id = decode_cursor(cursor)
+            where.append("(a.created_at, a.id) < (?, ?)")
+            params.extend([created_at, artifact_id])
+
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return [], None
+            terms = (q or "").split()
+            if terms and self.fts and all(len(term) >= 3 for term in terms):
+                join = "JOIN artifacts_fts f ON f.rowid = a.rowid"
+                where.append("artifacts_fts MATCH ?")
+                params.append(" ".join('"{}"'.format(term.replace('"', '""')) for term in terms))
+            else:
+                for term in terms:
+                    where.append("(a.topic LIKE ? ESCAPE '\\' OR a.model LIKE ? ESCAPE '\\')")
+                    pattern = f"%{_like_prefix(term)}"
+                    params.extend([pattern, pattern])
+            sql = (
+                f"SELECT a.* FROM artifacts a {join} "
+                f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+                "ORDER BY a.created_at DESC, a.id DESC LIMIT ?"
+            )
+            rows = conn.execute(sql, [*params, limit + 1]).fetchall()
+
+        items = [self._public(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1]["created_at"], rows[limit - 1]["id"]) if len(rows) > limit else None
+        return items, next_cursor
+
+    def lineage(self, artifact_id: str, max_depth: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+        """上游（从近到远）与全部下游产物"""
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return {"ancestors": [], "descendants": []}
+            ancestors = conn.execute(
+                "WITH RECURSIVE up(id, parent_id, depth) AS ("
+                "  SELECT id, parent_id, 0 FROM artifacts WHERE id = ?"
+                "  UNION ALL SELECT a.id, a.parent_id, up.depth + 1 FROM artifacts a JOIN up ON a.id = up.parent_id"
+                "  WHERE up.depth < ?"
+                ") SELECT a.* FROM up JOIN artifacts a ON a.id = up.id WHERE up.depth > 0 ORDER BY up.depth",
+                (artifact_id, max_depth),
+            ).fetchall()
+            descendants = conn.execute(
+                "WITH RECURSIVE down(id, depth) AS ("
+                "  SELECT id, 0 FROM artifacts WHERE id = ?"
+                "  UNION ALL SELECT a.id, down.depth + 1 FROM artifacts a JOIN down ON a.parent_id = down.id"
+                "  WHERE down.depth < ?"
+                ") SELECT a.* FROM down JOIN artifacts a ON a.id = down.id WHERE down.depth > 0"
+                " ORDER BY down.depth, a.created_at",
+                (artifact_id, max_depth),
+            ).fetchall()
+        return {
+            "ancestors": [self._public(row) for row in ancestors],
+            "descendants": [self._public(row) for row in descendants],
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _like_prefix(value: str) -> str:
+    """转义 LIKE 通配符，返回以 % 结尾的前缀模式"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def open_catalog(path: Optional[str] = None) -> ArtifactCatalog:
+    return ArtifactCatalog(Path(path or os.getenv("CATALOG_PATH") or DEFAULT_CATALOG_PATH))
+
+
+def scan(catalog: ArtifactCatalog, root: Path) -> int:
+    """把已有产物导入目录（已登记的路径跳过）；.recordings/<job_id>/ 下的文件按任务归组"""
+    known = set()
+    if catalog.path.exists():
+        with catalog._lock:
+            conn = catalog._connect(create=False)
+            known = {row[0] for row in conn.execute("SELECT path FROM artifacts WHERE path IS NOT NULL")}
+    entries = []
+    for directory in (".generated_html", ".recordings", "output"):
+        base = root / directory
+        if not base.is_dir():
+            continue
+        for path in sorted(base.rglob("*")):
+            kind = _EXTENSION_KINDS.get(path.suffix.lower())
+            if kind is None or not path.is_file() or str(path.resolve()) in known:
+                continue
+            if path.suffix.lower() in (".jpg", ".webp") and path.stem.endswith("-sprite"):
+                kind = "sprite"
+            job_id = path.parent.name if path.parent != base else None
+            entries.append(file_entry(kind, path, job_id=job_id, created_at=path.stat().st_mtime,
+                                      url=_public_url(root, path)))
+    catalog.add_many(entries)
+    return len(entries)
+
+
+def _public_url(root: Path, path: Path) -> Optional[str]:
+    relative = path.resolve().relative_to(root.resolve())
+    if relative.parts[0] == ".recordings":
+        return "/recordings/" + "/".join(relative.parts[1:])
+    if relative.parts[0] == "output":
+        return "/output/" + "/".join(relative.parts[1:])
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="产物目录：导入已有产物 / 命令行搜索")
+    parser.add_argument("--catalog", default=None, help=f"目录数据库路径（默认 CATALOG_PATH 或 {DEFAULT_CATALOG_PATH}）")
+    parser.add_argument("--root", default=".", help="项目根目录（默认当前目录）")
+    parser.add_argument("--scan", action="store_true", help="导入 .generated_html / .recordings / output 中尚未登记的文件")
+    parser.add_argument("--search", default=None, help="按主题 / 模型搜索")
+    parser.add_argument("--kind", default=None, choices=KINDS, help="只列出指定类型")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    catalog = ArtifactCatalog(Path(args.catalog or os.getenv("CATALOG_PATH") or root / DEFAULT_CATALOG_PATH), root)
+    if args.scan:
+        print(f"已导入 {scan(catalog, root)} 个产物")
+    if args.search is not None or not args.scan:
+        items, _ = catalog.search(kind=args.kind, q=args.search, limit=args.limit)
+        for item in items:
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(item["created_at"]))
+            print(f"{created}  {item['kind']:<10} {item['id']:<28} {item.get('topic') or '-'}  {item.get('path') or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+/test-config 的验证结果缓存、并发合并与限流
+
+- 结果按 (api_key 摘要, base_url, model) 缓存：成功结果 ok_ttl 秒，明确的失败（密钥无效、
+  模型不存在等）fail_ttl 秒；超时 / 429 / 5xx 等临时错误不缓存
+- 相同参数的并发验证只向上游发起一次请求，其余请求等待同一结果
+- 未命中缓存的验证按客户端 IP 限流（固定窗口），命中缓存不计入
+- 传入共享状态（scripts.shared_state）时结果保存在其中，多个 worker 共用（读写在线程中执行，
+  不阻塞事件循环）；并发合并仍在进程内
+
+缓存键只保存 API Key 的 SHA-256 摘要，不保存明文。
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# 探测函数返回 (结果, 是否可缓存)
+Probe = Callable[[], Awaitable[Tuple[Dict[str, Any], bool]]]
+
+STATE_NAMESPACE = "config_probe"
+
+
+class RateLimited(Exception):
+    """未命中缓存的验证超出限流"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def probe_key(api_key: str, base_url: str, model: str) -> Tuple[str, str, str]:
+    digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    return digest, base_url.rstrip("/"), model
+
+
+class ProbeCache:
+    """带 TTL 的验证结果缓存，并合并相同键的并发验证"""
+
+    def __init__(self, ok_ttl: float = 600.0, fail_ttl: float = 60.0, max_entries: int = 256, store: Any = None):
+        self.ok_ttl = ok_ttl
+        self.fail_ttl = fail_ttl
+        self.max_entries = max_entries
+        self.store = store
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str, str], "asyncio.Future[Dict[str, Any]]"] = {}
+
+    def get(self, key: Tuple[str, str, str], now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        if self.store is not None:
+            return self.store.get(STATE_NAMESPACE, "|".join(key))
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if (now if now is not None else time.monotonic()) >= expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: Tuple[str, str, str], result: Dict[str, Any]) -> None:
+        ttl = self.ok_ttl if result.get("ok") else self.fail_ttl
+        if ttl <= 0:
+            return
+        if self.store is not None:
+            self.store.put(STATE_NAMESPACE, "|".join(key), result, ttl=ttl)
+            self.store.prune(STATE_NAMESPACE, self.max_entries)
+            return
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Tuple[str, str, str]] = None) -> None:
+        if self.store is not None:
+            if key is None:
+                self.store.prune(STATE_NAMESPACE, 0)
+            else:
+                self.store.delete(STATE_NAMESPACE, "|".join(key))
+            return
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def inflight(self, key: Tuple[str, str, str]) -> bool:
+        return key in self._inflight
+
+    async def _get(self, key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+        if self.store is not None:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def _put(self, key: Tuple[str, str, str], result: Dict[str, Any]) -> None:
+        if self.store is None:
+            self.put(key, result)
+            return
+        try:
+            await asyncio.to_thread(self.put, key, result)
+        except Exception:
+            pass  # 共享状态写入失败只影响缓存，不影响本次验证结果
+
+    async def run(
+        self,
+        key: Tuple[str, str, str],
+        probe: Probe,
+        admit: Optional[Callable[[], Optional[float]]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        返回 (结果, 来源)，来源为 "cache" / "coalesced" / "upstream"
+
+        发起验证的请求被取消时，等待同一结果的请求也会收到取消。
+
+        :param admit: 可选，需要请求上游时调用（命中缓存或合并到进行中的验证时不调用）；
+            返回 None 表示允许，否则为需等待的秒数
+        :raises RateLimited: admit 拒绝
+        """
+        cached = await self._get(key)
+        if cached is not None:
+            return cached, "cache"
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future), "coalesced"
+        if admit is not None:
+            retry_after = admit()
+            if retry_after is not None:
+                raise RateLimited(retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result, cacheable = await probe()
+            if cacheable:
+                await self._put(key, result)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # 避免无人等待时出现 "exception was never retrieved"
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, "upstream"
+        finally:
+            self._inflight.pop(key, None)
+
+
+class RateLimiter:
+    """按键（客户端 IP）的固定窗口限流"""
+
+    def __init__(self, limit: int, window: float = 60.0, max_keys: int = 4096):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+
+    def hit(self, key: str, now: Optional[float] = None) -> Optional[float]:
+        """
+        记录一次调用；允许时返回 None，超限时返回需等待的秒数
+        """
+        if self.limit <= 0:
+            return None
+        now = now if now is not None else time.monotonic()
+        started, count = self._windows.get(key, (now, 0))
+        if now - started >= self.window:
+            started, count = now, 0
+        if count >= self.limit:
+            return max(0.0, started + self.window - now)
+        self._windows[key] = (started, count + 1)
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+        return None
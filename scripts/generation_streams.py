@@ -0,0 +1,202 @@
+"""
+可续传的生成流（SSE 事件编号 + 环形缓冲 + Last-Event-ID 重放）
+
+每次 /generate 对应一个 GenerationStream：上游生成在独立任务中运行，事件按 1, 2, 3… 编号写入有界环形缓冲，
+HTTP 响应只是它的一个订阅者。客户端断开后上游继续运行 grace 秒；期间客户端以
+
+    GET /generate/{generation_id}
+    Last-Event-ID: <最后收到的事件编号>
+
+重新连接时，先重放缓冲中之后的事件，再继续接收实时事件。超过 grace 秒无人订阅时取消上游生成；生成结束后
+流在内存中再保留 grace 秒供重放。
+
+流只保存在处理该请求的 worker 进程中（多 worker 部署时续传请求需要会话保持）。
+"""
+import asyncio
+import itertools
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Optional, Tuple
+
+
+class ReplayUnavailable(Exception):
+    """请求的事件已从环形缓冲中淘汰，无法续传"""
+
+
+def format_event(seq: int, chunk: str) -> str:
+    """为 SSE 事件（"data: …\\n\\n"）加上 id 字段"""
+    return f"id: {seq}\n{chunk}"
+
+
+def parse_last_event_id(value: Optional[str]) -> int:
+    """:raises ValueError: 不是非负整数"""
+    if value is None or value.strip() == "":
+        return 0
+    seq = int(value.strip())
+    if seq < 0:
+        raise ValueError("Last-Event-ID 不能为负数")
+    return seq
+
+
+class GenerationStream:
+    """单次生成的事件缓冲与订阅者管理"""
+
+    def __init__(self, generation_id: str, max_events: int):
+        self.generation_id = generation_id
+        self.buffer: Deque[Tuple[int, str]] = deque(maxlen=max_events)
+        self.last_seq = 0
+        self.done = False
+        self.subscribers = 0
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional["asyncio.Task[None]"] = None
+        self._changed = asyncio.Condition()
+        self._expiry: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def first_seq(self) -> int:
+        return self.buffer[0][0] if self.buffer else self.last_seq + 1
+
+    def replayable(self, after: int) -> bool:
+        """编号 after 之后的事件是否仍全部在缓冲中"""
+        return min(after, self.last_seq) + 1 >= self.first_seq
+
+    async def append(self, chunk: str) -> None:
+        async with self._changed:
+            self.last_seq += 1
+            self.buffer.append((self.last_seq, chunk))
+            self._changed.notify_all()
+
+    async def finish(self) -> None:
+        async with self._changed:
+            self.done = True
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    async def events(self, after: int = 0) -> AsyncIterator[str]:
+        """
+        从编号 after 之后开始输出事件（先重放缓冲，再等待实时事件），生成结束后返回
+
+        :raises ReplayUnavailable: after 之后的部分事件已被淘汰
+        """
+        after = min(after, self.last_seq)
+        if not self.replayable(after):
+            raise ReplayUnavailable(
+                f"事件 {after + 1}–{self.first_seq - 1} 已超出重放缓冲（保留最近 {self.buffer.maxlen} 个事件）")
+        seq = after
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.last_seq > seq or self.done)
+                if self.last_seq > seq and seq + 1 < self.first_seq:
+                    # 订阅者读取过慢，未发送的事件已被覆盖
+                    raise ReplayUnavailable(f"事件 {seq + 1} 已超出重放缓冲")
+                pending = list(itertools.islice(self.buffer, seq + 1 - self.first_seq, None)) \
+                    if self.last_seq > seq else []
+                finished = self.done
+            for event_seq, chunk in pending:
+                yield format_event(event_seq, chunk)
+                seq = event_seq
+            if finished and seq >= self.last_seq:
+                return
+
+
+class GenerationStreams:
+    """进程内的生成流注册表"""
+
+    def __init__(
+        self,
+        max_events: int = 8192,
+        grace_seconds: float = 30.0,
+        max_streams: int = 256,
+        cancelled_event: Optional[str] = None,
+        logger=None,
+    ):
+        """
+        :param max_events: 每个流重放缓冲保留的事件数
+        :param grace_seconds: 无订阅者时上游继续生成的时长，以及生成结束后流的保留时长
+        :param max_streams: 同时保留的流数量上限（超出时淘汰最早结束的流）
+        :param cancelled_event: 可选，上游生成被取消时追加到流末尾的事件（让之后续传的客户端知道生成未完成）
+        """
+        self.max_events = max_events
+        self.cancelled_event = cancelled_event
+        self.grace_seconds = grace_seconds
+        self.max_streams = max_streams
+        self.logger = logger
+        self._streams: "OrderedDict[str, GenerationStream]" = OrderedDict()
+
+    def __contains__(self, generation_id: str) -> bool:
+        return generation_id in self._streams
+
+    def get(self, generation_id: str) -> Optional[GenerationStream]:
+        return self._streams.get(generation_id)
+
+    def start(self, generation_id: str, source: AsyncIterator[str]) -> GenerationStream:
+        """在后台任务中消费 source（上游事件），返回对应的流"""
+        stream = GenerationStream(generation_id, self.max_events)
+        self._streams[generation_id] = stream
+        self._evict()
+        stream.task = asyncio.create_task(self._pump(stream, source))
+        return stream
+
+    async def _pump(self, stream: GenerationStream, source: AsyncIterator[str]) -> None:
+        try:
+            async for chunk in source:
+                await stream.append(chunk)
+        except asyncio.CancelledError:
+            if self.cancelled_event is not None:
+                await stream.append(self.cancelled_event)
+            raise
+        finally:
+            await stream.finish()
+            self._schedule(stream, self._remove)
+
+    async def subscribe(self, stream: GenerationStream, after: int = 0) -> AsyncIterator[str]:
+        """订阅流的事件；订阅结束（含客户端断开）后若无其他订阅者，开始 grace 计时"""
+        stream.subscribers += 1
+        if stream._expiry is not None and not stream.done:
+            stream._expiry.cancel()
+            stream._expiry = None
+        try:
+            async for event in stream.events(after):
+                yield event
+        finally:
+            stream.subscribers -= 1
+            if stream.subscribers == 0 and not stream.done:
+                self._schedule(stream, self._abandon)
+
+    def _schedule(self, stream: GenerationStream, callback) -> None:
+        if stream._expiry is not None:
+            stream._expiry.cancel()
+        stream._expiry = asyncio.get_running_loop().call_later(self.grace_seconds, callback, stream)
+
+    def _abandon(self, stream: GenerationStream) -> None:
+        """grace 期内无人重新连接：取消上游生成"""
+        stream._expiry = None
+        if stream.subscribers == 0 and not stream.done and stream.task is not None:
+            if self.logger is not None:
+                self.logger.info("生成流 %s 在 %ss 内无人续传，取消上游生成", stream.generation_id, self.grace_seconds)
+            stream.task.cancel()
+
+    def _remove(self, stream: GenerationStream) -> None:
+        stream._expiry = None
+        if self._streams.get(stream.generation_id) is stream:
+            del self._streams[stream.generation_id]
+
+    def _evict(self) -> None:
+        """超出上限时优先淘汰已结束的流（进行中的流不淘汰）"""
+        for generation_id in list(self._streams):
+            if len(self._streams) <= self.max_streams:
+                break
+            stream = self._streams[generation_id]
+            if stream.done:
+                if stream._expiry is not None:
+                    stream._expiry.cancel()
+                del self._streams[generation_id]
+
+    def cancel_all(self) -> None:
+        for stream in list(self._streams.values()):
+            if stream._expiry is not None:
+                stream._expiry.cancel()
+            if stream.task is not None and not stream.task.done():
+                stream.task.cancel()
+        self._streams.clear()
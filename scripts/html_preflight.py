@@ -0,0 +1,250 @@
+"""
+录制前的 HTML 静态预检（无需启动浏览器）
+
+- 检测文档是否被截断（如 max_tokens 用尽导致缺少 </html>），并尝试自动补全闭合标签
+- 列出外部资源引用（离线渲染节点无法访问）
+- 统计 markAnimationFinished() 调用，估算动画时长
+- 据此推导录制的结束策略与超时
+"""
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+
+# 需要跟踪闭合情况的结构性标签
+_STRUCTURAL_TAGS = ("html", "head", "body", "script", "style")
+# 会触发资源加载的属性（<a href> 不算）
+_RESOURCE_ATTRS = {"src", "href", "poster", "data"}
+_EXTERNAL_RE = re.compile(r"^(?:https?:)?//", re.IGNORECASE)
+_CSS_URL_RE = re.compile(r"""(?:url\(\s*['"]?|@import\s+['"])((?:https?:)?//[^'")\s]+)""", re.IGNORECASE)
+
+_BLOCK_COMMENT_RE = re.compile(r"/\*[\s\S]*?\*/")
+_LINE_COMMENT_RE = re.compile(r"(?<![:\\'\"])//[^\n]*")
+_FINISH_DEF_RE = re.compile(r"function\s+markAnimationFinished\s*\(|markAnimationFinished\s*=\s*(?:function|\()")
+_FINISH_CALL_RE = re.compile(r"markAnimationFinished\s*\(")
+_AWAIT_SLEEP_RE = re.compile(r"await\s+(?:[\w$.]*?(?:sleep|wait|delay|pause))\s*\(\s*(\d+(?:\.\d+)?)\s*\)", re.IGNORECASE)
+_TIMELINE_KEY_RE = re.compile(r"\b(?:time|at|start|startTime|delay|timestamp)\s*:\s*(\d+(?:\.\d+)?)\b")
+_CSS_TIME_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s)\b")
+_CSS_ANIMATION_RE = re.compile(r"animation(?:-duration|-delay|-iteration-count)?\s*:\s*([^;}]+)", re.IGNORECASE)
+
+
+class _DocumentScanner(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.stack: List[str] = []
+        self.external: List[str] = []
+        self.scripts: List[str] = []
+        self.styles: List[str] = []
+        self.element_count = 0
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self.element_count += 1
+        if tag in _STRUCTURAL_TAGS:
+            self.stack.append(tag)
+        if tag == "a":
+            return
+        for name, value in attrs:
+            if name in _RESOURCE_ATTRS and value and _EXTERNAL_RE.match(value.strip()):
+                self.external.append(value.strip())
+            elif name == "style" and value:
+                self.external.extend(_CSS_URL_RE.findall(value))
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.stack:
+            # 弹出到最近的同名标签
+            while self.stack:
+                if self.stack.pop() == tag:
+                    break
+
+    def handle_data(self, data: str) -> None:
+        if not self.stack:
+            return
+        if self.stack[-1] == "script":
+            self.scripts.append(data)
+        elif self.stack[-1] == "style":
+            self.styles.append(data)
+
+
+def _strip_js_comments(code: str) -> str:
+    return _LINE_COMMENT_RE.sub("", _BLOCK_COMMENT_RE.sub("", code))
+
+
+def _call_args(code: str, name: str) -> List[str]:
+    """取出 name(...) 调用的完整参数文本（按括号深度匹配）"""
+    args = []
+    for m in re.finditer(rf"\b{name}\s*\(", code):
+        depth, i = 1, m.end()
+        while i < len(code) and depth:
+            if code[i] == "(":
+                depth += 1
+            elif code[i] == ")":
+                depth -= 1
+            i += 1
+        args.append(code[m.end():i - 1])
+    return args
+
+
+def _last_top_level_arg(arg_text: str) -> str:
+    depth = 0
+    last = 0
+    for i, ch in enumerate(arg_text):
+        if ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            last = i + 1
+    return arg_text[last:].strip()
+
+
+def _estimate_js_ms(code: str) -> float:
+    """JS 时间轴估算：取 setTimeout 最大延时、时间轴数组中的最大时间点与顺序 await sleep() 之和的较大者"""
+    longest = 0.0
+    for value in _TIMELINE_KEY_RE.findall(code):
+        if float(value) >= 100:  # 时间轴数组一般以毫秒为单位
+            longest = max(longest, float(value))
+    for args in _call_args(code, "setTimeout"):
+        delay = _last_top_level_arg(args)
+        if re.fullmatch(r"\d+(?:\.\d+)?", delay):
+            longest = max(longest, float(delay))
+
+    sequential = 0.0
+    for value in _AWAIT_SLEEP_RE.findall(code):
+        v = float(value)
+        sequential += v * 1000 if v < 100 else v  # 小数值按秒处理
+    return max(longest, sequential)
+
+
+def _estimate_css_ms(css: str) -> Tuple[float, bool]:
+    """CSS 动画估算：delay + duration × 次数；返回 (毫秒, 是否存在无限循环动画)"""
+    longest = 0.0
+    infinite = False
+    for decl in _CSS_ANIMATION_RE.findall(css):
+        for part in decl.split(","):
+            if "infinite" in part:
+                infinite = True
+                continue
+            times = [float(v) * (1 if unit == "ms" else 1000) for v, unit in _CSS_TIME_RE.findall(part)]
+            if not times:
+                continue
+            iterations = 1.0
+            count = re.search(r"(?<![\d.])(\d+(?:\.\d+)?)(?![\d.]*(?:ms|s|%|px|deg))", part)
+            if count and len(times) <= 2:
+                iterations = max(1.0, float(count.group(1)))
+            duration = times[0]
+            delay = times[1] if len(times) > 1 else 0.0
+            longest = max(longest, delay + duration * iterations)
+    return longest, infinite
+
+
+def analyze_html(text: str) -> Dict[str, Any]:
+    """
+    静态分析 HTML 文本
+
+    :return: 预检报告，其中 end_strategy 为推荐的录制结束参数
+    """
+    report: Dict[str, Any] = {
+        "ok": True,
+        "errors": [],
+        "warnings": [],
+        "size": len(text or ""),
+        "truncated": False,
+        "unclosed_tags": [],
+        "external_resources": [],
+        "finish_calls": 0,
+        "has_finish_marker": False,
+        "infinite_animations": False,
+        "estimated_duration": None,
+        "end_strategy": {},
+    }
+    if not text or not text.strip():
+        report["ok"] = False
+        report["errors"].append("HTML 内容为空")
+        return report
+
+    scanner = _DocumentScanner()
+    try:
+        scanner.feed(text)
+        scanner.close()
+    except Exception as e:
+        report["warnings"].append(f"HTML 解析异常: {e}")
+
+    if scanner.element_count == 0:
+        report["ok"] = False
+        report["errors"].append("内容不是 HTML 文档")
+        return report
+
+    # 截断检测：未闭合的结构性标签或缺少 </html>
+    report["unclosed_tags"] = list(scanner.stack)
+    if scanner.stack or not re.search(r"</html\s*>", text, re.IGNORECASE):
+        report["truncated"] = True
+        where = f"（停在 <{scanner.stack[-1]}> 内）" if scanner.stack else ""
+        report["warnings"].append(f"文档可能被截断{where}")
+
+    css = "\n".join(scanner.styles)
+    js = _strip_js_comments("\n".join(scanner.scripts))
+
+    external = list(scanner.external) + _CSS_URL_RE.findall(css)
+    report["external_resources"] = sorted(set(external))
+    if report["external_resources"]:
+        report["warnings"].append(f"引用了 {len(report['external_resources'])} 个外部资源，录制节点可能无法访问")
+
+    defined = bool(_FINISH_DEF_RE.search(js))
+    calls = len(_FINISH_CALL_RE.findall(js)) - len(_FINISH_DEF_RE.findall(js))
+    report["finish_calls"] = max(0, calls)
+    report["has_finish_marker"] = defined and calls > 0
+    if not report["has_finish_marker"]:
+        report["warnings"].append("未检测到 markAnimationFinished() 调用，将按画面静止判断结束")
+
+    js_ms = _estimate_js_ms(js)
+    css_ms, infinite = _estimate_css_ms(css)
+    report["infinite_animations"] = infinite
+    estimated = max(js_ms, css_ms) / 1000
+    report["estimated_duration"] = round(estimated, 2) if estimated > 0 else None
+
+    report["end_strategy"] = derive_end_strategy(report)
+    return report
+
+
+def derive_end_strategy(report: Dict[str, Any]) -> Dict[str, Any]:
+    """根据预检结果推导结束条件（end_event / end_timeout / idle_seconds）"""
+    estimated = report.get("estimated_duration") or 0
+    if report.get("has_finish_marker"):
+        # 有完结标记：以事件为准，超时只是兜底，估算偏低时不缩短
+        seconds = max(180, estimated * 1.5 + 15)
+        return {
+            "end_event": "recording:finished",
+            "end_timeout": int(min(seconds, 600) * 1000),
+            "idle_seconds": None,
+        }
+    # 无完结标记：按画面静止结束，超时略长于估算时长
+    seconds = max(60, estimated + 15)
+    return {
+        "end_event": "recording:finished",
+        "end_timeout": int(min(seconds, 180) * 1000),
+        "idle_seconds": 5.0,
+    }
+
+
+def repair_html(text: str, report: Dict[str, Any]) -> Tuple[str, List[str]]:
+    """
+    对被截断的文档补全闭合标签
+
+    :return: (修复后的文本, 修复说明列表)
+    """
+    repairs: List[str] = []
+    if not report.get("truncated"):
+        return text, repairs
+
+    closing = list(reversed(report.get("unclosed_tags") or []))
+    if not re.search(r"</body\s*>", text, re.IGNORECASE) and "body" not in closing:
+        closing.append("body")
+    if not re.search(r"</html\s*>", text, re.IGNORECASE) and "html" not in closing:
+        closing.append("html")
+
+    if closing:
+        suffix = "".join(f"</{tag}>" for tag in closing)
+        text = text.rstrip() + "\n" + suffix + "\n"
+        repairs.append(f"补全闭合标签: {suffix}")
+        if "script" in closing:
+            repairs.append("最后一个 <script> 被截断，其中的动画逻辑可能无法执行")
+    return text, repairs
@@ -0,0 +1,179 @@
+"""
+渐进式 HLS（fMP4 分片）输出：录制进行中即可开始播放
+
+通过 CDP 的 Page.startScreencast 获取页面帧（JPEG），按固定帧率送入 FFmpeg 标准输入，
+实时编码为 H.264 fMP4 分片并持续追加 EVENT 类型的播放列表：
+
+    output/<job_id>/index.m3u8
+    output/<job_id>/init.mp4
+    output/<job_id>/seg00000.m4s ...
+
+录制结束后关闭输入，FFmpeg 写入 #EXT-X-ENDLIST；再以流复制方式合并为普通 mp4。
+"""
+import asyncio
+import base64
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    from scripts.record_media import ffmpeg_bin, run_ffmpeg
+except ImportError:  # 以 python scripts/record_media.py 方式运行时
+    from record_media import ffmpeg_bin, run_ffmpeg
+
+PLAYLIST_NAME = "index.m3u8"
+
+
+class LiveEncoder:
+    """页面帧 -> FFmpeg(HLS fMP4) 的实时编码器"""
+
+    def __init__(
+        self,
+        out_dir: Path,
+        width: int,
+        height: int,
+        fps: int = 24,
+        segment_seconds: float = 2.0,
+        jpeg_quality: int = 80,
+    ):
+        self.out_dir = Path(out_dir)
+        self.width = width
+        self.height = height
+        self.fps = max(1, fps)
+        self.segment_seconds = segment_seconds
+        self.jpeg_quality = jpeg_quality
+        self.frames_in = 0
+        self.frames_out = 0
+        self.started_at: Optional[float] = None
+        self._latest: Optional[bytes] = None
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._session: Any = None
+        self._pump: Optional[asyncio.Task] = None
+
+    @property
+    def playlist(self) -> Path:
+        return self.out_dir / PLAYLIST_NAME
+
+    def _ffmpeg_args(self) -> list:
+        gop = max(1, int(round(self.fps * self.segment_seconds)))
+        return [
+            ffmpeg_bin(), "-hide_banner", "-loglevel", "error", "-y",
+            # 尽早开始解码（默认探测会缓冲数 MB 输入，推迟首个分片）
+            "-probesize", "32", "-analyzeduration", "0",
+            "-f", "image2pipe", "-c:v", "mjpeg", "-framerate", str(self.fps), "-i", "-",
+            "-vf", f"scale={self.width}:{self.height}:force_original_aspect_ratio=decrease,"
+                   f"pad={self.width}:{self.height}:(ow-iw)/2:(oh-ih)/2",
+            "-c:v", "libx264", "-preset", "veryfast", "-tune", "zerolatency",
+            "-pix_fmt", "yuv420p",
+            # 固定 GOP，保证每个分片都以关键帧开头
+            "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+            "-f", "hls",
+            "-hls_time", str(self.segment_seconds),
+            "-hls_playlist_type", "event",
+            "-hls_segment_type", "fmp4",
+            "-hls_fmp4_init_filename", "init.mp4",
+            "-hls_segment_filename", str(self.out_dir / "seg%05d.m4s"),
+            "-hls_flags", "independent_segments+temp_file",
+            str(self.playlist),
+        ]
+
+    async def attach(self, page: Any) -> None:
+        """启动 FFmpeg 与页面 screencast，开始按固定帧率输出"""
+        if not ffmpeg_bin():
+            raise RuntimeError("未检测到 FFmpeg，可设置环境变量 FFMPEG_PATH 或安装 ffmpeg/imageio-ffmpeg")
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self._proc = await asyncio.create_subprocess_exec(
+            *self._ffmpeg_args(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        self._session = await page.context.new_cdp_session(page)
+        self._session.on("Page.screencastFrame", self._on_frame)
+        await self._session.send("Page.startScreencast", {
+            "format": "jpeg",
+            "quality": self.jpeg_quality,
+            "maxWidth": self.width,
+            "maxHeight": self.height,
+            "everyNthFrame": 1,
+        })
+        self.started_at = time.monotonic()
+        self._pump = asyncio.ensure_future(self._pump_frames())
+
+    def _on_frame(self, params: Dict[str, Any]) -> None:
+        self._latest = base64.b64decode(params["data"])
+        self.frames_in += 1
+        # 必须确认，否则浏览器停止推送后续帧
+        asyncio.ensure_future(self._ack(params["sessionId"]))
+
+    async def _ack(self, session_id: int) -> None:
+        try:
+            await self._session.send("Page.screencastFrameAck", {"sessionId": session_id})
+        except Exception:
+            pass
+
+    async def _pump_frames(self) -> None:
+        """
+        screencast 只在画面变化时推帧；这里按墙钟时间以固定帧率写出最新帧
+        （静止时重复上一帧），输出时间轴与真实时间一致
+        """
+        interval = 1.0 / self.fps
+        while True:
+            due = int((time.monotonic() - self.started_at) / interval) + 1
+            if self._latest is not None:
+                while self.frames_out < due:
+                    self._proc.stdin.write(self._latest)
+                    self.frames_out += 1
+                await self._proc.stdin.drain()
+            else:
+                # 首帧到达前不计时，避免输出开头的空白
+                self.started_at = time.monotonic()
+            await asyncio.sleep(interval)
+
+    async def stop(self) -> Dict[str, Any]:
+        """停止 screencast 并结束编码；FFmpeg 退出时写入 #EXT-X-ENDLIST"""
+        if self._pump is not None:
+            self._pump.cancel()
+            await asyncio.gather(self._pump, return_exceptions=True)
+            self._pump = None
+        if self._session is not None:
+            try:
+                await self._session.send("Page.stopScreencast")
+                await self._session.detach()
+            except Exception:
+                pass
+            self._session = None
+
+        error = None
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except Exception:
+                pass
+            _, stderr = await self._proc.communicate()
+            if self._proc.returncode != 0:
+                lines = (stderr or b"").decode("utf-8", "ignore").strip().splitlines()
+                error = lines[-1] if lines else "unknown error"
+            self._proc = None
+        if error:
+            raise RuntimeError(f"HLS 编码失败: {error}")
+        return self.describe()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "playlist": str(self.playlist),
+            "segment_seconds": self.segment_seconds,
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "seconds": round(self.frames_out / self.fps, 3),
+        }
+
+
+def finalize_playlist(playlist: Path, mp4_path: Path, duration: Optional[float] = None) -> None:
+    """将已结束的 HLS 播放列表合并为普通 mp4（流复制，可选截断到 duration 秒）"""
+    args = ["-i", str(playlist)]
+    if duration:
+        args += ["-t", f"{duration:.3f}"]
+    args += ["-c", "copy", "-movflags", "+faststart", str(mp4_path)]
+    run_ffmpeg(args)
@@ -0,0 +1,174 @@
+"""
+日志输出：队列化写入 + 按日期切分
+
+- 业务代码（事件循环内）只把记录放入内存队列（QueueHandler），控制台 / 文件写入由
+  QueueListener 的后台线程完成，磁盘 I/O 不会阻塞请求
+- 文件名与 view_logs.py 约定一致：logs/app_YYYYMMDD.log（Asia/Shanghai 日期），
+  跨天后自动写入新文件，可按天数清理旧日志
+- 可选 JSON 行格式（每行一个对象，包含 trace_id 等字段），便于机器解析
+"""
+import atexit
+import json
+import logging
+import queue
+import threading
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytz
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(name)s [%(trace_id)s] - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_TZ = pytz.timezone("Asia/Shanghai")
+
+
+def log_path_for(log_dir: Path, when: Optional[datetime] = None) -> Path:
+    """指定日期（默认今天）的日志文件路径"""
+    when = when or datetime.now(LOG_TZ)
+    return Path(log_dir) / f"app_{when.strftime('%Y%m%d')}.log"
+
+
+class DailyFileHandler(logging.FileHandler):
+    """
+    按日期切分的文件处理器：每条记录按其时间戳计算文件名，日期变化时切换到新文件
+
+    不使用 TimedRotatingFileHandler：它按 app.log.2024-01-01 形式重命名旧文件，
+    与 app_YYYYMMDD.log 的命名约定不符。
+    """
+
+    def __init__(self, log_dir: Path, backup_days: int = 0, encoding: str = "utf-8"):
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.backup_days = backup_days
+        self._day = datetime.now(LOG_TZ).strftime("%Y%m%d")
+        super().__init__(log_path_for(self.log_dir), encoding=encoding, delay=True)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        day = datetime.fromtimestamp(record.created, LOG_TZ).strftime("%Y%m%d")
+        if day != self._day:
+            self._rollover(day)
+        super().emit(record)
+
+    def _rollover(self, day: str) -> None:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self._day = day
+        self.baseFilename = str((self.log_dir / f"app_{day}.log").resolve())
+        if self.backup_days > 0:
+            self.prune()
+
+    def prune(self) -> List[Path]:
+        """删除超过 backup_days 天的日志文件"""
+        cutoff = (datetime.now(LOG_TZ) - timedelta(days=self.backup_days)).strftime("%Y%m%d")
+        removed = []
+        for path in self.log_dir.glob("app_*.log"):
+            stamp = path.stem[len("app_"):]
+            if stamp.isdigit() and len(stamp) == 8 and stamp < cutoff:
+                try:
+                    path.unlink()
+                    removed.append(path)
+                except OSError:
+                    pass
+        return removed
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON 行格式；记录上的 data（dict）字段原样并入，供 Trace 等结构化日志使用"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, LOG_TZ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+        }
+        data = getattr(record, "data", None)
+        if isinstance(data, dict):
+            # 结构化记录的 message 只是 data 的文本形式，不重复输出
+            entry["data"] = data
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    入队前只做最少的处理：合并消息参数、预先格式化异常堆栈（traceback 对象不能跨线程安全持有），
+    其余格式化交给监听线程中的各处理器，保证 JSON / 文本两种格式拿到的都是原始字段
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listeners: List[QueueListener] = []
+_listeners_lock = threading.Lock()
+
+
+def setup_queued_logging(
+    logger: logging.Logger,
+    log_dir: Path,
+    level: int = logging.INFO,
+    json_lines: bool = False,
+    backup_days: int = 0,
+    filters: Optional[List[logging.Filter]] = None,
+) -> DailyFileHandler:
+    """
+    为 logger 挂上 QueueHandler，并启动后台 QueueListener（控制台 + 按日文件）
+
+    filters 加在 QueueHandler 上，在调用方线程执行（例如从 contextvars 读取 trace_id）。
+    返回文件处理器，便于调用方获取当前日志路径。
+    """
+    text_format = logging.Formatter(fmt=TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(level)
+    console_handler.setFormatter(text_format)
+
+    file_handler = DailyFileHandler(log_dir, backup_days=backup_days)
+    file_handler.setLevel(level)
+    file_handler.setFormatter(JsonFormatter() if json_lines else text_format)
+    if backup_days > 0:
+        file_handler.prune()
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    for f in filters or []:
+        queue_handler.addFilter(f)
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    with _listeners_lock:
+        _listeners.append(listener)
+    return file_handler
+
+
+def stop_queued_logging() -> None:
+    """停止后台线程并写完队列中剩余的记录（进程退出时自动调用）"""
+    with _listeners_lock:
+        listeners = list(_listeners)
+        _listeners.clear()
+    for listener in listeners:
+        try:
+            listener.stop()
+        except Exception:
+            pass
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(stop_queued_logging)
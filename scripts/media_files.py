@@ -0,0 +1,156 @@
+"""
+录制产物（/recordings、/output）的文件服务：Range、强 ETag 与条件请求
+
+在 StaticFiles 基础上：
+- ETag 取自内容 SHA-256：优先使用产物目录登记的哈希（大小一致时），其次对不超过 hash_max_bytes 的文件
+  按需计算（按路径 + 大小 + 修改时间缓存）；更大的未登记文件沿用 Starlette 的 mtime/size ETag
+- 已登记、内容未变且地址只属于其录制任务（位于以任务 ID 命名的目录中，或文件名含任务 ID）的产物
+  使用 immutable 长期缓存；其余（客户端指定文件名、会被后续录制覆盖的输出，HLS 播放列表、录制中的
+  分片等）使用 no-cache，每次以强 ETag 协商（304）
+- If-None-Match / If-Modified-Since 返回 304；Range / If-Range 由 FileResponse 处理（单段 206、多段
+  multipart/byteranges、越界 416），If-Range 与强 ETag 精确比较
+- 读取块大小可调（默认 1 MiB，减少大文件拖动 / 下载时的读取与发送次数）；完整文件在服务器支持
+  http.response.pathsend 扩展时由服务器直接发送文件
+"""
+import hashlib
+import os
+import stat
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_HASH_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def job_scoped(full_path: str, job_id: Optional[str]) -> bool:
+    """文件地址是否只属于该任务（不会被其他录制覆盖）"""
+    if not job_id:
+        return False
+    path = Path(full_path)
+    return job_id in path.parent.parts or job_id in path.name
+
+
+class MediaFiles(StaticFiles):
+    """带内容哈希 ETag 与缓存策略的产物文件服务"""
+
+    def __init__(
+        self,
+        *,
+        directory: str,
+        catalog: Any = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        hash_max_bytes: int = DEFAULT_HASH_MAX_BYTES,
+        cache_entries: int = 1024,
+        **kwargs: Any,
+    ):
+        """
+        :param catalog: 可选，ArtifactCatalog；登记过的产物直接使用其内容哈希
+        :param hash_max_bytes: 未登记文件按需计算哈希的大小上限（0 表示不计算）
+        """
+        super().__init__(directory=directory, **kwargs)
+        self.catalog = catalog
+        self.chunk_size = chunk_size
+        self.hash_max_bytes = hash_max_bytes
+        self.cache_entries = cache_entries
+        # (路径, 大小, 修改时间) -> (ETag, 是否 immutable)
+        self._validators: "OrderedDict[Tuple[str, int, int], Tuple[Optional[str], bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def validators(self, full_path: str, stat_result: os.stat_result) -> Tuple[Optional[str], bool]:
+        """返回 (强 ETag 或 None, 是否可 immutable 缓存)"""
+        key = (full_path, stat_result.st_size, stat_result.st_mtime_ns)
+        with self._lock:
+            cached = self._validators.get(key)
+            if cached is not None:
+                self._validators.move_to_end(key)
+                return cached
+
+        digest: Optional[str] = None
+        immutable = False
+        entry = None
+        if self.catalog is not None:
+            try:
+                entry = self.catalog.find_by_path(full_path)
+            except Exception:
+                entry = None
+        if entry and entry.get("sha256") and entry.get("size_bytes") == stat_result.st_size \
+                and entry.get("created_at", 0) >= stat_result.st_mtime:
+            digest = entry["sha256"]
+            immutable = not full_path.endswith(".m3u8") and job_scoped(full_path, entry.get("job_id"))
+        elif 0 < stat_result.st_size <= self.hash_max_bytes:
+            try:
+                digest = _sha256_file(full_path)
+            except OSError:
+                digest = None
+
+        result = (f'"{digest}"' if digest else None, immutable)
+        with self._lock:
+            self._validators[key] = result
+            while len(self._validators) > self.cache_entries:
+                self._validators.popitem(last=False)
+        return result
+
+    def _lookup(self, path: str) -> Optional[Tuple[str, os.stat_result, Optional[str], bool]]:
+        full_path, stat_result = self.lookup_path(path)
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            return None
+        return (full_path, stat_result, *self.validators(full_path, stat_result))
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        try:
+            found = await anyio.to_thread.run_sync(self._lookup, path)
+        except (OSError, ValueError):
+            found = None
+        if found is None:
+            # 目录、不存在或非法路径：沿用 StaticFiles 的处理（404 / 401 等）
+            return await super().get_response(path, scope)
+
+        full_path, stat_result, etag, immutable = found
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL}
+        if etag is not None:
+            headers["ETag"] = etag
+        response = FileResponse(full_path, stat_result=stat_result, headers=headers)
+        response.chunk_size = self.chunk_size
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def chunk_size_from_env() -> int:
+    return max(64 * 1024, int(os.getenv("MEDIA_CHUNK_SIZE", str(DEFAULT_CHUNK_SIZE))))
+
+
+def hash_max_bytes_from_env() -> int:
+    return int(float(os.getenv("MEDIA_HASH_MAX_MB", str(DEFAULT_HASH_MAX_BYTES // 1024 // 1024))) * 1024 * 1024)
+
+
+def media_files(directory: str, catalog: Any = None) -> MediaFiles:
+    """按环境变量（MEDIA_CHUNK_SIZE / MEDIA_HASH_MAX_MB）创建产物文件服务（目录可在启动后创建）"""
+    return MediaFiles(
+        directory=directory,
+        catalog=catalog,
+        chunk_size=chunk_size_from_env(),
+        hash_max_bytes=hash_max_bytes_from_env(),
+        check_dir=False,
+    )
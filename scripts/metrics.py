@@ -0,0 +1,225 @@
+"""
+进程内指标（Prometheus 文本格式）
+
+无第三方依赖：计数器 / 仪表 / 直方图均为加锁的字典累加，热路径上的开销只有一次
+锁获取与几次整数运算。GET /metrics 时统一渲染为 text/plain; version=0.0.4。
+
+标签取值应保持低基数（接口类型、输出格式、错误类型），不要放入请求 ID、文件名等。
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+_LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> _LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: _LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[_LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{self._labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[_LabelKey, float] = {}
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{self._labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """固定分桶直方图（累计计数在渲染时计算，observe 只更新单个桶）"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = sorted(float(b) for b in buckets)
+        # 每个标签组合：[各桶计数..., +Inf 桶计数], 总和
+        self._counts: Dict[_LabelKey, List[int]] = {}
+        self._sums: Dict[_LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v), self._sums[k]) for k, v in self._counts.items())
+        lines = self._header()
+        bounds = [*self.buckets, math.inf]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_SECONDS_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 90, 120, 180, 300, 600)
+_FAST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30)
+_BYTES_BUCKETS = (16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6)
+
+# --- 生成 -------------------------------------------------------------------
+GENERATION_TTFT = REGISTRY.register(Histogram(
+    "ai_animation_generation_ttft_seconds", "请求上游到收到首个 token 的耗时", ["upstream"], _FAST_BUCKETS))
+GENERATION_DURATION = REGISTRY.register(Histogram(
+    "ai_animation_generation_duration_seconds", "一次流式生成的总耗时", ["upstream", "outcome"], _SECONDS_BUCKETS))
+GENERATION_TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "ai_animation_generation_tokens_per_second", "首个 token 之后的输出速率", ["upstream"],
+    (5, 10, 20, 30, 50, 75, 100, 150, 200, 300)))
+GENERATION_TOKENS = REGISTRY.register(Counter(
+    "ai_animation_generation_tokens_total", "生成的输出 token 数（上游未返回用量时按增量块计数）", ["upstream"]))
+STREAMS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "ai_animation_streams_in_flight", "进行中的 /generate 流"))
+
+# --- 录制 / 转码 --------------------------------------------------------------
+RECORDING_WALL = REGISTRY.register(Histogram(
+    "ai_animation_recording_wall_seconds", "录制耗时（启动浏览器到得到 webm）", ["mode"], _SECONDS_BUCKETS))
+RECORDING_VIDEO = REGISTRY.register(Histogram(
+    "ai_animation_recording_video_seconds", "录制得到的动画时长", ["mode"], _SECONDS_BUCKETS))
+RECORDING_OVERHEAD = REGISTRY.register(Histogram(
+    "ai_animation_recording_wall_to_video_ratio", "录制耗时 / 动画时长", ["mode"],
+    (0.25, 0.5, 0.75, 1, 1.1, 1.25, 1.5, 2, 3, 5)))
+RECORDINGS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "ai_animation_recordings_in_flight", "进行中的录制任务"))
+BROWSERS = REGISTRY.register(Gauge(
+    "ai_animation_browser_instances", "当前运行的浏览器实例数"))
+FFMPEG_DURATION = REGISTRY.register(Histogram(
+    "ai_animation_ffmpeg_seconds", "单次 FFmpeg 调用耗时", ["output"], _SECONDS_BUCKETS))
+OUTPUT_BYTES = REGISTRY.register(Histogram(
+    "ai_animation_output_bytes", "导出产物大小", ["kind"], _BYTES_BUCKETS))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "ai_animation_queue_depth", "等待处理的任务数", ["queue"]))
+CONFIG_TESTS = REGISTRY.register(Counter(
+    "ai_animation_config_tests_total", "/test-config 调用次数（按结果来源：upstream / cache / coalesced / rate_limited）",
+    ["source"]))
+
+# --- 错误 -------------------------------------------------------------------
+ERRORS = REGISTRY.register(Counter(
+    "ai_animation_errors_total", "错误次数（按类型与上游）", ["type", "upstream"]))
+
+
+def render() -> str:
+    return REGISTRY.render()
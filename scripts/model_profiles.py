@@ -0,0 +1,266 @@
+"""
+模型配置档（profile）与上游客户端池
+
+profiles.json（路径可用 PROFILES_PATH 指定）示例：
+
+    {
+      "default": "fast",
+      "profiles": {
+        "fast":    {"model": "deepseek-ai/DeepSeek-V3.2-Exp", "base_url": "https://api.example.com/v1",
+                    "api_key_env": "FAST_API_KEY", "label": "快速"},
+        "quality": {"model": "claude-haiku-4-5-20251001", "base_url": "https://api.anthropic.com",
+                    "api_key": "sk-...", "temperature": 0.7, "max_tokens": 8192, "label": "高质量"}
+      }
+    }
+
+max_tokens 未设置时：Anthropic 接口使用 4096，OpenAI 兼容接口不限制（与原有行为一致）。
+
+- 未写 api_key / base_url 的配置档沿用 .env / credentials.json 中的默认配置
+- .env / credentials.json 的单一配置始终作为名为 "default" 的配置档存在（兼容原有设置页面）
+- 配置快照不可变，重新加载时整体替换；进行中的请求继续使用其开始时解析到的配置档
+"""
+import asyncio
+import inspect
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+DEFAULT_PROFILE = "default"
+PLACEHOLDER_KEY = "sk-REPLACE_ME"
+
+
+class ModelProfile:
+    """一个可独立选择的模型配置（只读）"""
+
+    __slots__ = ("name", "model", "api_key", "base_url", "temperature", "max_tokens", "label")
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        api_key: str = "",
+        base_url: str = "",
+        temperature: float = 0.8,
+        max_tokens: Optional[int] = None,
+        label: Optional[str] = None,
+    ):
+        self.name = name
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.label = label or name
+
+    @property
+    def has_api_key(self) -> bool:
+        return bool(self.api_key and self.api_key != PLACEHOLDER_KEY)
+
+    def with_model(self, model: str) -> "ModelProfile":
+        """沿用本配置档的凭据与参数，只替换模型名"""
+        return ModelProfile(self.name, model, self.api_key, self.base_url,
+                            self.temperature, self.max_tokens, self.label)
+
+    def public(self) -> Dict[str, Any]:
+        """对外展示（不含密钥）"""
+        return {
+            "name": self.name,
+            "label": self.label,
+            "model": self.model,
+            "base_url": self.base_url,
+            "has_api_key": self.has_api_key,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+
+
+def parse_profiles(data: Dict[str, Any], fallback: ModelProfile) -> Tuple[Dict[str, ModelProfile], str]:
+    """
+    解析 profiles.json 内容，返回 ({名称: 配置档}, 默认配置档名)
+
+    :raises ValueError: 格式错误
+    """
+    raw = data.get("profiles")
+    if not isinstance(raw, dict):
+        raise ValueError("profiles.json 需要包含 profiles 对象")
+    profiles: Dict[str, ModelProfile] = {}
+    for name, item in raw.items():
+        if not isinstance(item, dict) or not item.get("model"):
+            raise ValueError(f"配置档 {name} 缺少 model")
+        api_key = item.get("api_key") or (os.getenv(item["api_key_env"], "") if item.get("api_key_env") else "")
+        profiles[name] = ModelProfile(
+            name=name,
+            model=item["model"],
+            api_key=api_key or fallback.api_key,
+            base_url=item.get("base_url", fallback.base_url) or "",
+            temperature=float(item.get("temperature", fallback.temperature)),
+            max_tokens=int(item["max_tokens"]) if item.get("max_tokens") else fallback.max_tokens,
+            label=item.get("label"),
+        )
+    default = data.get("default") or DEFAULT_PROFILE
+    if default not in profiles and default != DEFAULT_PROFILE:
+        raise ValueError(f"默认配置档 {default} 不存在")
+    return profiles, default
+
+
+class FileWatcher:
+    """按 mtime 判断一组文件是否变化；检查本身按 interval 节流，请求路径上通常只有一次时间比较"""
+
+    def __init__(self, paths: Callable[[], Tuple[str, ...]], interval: float = 2.0):
+        self._paths = paths
+        self.interval = interval
+        self._stamps = self._read()
+        self._next_check = 0.0
+
+    def _read(self) -> Tuple[Optional[float], ...]:
+        stamps = []
+        for path in self._paths():
+            try:
+                stamps.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def changed(self, now: float) -> bool:
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.interval
+        stamps = self._read()
+        if stamps != self._stamps:
+            self._stamps = stamps
+            return True
+        return False
+
+    def reset(self) -> None:
+        self._stamps = self._read()
+
+
+async def close_client(client: Any) -> None:
+    """关闭上游客户端的连接池（AnthropicClient.aclose / AsyncOpenAI.close）"""
+    close = getattr(client, "aclose", None) or getattr(client, "close", None)
+    if close is None:
+        return
+    result = close()
+    if inspect.isawaitable(result):
+        await result
+
+
+async def _close_quietly(client: Any) -> None:
+    try:
+        await close_client(client)
+    except Exception:
+        pass
+
+
+class ClientPool:
+    """
+    按 (接口类型, api_key, base_url) 复用上游客户端，避免每个请求重新创建连接池
+
+    配置重新加载后，不再被任何配置档引用的客户端从池中移除：没有进行中的请求时立即关闭，
+    否则等最后一个通过 lease() 使用它的请求结束后关闭。
+    """
+
+    def __init__(self, factories: Dict[str, Callable[[str, str], Any]]):
+        self._factories = factories
+        self._clients: Dict[Tuple[str, str, str], Any] = {}
+        # id(客户端) -> 进行中的请求数；已移出池、等待请求结束后关闭的客户端
+        self._users: Dict[int, int] = {}
+        self._retired: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: Set["asyncio.Task[None]"] = set()
+
+    def get(self, kind: str, api_key: str, base_url: str) -> Any:
+        key = (kind, api_key, base_url)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._factories[kind](api_key, base_url)
+                    self._clients[key] = client
+        return client
+
+    def peek(self, kind: str, api_key: str, base_url: str) -> Optional[Any]:
+        """只查询不创建：凭据已在池中时返回对应客户端"""
+        return self._clients.get((kind, api_key, base_url))
+
+    def create(self, kind: str, api_key: str, base_url: str) -> Any:
+        """创建不入池的客户端（用于验证未保存的凭据，调用方用完后自行关闭）"""
+        return self._factories[kind](api_key, base_url)
+
+    @asynccontextmanager
+    async def lease(self, client: Any) -> AsyncIterator[Any]:
+        """在请求期间占用客户端：期间被移出池的客户端在最后一个占用者结束后关闭"""
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            self._users[id(client)] = self._users.get(id(client), 0) + 1
+        try:
+            yield client
+        finally:
+            with self._lock:
+                remaining = self._users.pop(id(client)) - 1
+                if remaining:
+                    self._users[id(client)] = remaining
+                retired = self._retired.pop(id(client), None) if not remaining else None
+            if retired is not None:
+                await _close_quietly(retired)
+
+    def retain(self, profiles: Dict[str, ModelProfile]) -> List[Any]:
+        """移除不再被配置档引用的客户端，返回被移除的客户端"""
+        keep = {(p.api_key, p.base_url) for p in profiles.values()}
+        idle: List[Any] = []
+        evicted: List[Any] = []
+        with self._lock:
+            for key in [k for k in self._clients if (k[1], k[2]) not in keep]:
+                client = self._clients.pop(key)
+                evicted.append(client)
+                if self._users.get(id(client)):
+                    self._retired[id(client)] = client
+                else:
+                    idle.append(client)
+        if idle:
+            self._close_soon(idle)
+        return evicted
+
+    def _close_soon(self, clients: List[Any]) -> None:
+        """在事件循环中关闭客户端（可从其他线程调用）；还没有事件循环时留到 close_all()"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            self._spawn_close(clients)
+        elif self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._spawn_close, clients)
+        else:
+            with self._lock:
+                self._retired.update((id(client), client) for client in clients)
+
+    def _spawn_close(self, clients: List[Any]) -> None:
+        for client in clients:
+            task = asyncio.ensure_future(_close_quietly(client))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def close_all(self) -> None:
+        """关闭池中及等待关闭的全部客户端（应用关闭时调用）"""
+        with self._lock:
+            clients = list(self._clients.values()) + list(self._retired.values())
+            self._clients.clear()
+            self._retired.clear()
+        for client in clients:
+            await _close_quietly(client)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+
+def load_profiles_file(path: Path) -> Optional[Dict[str, Any]]:
+    """读取 profiles.json，不存在时返回 None"""
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
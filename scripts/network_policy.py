@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+录制时的网络拦截策略
+
+渲染节点通常没有外网：页面引用的 Web 字体 / CDN 会一直挂起直到超时。
+这里在浏览器上下文上注册路由：
+- 本地协议（file/data/blob）直接放行
+- 命中本地资源缓存的请求直接返回缓存内容
+- 白名单主机放行，黑名单主机以及离线模式下的其他请求立即中止，并计数
+
+资源缓存目录结构：<cache_dir>/manifest.json 记录 URL -> {file, content_type}，
+可在有网络的机器上用 `python scripts/network_policy.py --fetch URL ...` 预先填充。
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import sys
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+DEFAULT_ASSET_CACHE_DIR = Path(os.environ.get("ASSET_CACHE_DIR", ".asset_cache"))
+_LOCAL_SCHEMES = {"file", "data", "blob", "about", "chrome-extension"}
+_CSS_URL_RE = re.compile(r"""url\(\s*['"]?([^'")\s]+)['"]?\s*\)""")
+# 部分字体服务按 UA 返回不同 CSS，缓存时模拟 Chromium
+_FETCH_UA = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+
+def _host_matches(host: str, patterns: Iterable[str]) -> bool:
+    """支持精确主机、后缀（.example.com）与通配符（*.cdn.com）"""
+    for pattern in patterns:
+        pattern = pattern.strip().lower()
+        if not pattern:
+            continue
+        if host == pattern or fnmatch.fnmatch(host, pattern):
+            return True
+        if pattern.startswith(".") and host.endswith(pattern):
+            return True
+    return False
+
+
+class AssetCache:
+    """URL -> 本地文件的资源缓存"""
+
+    def __init__(self, directory: Path = DEFAULT_ASSET_CACHE_DIR):
+        self.directory = Path(directory)
+        self._manifest: Optional[Dict[str, Dict[str, str]]] = None
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / "manifest.json"
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        if self._manifest is None:
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    self._manifest = json.load(f)
+            except (OSError, ValueError):
+                self._manifest = {}
+        return self._manifest
+
+    def lookup(self, url: str) -> Optional[Dict[str, str]]:
+        entry = self._load().get(url)
+        if not entry:
+            return None
+        path = self.directory / entry["file"]
+        if not path.exists():
+            return None
+        return {"path": str(path), "content_type": entry.get("content_type", "application/octet-stream")}
+
+    def fetch(self, url: str, follow_css: bool = True) -> List[str]:
+        """下载 URL 写入缓存；CSS 会继续抓取其中引用的字体/图片。返回新缓存的 URL 列表"""
+        manifest = self._load()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        req = urllib.request.Request(url, headers={"User-Agent": _FETCH_UA})
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            body = resp.read()
+            content_type = resp.headers.get("Content-Type", "application/octet-stream")
+
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        (self.directory / name).write_bytes(body)
+        manifest[url] = {"file": name, "content_type": content_type}
+        fetched = [url]
+
+        if follow_css and "css" in content_type:
+            for ref in _CSS_URL_RE.findall(body.decode("utf-8", "ignore")):
+                absolute = urljoin(url, ref)
+                if absolute.startswith("http") and absolute not in manifest:
+                    fetched += self.fetch(absolute, follow_css=False)
+
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return fetched
+
+
+class NetworkPolicy:
+    """浏览器上下文级别的请求拦截（允许/拒绝名单 + 本地缓存 + 离线模式）"""
+
+    def __init__(
+        self,
+        offline: bool = True,
+        allow_hosts: Optional[Iterable[str]] = None,
+        deny_hosts: Optional[Iterable[str]] = None,
+        asset_cache: Optional[AssetCache] = None,
+    ):
+        self.offline = offline
+        self.allow_hosts = [h.lower() for h in (allow_hosts or [])]
+        self.deny_hosts = [h.lower() for h in (deny_hosts or [])]
+        self.asset_cache = asset_cache if asset_cache is not None else AssetCache()
+        self.stats: Dict[str, Any] = {
+            "allowed": 0,
+            "served_from_cache": 0,
+            "blocked": 0,
+            "blocked_hosts": {},
+        }
+
+    def allow_origin_of(self, url: str) -> None:
+        """放行录制目标本身所在的主机（离线模式下录制 http(s) 页面时使用）"""
+        host = (urlsplit(url).hostname or "").lower()
+        if host and host not in self.allow_hosts:
+            self.allow_hosts.append(host)
+
+    async def install(self, context: Any) -> None:
+        await context.route("**/*", self._handle)
+
+    async def _handle(self, route: Any) -> None:
+        url = route.request.url
+        parts = urlsplit(url)
+        if parts.scheme in _LOCAL_SCHEMES:
+            await route.continue_()
+            return
+
+        host = (parts.hostname or "").lower()
+        if not _host_matches(host, self.deny_hosts):
+            cached = self.asset_cache.lookup(url)
+            if cached:
+                self.stats["served_from_cache"] += 1
+                await route.fulfill(
+                    path=cached["path"],
+                    content_type=cached["content_type"],
+                    headers={"Access-Control-Allow-Origin": "*", "Cache-Control": "max-age=31536000"},
+                )
+                return
+            if not self.offline or _host_matches(host, self.allow_hosts):
+                self.stats["allowed"] += 1
+                await route.continue_()
+                return
+
+        self.stats["blocked"] += 1
+        blocked = self.stats["blocked_hosts"]
+        blocked[host] = blocked.get(host, 0) + 1
+        await route.abort("blockedbyclient")
+
+
+def policy_from_env(offline: Optional[bool] = None) -> NetworkPolicy:
+    """
+    从环境变量构建策略：
+    RECORD_OFFLINE=1（默认离线）/ RECORD_ALLOW_HOSTS / RECORD_DENY_HOSTS（逗号分隔）/ ASSET_CACHE_DIR
+    """
+    if offline is None:
+        offline = os.environ.get("RECORD_OFFLINE", "1") != "0"
+    return NetworkPolicy(
+        offline=offline,
+        allow_hosts=os.environ.get("RECORD_ALLOW_HOSTS", "").split(","),
+        deny_hosts=os.environ.get("RECORD_DENY_HOSTS", "").split(","),
+        asset_cache=AssetCache(Path(os.environ.get("ASSET_CACHE_DIR", str(DEFAULT_ASSET_CACHE_DIR)))),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="预先缓存录制时需要的外部资源（字体、CDN 脚本等）")
+    parser.add_argument("--fetch", nargs="+", required=True, help="要缓存的 URL（CSS 中引用的资源会一并缓存）")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_ASSET_CACHE_DIR), help="缓存目录")
+    args = parser.parse_args()
+
+    cache = AssetCache(Path(args.cache_dir))
+    for url in args.fetch:
+        try:
+            for cached in cache.fetch(url):
+                print(f"已缓存: {cached}")
+        except Exception as e:
+            print(f"缓存失败 {url}: {e}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+单请求采样分析（管理员开关）
+
+- 请求头 X-Profile: 1（或查询参数 ?profile=1）并携带有效的管理员令牌时，对该请求采样
+- 采样线程按固定间隔读取事件循环线程的调用栈（sys._current_frames），只记录"当前正在运行的
+  任务属于该请求"的样本；该请求的任务未运行时记为 (waiting)
+- 请求的任务集合通过事件循环的 task factory 收集：请求上下文中创建的子任务（如流式响应的
+  发送任务）自动归属该请求，因此 SSE 等长连接会一直采样到响应结束；factory 只在有采样会话时安装，
+  最后一个会话结束后恢复原状
+- "当前运行的任务"由采样线程调用 asyncio.current_task(loop) 读取，与调用栈不是原子快照，
+  任务切换瞬间的个别样本可能归属错误（尽力而为）
+- 结果保存为 collapsed stack（flamegraph.pl / speedscope 可直接读取），以 trace_id 命名
+  （trace_id 不合法时使用服务端生成的名称）
+
+未配置 ADMIN_TOKEN 时不安装中间件与 task factory，关闭时没有任何额外开销。
+"""
+import asyncio
+import contextvars
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import weakref
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    from scripts.tracing import current_trace_id, valid_trace_id
+except ImportError:  # 以 python scripts/xxx.py 方式运行时
+    from tracing import current_trace_id, valid_trace_id
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", ".profiles"))
+PROFILE_HEADER = b"x-profile"
+ADMIN_HEADER = b"x-admin-token"
+
+_session_var: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar(
+    "ai_animation_profile", default=None)
+
+
+def admin_token() -> Optional[str]:
+    return os.getenv("ADMIN_TOKEN") or None
+
+
+def check_admin(token: Optional[str]) -> bool:
+    expected = admin_token()
+    return bool(expected and token and hmac.compare_digest(token.encode(), expected.encode()))
+
+
+def _frame_label(code: Any) -> str:
+    filename = code.co_filename
+    # 只保留项目内相对路径 / site-packages 之后的部分，便于阅读
+    for marker in ("site-packages/", "lib/python"):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        try:
+            filename = os.path.relpath(filename)
+        except ValueError:
+            pass
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class ProfileSession:
+    """一次请求的采样会话"""
+
+    def __init__(self, trace_id: str, method: str, path: str, interval: float, max_seconds: float):
+        self.trace_id = trace_id
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.tasks: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.running_samples = 0
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.ended: Optional[float] = None
+        # 未能安装 task factory（已有其他 factory）时以整个事件循环线程为采样范围
+        self.attributed = True
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profile-{trace_id}", daemon=True)
+
+    def start(self) -> None:
+        task = asyncio.current_task()
+        if task is not None:
+            self.tasks.add(task)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.ended = time.perf_counter()
+
+    def _run(self) -> None:
+        deadline = self.started + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.perf_counter() > deadline:
+                break
+            self._sample()
+
+    def _sample(self) -> None:
+        self.samples += 1
+        if self.attributed:
+            running = asyncio.current_task(self.loop)
+            if running is None or running not in self.tasks:
+                self._add("(waiting)")
+                return
+        frame = sys._current_frames().get(self.loop_thread)
+        if frame is None:
+            return
+        labels: List[str] = []
+        while frame is not None:
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        self.running_samples += 1
+        self._add(";".join(reversed(labels)))
+
+    def _add(self, stack: str) -> None:
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def folded(self) -> str:
+        """collapsed stack 格式：每行 "frame;frame;frame 样本数" """
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def meta(self) -> Dict[str, Any]:
+        ended = self.ended if self.ended is not None else time.perf_counter()
+        return {
+            "trace_id": self.trace_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": round(self.started_at, 3),
+            "duration_ms": round((ended - self.started) * 1000, 1),
+            "interval_ms": round(self.interval * 1000, 2),
+            "samples": self.samples,
+            "running_samples": self.running_samples,
+            "task_attribution": self.attributed,
+        }
+
+    def save(self, directory: Path = PROFILE_DIR, keep: int = 50) -> Path:
+        if not valid_trace_id(self.trace_id):
+            raise ValueError(f"不合法的采样结果名称: {self.trace_id!r}")
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.trace_id}.folded"
+        path.write_text(self.folded(), encoding="utf-8")
+        (directory / f"{self.trace_id}.json").write_text(json.dumps(self.meta(), ensure_ascii=False), encoding="utf-8")
+        prune(directory, keep)
+        return path
+
+
+def prune(directory: Path = PROFILE_DIR, keep: int = 50) -> None:
+    """只保留最近 keep 份结果"""
+    profiles = sorted(directory.glob("*.folded"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in profiles[keep:]:
+        for path in (old, old.with_suffix(".json")):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+# 每个事件循环上进行中的采样会话数（为 0 时卸载 task factory）
+_factory_users: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, int]" = weakref.WeakKeyDictionary()
+
+
+def _task_factory(loop: asyncio.AbstractEventLoop, coro: Any, **kwargs: Any) -> asyncio.Task:
+    """在采样会话的上下文中创建的任务归属该会话（只在有采样会话时安装）"""
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    context = kwargs.get("context")
+    session = context.get(_session_var) if context is not None else _session_var.get()
+    if session is not None:
+        session.tasks.add(task)
+    return task
+
+
+def _install_task_factory(loop: asyncio.AbstractEventLoop) -> bool:
+    """登记一个采样会话；返回任务归属是否可用"""
+    factory = loop.get_task_factory()
+    if factory is not _task_factory:
+        if factory is not None:
+            # 已有自定义 factory 时不覆盖，只能以整个事件循环线程为采样范围
+            return False
+        loop.set_task_factory(_task_factory)
+    _factory_users[loop] = _factory_users.get(loop, 0) + 1
+    return True
+
+
+def _release_task_factory(loop: asyncio.AbstractEventLoop) -> None:
+    """采样会话结束；没有其他会话时恢复默认 task factory"""
+    remaining = _factory_users.get(loop, 0) - 1
+    if remaining > 0:
+        _factory_users[loop] = remaining
+        return
+    _factory_users.pop(loop, None)
+    if loop.get_task_factory() is _task_factory:
+        loop.set_task_factory(None)
+
+
+def list_profiles(directory: Path = PROFILE_DIR) -> List[Dict[str, Any]]:
+    items = []
+    for meta in sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True):
+        try:
+            items.append(json.loads(meta.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return items
+
+
+def profile_path(trace_id: str, directory: Path = PROFILE_DIR) -> Optional[Path]:
+    if not valid_trace_id(trace_id):
+        return None
+    path = directory / f"{trace_id}.folded"
+    return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    """
+    纯 ASGI 中间件，需放在 TracingMiddleware 内层（使用其 trace_id 命名结果）
+
+    采样覆盖整个 ASGI 调用，流式响应直到最后一块发送完毕才结束。
+    """
+
+    def __init__(self, app: Any, interval: float = 0.005, max_seconds: float = 600.0, keep: int = 50):
+        self.app = app
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.keep = keep
+
+    def _requested(self, scope: Dict[str, Any]) -> bool:
+        flag = token = None
+        for key, value in scope.get("headers") or []:
+            if key == PROFILE_HEADER:
+                flag = value.decode("latin-1")
+            elif key == ADMIN_HEADER:
+                token = value.decode("latin-1")
+        query = scope.get("query_string") or b""
+        if flag is None and b"profile=" in query:
+            from urllib.parse import parse_qs
+            params = parse_qs(query.decode("latin-1"))
+            flag = (params.get("profile") or [None])[0]
+            token = token or (params.get("admin_token") or [None])[0]
+        return flag not in (None, "", "0") and check_admin(token)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        attributed = _install_task_factory(loop)
+        trace_id = current_trace_id()
+        if not valid_trace_id(trace_id):
+            trace_id = f"profile-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        session = ProfileSession(trace_id, scope.get("method", ""), scope.get("path", ""),
+                                 self.interval, self.max_seconds)
+        session.attributed = attributed
+        token = _session_var.set(session)
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-profile-id", trace_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        session.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _session_var.reset(token)
+            if attributed:
+                _release_task_factory(loop)
+            session.stop()
+            await asyncio.to_thread(session.save, PROFILE_DIR, self.keep)
@@ -1,25 +1,32 @@
 import argparse
 import asyncio
+import contextlib
+import hashlib
+import importlib.util
 import json
 import os
 import subprocess
 import sys
 import time
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-import yaml
 import shutil
 
-try:
-    import imageio_ffmpeg
-except Exception:  # imageio-ffmpeg 可选，失败时继续尝试其他路径
-    imageio_ffmpeg = None
+# Playwright / PyYAML / imageio-ffmpeg 均在首次使用时才导入，缩短服务冷启动时间
+if importlib.util.find_spec("playwright") is not None:
+    def async_playwright() -> Any:
+        from playwright.async_api import async_playwright as _async_playwright
+        return _async_playwright()
+else:
+    async_playwright = None
 
 try:
-    from playwright.async_api import async_playwright
-except Exception:
-    async_playwright = None
+    from scripts import metrics, tracing
+except ImportError:  # 以 python scripts/record_media.py 方式运行时
+    import metrics
+    import tracing
 
 
 def _resolve_ffmpeg_path() -> Optional[str]:
@@ -33,41 +40,127 @@ def _resolve_ffmpeg_path() -> Optional[str]:
     if ffmpeg_in_path:
         return ffmpeg_in_path
 
-    # 最后尝试 imageio_ffmpeg 提供的内置二进制
-    if imageio_ffmpeg is not None:
-        try:
-            return imageio_ffmpeg.get_ffmpeg_exe()
-        except Exception:
-            pass
+    # 最后尝试 imageio_ffmpeg 提供的内置二进制（imageio-ffmpeg 可选，失败时返回 None）
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        pass
 
     return None
 
 
-FFMPEG_BIN = _resolve_ffmpeg_path()
+@lru_cache(maxsize=None)
+def ffmpeg_bin() -> Optional[str]:
+    """FFmpeg 可执行文件路径（首次调用时解析并缓存）"""
+    return _resolve_ffmpeg_path()
+
+
+def __getattr__(name: str) -> Any:
+    # 兼容 from record_media import FFMPEG_BIN
+    if name == "FFMPEG_BIN":
+        return ffmpeg_bin()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def which(cmd: str) -> Optional[str]:
-    if cmd == "ffmpeg" and FFMPEG_BIN:
-        return FFMPEG_BIN
+    if cmd == "ffmpeg" and ffmpeg_bin():
+        return ffmpeg_bin()
     return shutil.which(cmd)
 
 
+# 指标中 FFmpeg 输出类型的标签取值（按输出文件扩展名）
+_FFMPEG_OUTPUT_LABELS = {"mp4", "gif", "png", "webm", "jpg", "webp"}
+
+
 def run_ffmpeg(args: List[str]) -> None:
-    if not FFMPEG_BIN:
+    ffmpeg = ffmpeg_bin()
+    if not ffmpeg:
         raise RuntimeError("未检测到 FFmpeg，可设置环境变量 FFMPEG_PATH 或安装 ffmpeg/imageio-ffmpeg")
 
-    proc = subprocess.run(
-        [FFMPEG_BIN, "-y", *args],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-    )
+    output = Path(args[-1]).suffix.lstrip(".").lower() if args else ""
+    output = output if output in _FFMPEG_OUTPUT_LABELS else "other"
+    started = time.perf_counter()
+    with tracing.span("ffmpeg", output=output) as span_attrs:
+        proc = subprocess.run(
+            [ffmpeg, "-y", *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        span_attrs["returncode"] = proc.returncode
+    metrics.FFMPEG_DURATION.observe(time.perf_counter() - started, output=output)
     if proc.stdout:
         print(proc.stdout)
     if proc.stderr:
         print(proc.stderr, file=sys.stderr)
     if proc.returncode != 0:
+        metrics.ERRORS.inc(type="ffmpeg_failed", upstream="ffmpeg")
         raise RuntimeError(f"FFmpeg 失败: {proc.stderr.splitlines()[-1] if proc.stderr else 'unknown error'}")
+    if output != "other":
+        try:
+            metrics.OUTPUT_BYTES.observe(os.path.getsize(args[-1]), kind=output)
+        except OSError:
+            pass
+
+
+async def goto_ready(page: Any, url: str, wait_until: str) -> None:
+    """
+    打开页面；wait_until="ready" 时以 domcontentloaded + 确定性就绪信号
+    （load 事件、字体加载完成）代替 networkidle 的 500ms 静默等待
+    """
+    if wait_until != "ready":
+        await page.goto(url, wait_until=wait_until)
+        return
+    await page.goto(url, wait_until="domcontentloaded")
+    await page.wait_for_load_state("load")
+    await page.evaluate("() => document.fonts ? document.fonts.ready.then(() => true) : true")
+
+
+async def _wait_visual_idle(page: Any, idle_seconds: float, timeout_ms: int, interval: float = 0.5) -> Optional[float]:
+    """
+    周期性采样页面画面，连续 idle_seconds 秒无变化即视为动画结束。
+
+    :return: 最后一次画面变化的 time.monotonic() 时间戳；超时仍未静止时返回 None
+    """
+    deadline = time.monotonic() + timeout_ms / 1000
+    last_digest = None
+    last_change = time.monotonic()
+    while time.monotonic() < deadline:
+        shot = await page.screenshot(type="jpeg", quality=40, scale="css")
+        digest = hashlib.md5(shot).digest()
+        now = time.monotonic()
+        if digest != last_digest:
+            last_digest = digest
+            last_change = now
+        elif now - last_change >= idle_seconds:
+            return last_change
+        await asyncio.sleep(interval)
+    return None
+
+
+async def _trim_tail(webm_path: Path, keep_seconds: float) -> None:
+    """截断视频尾部（流复制，不重新编码）"""
+    trimmed = webm_path.with_name(f"{webm_path.stem}.trimmed{webm_path.suffix}")
+    await asyncio.to_thread(
+        run_ffmpeg, ["-i", str(webm_path), "-t", f"{keep_seconds:.3f}", "-c", "copy", str(trimmed)]
+    )
+    os.replace(trimmed, webm_path)
+
+
+async def prewarm_browser() -> bool:
+    """
+    启动并关闭一次 Chromium：提前导入 Playwright、启动驱动进程并把浏览器二进制读入系统页缓存，
+    使首次录制的 browser_launch 阶段接近稳态耗时
+
+    :return: 未安装 Playwright 时返回 False
+    """
+    if async_playwright is None:
+        return False
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        await browser.close()
+    return True
 
 
 async def load_page_and_record(
@@ -88,21 +181,54 @@ async def load_page_and_record(
     end_event: Optional[str] = None,
     end_function: Optional[str] = None,
     end_timeout: Optional[int] = None,
+    idle_seconds: Optional[float] = None,
+    idle_trim: bool = True,
+    network_policy: Optional[Any] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    live: Optional[Any] = None,
+    browser: Optional[Any] = None,
 ) -> Path:
+    """
+    录制页面为 webm
+
+    :param idle_seconds: 画面连续 N 秒无变化即结束录制（可与 end_* 同时使用，先满足者生效）
+    :param idle_trim: 因画面静止结束时，裁掉尾部的静止帧
+    :param network_policy: 可选 NetworkPolicy，拦截外部请求（离线渲染）
+    :param stats: 可选字典，写入结束方式、裁剪时长等录制信息
+    :param live: 可选 LiveEncoder，录制同时输出渐进式 HLS（stats["live"] 记录其输出信息）
+    :param browser: 可选的共享浏览器实例（批量录制时复用，不会被关闭；此时 headless/slow_mo 不生效）
+    """
+    stats = stats if stats is not None else {}
     if async_playwright is None:
         raise RuntimeError("未安装 Playwright，请先 pip install playwright 并 playwright install chromium")
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=headless, slow_mo=slow_mo)
+    started = time.monotonic()
+    async with contextlib.AsyncExitStack() as stack:
+        stack.enter_context(metrics.RECORDINGS_IN_FLIGHT.track_inprogress())
+        owns_browser = browser is None
+        if owns_browser:
+            with tracing.span("browser_launch"):
+                p = await stack.enter_async_context(async_playwright())
+                browser = await p.chromium.launch(headless=headless, slow_mo=slow_mo)
+            metrics.BROWSERS.inc()
+            stack.callback(metrics.BROWSERS.dec)
         context = await browser.new_context(
             viewport={"width": width, "height": height},
             record_video_dir=str(out_dir),
             record_video_size={"width": width, "height": height},
             color_scheme="light",
         )
+        # 异常退出时也关闭上下文（共享浏览器不随本次录制关闭）
+        stack.push_async_callback(context.close)
+        if network_policy is not None:
+            await network_policy.install(context)
+        video_started = time.monotonic()  # 视频从页面创建时开始录制
         page = await context.new_page()
         page.set_default_timeout(timeout)
-        await page.goto(url, wait_until=wait_until)
+        if live is not None:
+            await live.attach(page)
+        with tracing.span("page_load", wait_until=wait_until):
+            await goto_ready(page, url, wait_until)
 
         if background:
             await page.evaluate("(color) => { document.body.style.background = color }", background)
@@ -110,36 +236,37 @@ async def load_page_and_record(
         # 执行脚本步骤
         if script_steps:
             try:
-                for step in script_steps:
-                    if "wait" in step:
-                        s = step["wait"]
-                        state = s.get("state", "load")
-                        t = s.get("timeout", timeout)
-                        await page.wait_for_load_state(state, timeout=t)
-                    elif "click" in step:
-                        sel = step["click"]["selector"]
-                        await page.wait_for_selector(sel, timeout=timeout)
-                        await page.click(sel, timeout=timeout)
-                    elif "hover" in step:
-                        sel = step["hover"]["selector"]
-                        await page.wait_for_selector(sel, timeout=timeout)
-                        await page.hover(sel, timeout=timeout)
-                    elif "type" in step:
-                        sel = step["type"]["selector"]
-                        text = step["type"]["text"]
-                        await page.wait_for_selector(sel, timeout=timeout)
-                        await page.fill(sel, "", timeout=timeout)
-                        await page.type(sel, text, timeout=timeout)
-                    elif "scroll" in step:
-                        x = step["scroll"].get("x", 0)
-                        y = step["scroll"].get("y", 0)
-                        await page.evaluate("({x,y}) => window.scrollTo(x,y)", {"x": x, "y": y})
-                    elif "waitFor" in step:
-                        sel = step["waitFor"].get("selector")
-                        t = step["waitFor"].get("timeout", timeout)
-                        await page.wait_for_selector(sel, timeout=t)
-                    elif "delay" in step:
-                        await asyncio.sleep(float(step["delay"]))
+                with tracing.span("script_steps", steps=len(script_steps)):
+                    for step in script_steps:
+                        if "wait" in step:
+                            s = step["wait"]
+                            state = s.get("state", "load")
+                            t = s.get("timeout", timeout)
+                            await page.wait_for_load_state(state, timeout=t)
+                        elif "click" in step:
+                            sel = step["click"]["selector"]
+                            await page.wait_for_selector(sel, timeout=timeout)
+                            await page.click(sel, timeout=timeout)
+                        elif "hover" in step:
+                            sel = step["hover"]["selector"]
+                            await page.wait_for_selector(sel, timeout=timeout)
+                            await page.hover(sel, timeout=timeout)
+                        elif "type" in step:
+                            sel = step["type"]["selector"]
+                            text = step["type"]["text"]
+                            await page.wait_for_selector(sel, timeout=timeout)
+                            await page.fill(sel, "", timeout=timeout)
+                            await page.type(sel, text, timeout=timeout)
+                        elif "scroll" in step:
+                            x = step["scroll"].get("x", 0)
+                            y = step["scroll"].get("y", 0)
+                            await page.evaluate("({x,y}) => window.scrollTo(x,y)", {"x": x, "y": y})
+                        elif "waitFor" in step:
+                            sel = step["waitFor"].get("selector")
+                            t = step["waitFor"].get("timeout", timeout)
+                            await page.wait_for_selector(sel, timeout=t)
+                        elif "delay" in step:
+                            await asyncio.sleep(float(step["delay"]))
             except Exception as e:
                 # 失败时保存截图便于诊断
                 try:
@@ -153,41 +280,153 @@ async def load_page_and_record(
         if start_delay > 0:
             await asyncio.sleep(start_delay)
 
-        # 结束条件：优先使用 end_* 参数，其次使用固定 duration
+        # 结束条件：优先使用 end_* 参数，其次使用固定 duration；
+        # 配置 idle_seconds 时同时检测画面静止，先满足者结束录制
         used_timeout = end_timeout or timeout
+        end_wait = None
+        ended_by = "duration"
         if end_selector:
-            await page.wait_for_selector(end_selector, timeout=used_timeout)
+            end_wait = page.wait_for_selector(end_selector, timeout=used_timeout)
+            ended_by = "selector"
         elif end_function:
             # 使用 Playwright 原生 wait_for_function（表达式返回 truthy 即通过）
-            await page.wait_for_function(end_function, timeout=used_timeout)
+            end_wait = page.wait_for_function(end_function, timeout=used_timeout)
+            ended_by = "function"
         elif end_event:
             # 在页面内注入等待自定义事件的 Promise（以单一参数对象传入）
-            # 添加 try-except 捕获超时，即使没有事件也能完成录制
-            try:
-                await page.evaluate(
-                    "({name, timeout}) => new Promise((resolve, reject) => { const t = setTimeout(() => reject('timeout'), timeout); window.addEventListener(name, () => { clearTimeout(t); resolve(true); }, { once: true }); })",
-                    {"name": end_event, "timeout": used_timeout},
-                )
-            except Exception as e:
-                # 如果等待事件超时，记录警告但继续完成录制
-                print(f"警告: 等待事件 '{end_event}' 超时 ({used_timeout}ms)，继续完成录制", file=sys.stderr)
-                # 等待一小段时间确保动画完成
-                await asyncio.sleep(5)
-        else:
-            if duration > 0:
-                await asyncio.sleep(duration)
-
-        await context.close()  # 关闭后视频文件才会写入目录
-        await browser.close()
-
-        # 取视频文件（Playwright 默认生成 .webm 文件在 context 目录）
-        # Ensure out_dir is a Path object
-        out_path = Path(out_dir) if not isinstance(out_dir, Path) else out_dir
-        vids = list(out_path.glob("**/*.webm"))
-        if not vids:
+            end_wait = page.evaluate(
+                "({name, timeout}) => new Promise((resolve, reject) => { const t = setTimeout(() => reject('timeout'), timeout); window.addEventListener(name, () => { clearTimeout(t); resolve(true); }, { once: true }); })",
+                {"name": end_event, "timeout": used_timeout},
+            )
+            ended_by = "event"
+        elif idle_seconds is None and duration > 0:
+            end_wait = asyncio.sleep(duration)
+
+        with tracing.span("end_wait") as end_attrs:
+            last_change: Optional[float] = None
+            if idle_seconds:
+                if end_wait is None:
+                    # 仅使用画面静止作为结束条件，duration 作为上限
+                    idle_timeout = end_timeout or (int(duration * 1000) if duration > 0 else timeout)
+                    end_wait = asyncio.sleep(idle_timeout / 1000)
+                    ended_by = "duration"
+                end_task = asyncio.ensure_future(end_wait)
+                idle_task = asyncio.ensure_future(_wait_visual_idle(page, idle_seconds, used_timeout))
+                done, _ = await asyncio.wait({end_task, idle_task}, return_when=asyncio.FIRST_COMPLETED)
+                if idle_task in done and idle_task.exception() is None:
+                    last_change = idle_task.result()
+                if last_change is not None:
+                    ended_by = "idle"
+                    end_task.cancel()
+                else:
+                    idle_task.cancel()
+                    if end_task not in done:
+                        await asyncio.wait({end_task})
+                await asyncio.gather(end_task, idle_task, return_exceptions=True)
+                if ended_by != "idle" and end_task.exception() is not None:
+                    print(f"警告: 等待结束条件超时 ({used_timeout}ms)，继续完成录制", file=sys.stderr)
+                    ended_by = "timeout"
+                    metrics.ERRORS.inc(type="end_timeout", upstream="playwright")
+            elif end_wait is not None:
+                if end_event:
+                    # 添加 try-except 捕获超时，即使没有事件也能完成录制
+                    try:
+                        await end_wait
+                    except Exception as e:
+                        # 如果等待事件超时，记录警告但继续完成录制
+                        print(f"警告: 等待事件 '{end_event}' 超时 ({used_timeout}ms)，继续完成录制", file=sys.stderr)
+                        # 等待一小段时间确保动画完成
+                        await asyncio.sleep(5)
+                        ended_by = "timeout"
+                        metrics.ERRORS.inc(type="end_timeout", upstream="playwright")
+                else:
+                    await end_wait
+            end_attrs["ended_by"] = ended_by
+
+        # 直接从页面的视频句柄获取路径，避免扫描目录（并发任务互不干扰）
+        video = page.video
+        if live is not None:
+            stats["live"] = await live.stop()
+        with tracing.span("context_close"):
+            await context.close()  # 关闭后视频文件才会写入目录
+        if owns_browser:
+            await browser.close()
+
+        if video is None:
             raise RuntimeError("未生成 webm 文件，请检查录制配置")
-        latest = max(vids, key=lambda p: p.stat().st_mtime)
-        return latest
+        webm_path = Path(await video.path())
+        if not webm_path.exists():
+            raise RuntimeError(f"未生成 webm 文件: {webm_path}")
+
+        if network_policy is not None:
+            stats["network"] = network_policy.stats
+        stats["ended_by"] = ended_by
+        stats["video_seconds"] = round(time.monotonic() - video_started, 3)
+        if last_change is not None and idle_trim:
+            # 保留最后一次变化后的少量静止帧，使结尾画面可见
+            keep = last_change - video_started + min(idle_seconds, 1.0)
+            with tracing.span("idle_trim"):
+                await _trim_tail(webm_path, keep)
+            stats["trimmed_seconds"] = round(stats["video_seconds"] - keep, 3)
+            stats["video_seconds"] = round(keep, 3)
+            if live is not None and live.started_at is not None:
+                stats["live"]["keep_seconds"] = round(max(0.0, last_change - live.started_at) + min(idle_seconds, 1.0), 3)
+
+        wall = time.monotonic() - started
+        metrics.RECORDING_WALL.observe(wall, mode="single")
+        metrics.RECORDING_VIDEO.observe(stats["video_seconds"], mode="single")
+        if stats["video_seconds"] > 0:
+            metrics.RECORDING_OVERHEAD.observe(wall / stats["video_seconds"], mode="single")
+        return webm_path
+
+
+def load_script_steps(fp: Path) -> List[Dict[str, Any]]:
+    """读取 YAML/JSON 交互步骤文件中的 steps 列表"""
+    if not fp.exists():
+        raise ValueError(f"脚本文件不存在: {fp}")
+    if fp.suffix.lower() in (".yml", ".yaml"):
+        import yaml
+        return yaml.safe_load(fp.read_text()).get("steps", [])
+    if fp.suffix.lower() == ".json":
+        return json.loads(fp.read_text()).get("steps", [])
+    raise ValueError("仅支持 YAML/JSON 脚本")
+
+
+def transcode_outputs(
+    webm_path: Path,
+    base: Path,
+    mp4: bool = False,
+    gif: bool = False,
+    gif_fps: int = 10,
+    gif_width: int = 720,
+    gif_dither: str = "sierra2_4a",
+) -> Dict[str, str]:
+    """
+    将录制的 webm 转为 mp4 / gif（gif 使用 palettegen + paletteuse）
+
+    :return: {"mp4": 路径, "gif": 路径}，仅包含实际生成的输出
+    """
+    outputs: Dict[str, str] = {}
+    if mp4:
+        mp4_path = base.with_suffix(".mp4")
+        run_ffmpeg(["-i", str(webm_path), "-c:v", "libx264", "-pix_fmt", "yuv420p", str(mp4_path)])
+        outputs["mp4"] = str(mp4_path)
+    if gif:
+        palette = base.with_suffix(".png")
+        gif_path = base.with_suffix(".gif")
+        run_ffmpeg([
+            "-i", str(webm_path),
+            "-vf", f"fps={gif_fps},scale={gif_width}:-1:flags=lanczos,palettegen",
+            str(palette),
+        ])
+        run_ffmpeg([
+            "-i", str(webm_path),
+            "-i", str(palette),
+            "-lavfi", f"fps={gif_fps},scale={gif_width}:-1:flags=lanczos,paletteuse=dither={gif_dither}",
+            str(gif_path),
+        ])
+        outputs["gif"] = str(gif_path)
+    return outputs
 
 
 def main() -> None:
@@ -195,13 +434,16 @@ def main() -> None:
     src = parser.add_mutually_exclusive_group(required=True)
     src.add_argument("--url", help="要录制的 URL")
     src.add_argument("--html", help="本地 HTML 文件路径")
+    src.add_argument("--manifest", help="批量录制清单（YAML/JSON），命令行参数作为条目默认值")
     parser.add_argument("--base", help="静态资源根目录（本地 HTML 时可选）")
     parser.add_argument("--width", type=int, default=1280)
     parser.add_argument("--height", type=int, default=720)
     parser.add_argument("--fps", type=int, default=24)
     parser.add_argument("--duration", type=float, default=10.0)
     parser.add_argument("--start-delay", type=float, default=0.0)
-    parser.add_argument("--wait-until", default="networkidle", choices=["load", "domcontentloaded", "networkidle"])
+    parser.add_argument("--wait-until", default="ready", choices=["load", "domcontentloaded", "networkidle", "ready"],
+                        help="ready（默认，与 /record 一致）= domcontentloaded + load 事件 + 字体就绪；"
+                             "networkidle 额外等待 500ms 网络静默")
     parser.add_argument("--timeout", type=int, default=30000)
     parser.add_argument("--background", default=None)
     parser.add_argument("--headless", action="store_true")
@@ -217,9 +459,26 @@ def main() -> None:
     parser.add_argument("--end-event", help="录制结束时等待的自定义窗口事件名")
     parser.add_argument("--end-function", help="录制结束时等待的表达式（truthy 即结束），例如 'window.playFinished === true' 或 '() => window.done'")
     parser.add_argument("--end-timeout", type=int, help="录制结束条件的超时（默认继承 --timeout）")
+    parser.add_argument("--offline", action="store_true", help="拦截外部网络请求（仅放行本地缓存与 --allow-host）")
+    parser.add_argument("--allow-host", action="append", default=[], help="放行的主机（可多次指定）")
+    parser.add_argument("--deny-host", action="append", default=[], help="拒绝的主机（可多次指定）")
+    parser.add_argument("--idle-seconds", type=float, help="画面连续 N 秒无变化即结束录制")
+    parser.add_argument("--no-idle-trim", action="store_true", help="画面静止结束时保留尾部静止帧")
+    parser.add_argument("--segments", type=int, default=1,
+                        help="分段并行录制的段数（按 --duration 切分，0 为按 CPU 核数自动选择）")
+    parser.add_argument("--concurrency", type=int, default=2, help="批量模式下同时录制的条目数")
+    parser.add_argument("--transcode-workers", type=int, default=0, help="批量模式下的转码并发数（0 为 CPU 核数的一半）")
+    parser.add_argument("--report", help="批量模式的 JSON 汇总报告路径（默认与清单同目录）")
 
     args = parser.parse_args()
 
+    if args.manifest:
+        try:
+            from scripts.batch_record import run_from_args
+        except ImportError:
+            from batch_record import run_from_args
+        sys.exit(run_from_args(args))
+
     # 准备 URL（本地 HTML 使用 file:// 或建议内置服务，V1 简化为 file://）
     url = args.url
     if args.html:
@@ -233,77 +492,96 @@ def main() -> None:
     # 加载脚本
     steps: Optional[List[Dict[str, Any]]] = None
     if args.script:
-        fp = Path(args.script)
-        if not fp.exists():
-            print(f"脚本文件不存在: {fp}", file=sys.stderr)
-            sys.exit(1)
-        if fp.suffix.lower() in (".yml", ".yaml"):
-            steps = yaml.safe_load(fp.read_text()).get("steps", [])
-        elif fp.suffix.lower() == ".json":
-            steps = json.loads(fp.read_text()).get("steps", [])
-        else:
-            print("仅支持 YAML/JSON 脚本", file=sys.stderr)
+        try:
+            steps = load_script_steps(Path(args.script))
+        except ValueError as e:
+            print(e, file=sys.stderr)
             sys.exit(1)
 
-    out_dir = Path(".recordings")
+    policy = None
+    if args.offline or args.allow_host or args.deny_host:
+        try:
+            from scripts.network_policy import NetworkPolicy
+        except ImportError:
+            from network_policy import NetworkPolicy
+        policy = NetworkPolicy(offline=args.offline, allow_hosts=args.allow_host, deny_hosts=args.deny_host)
+        if args.url:
+            policy.allow_origin_of(args.url)
+
+    # 每次录制使用独立目录，避免与其他任务的视频混淆
+    ts = time.strftime("%Y%m%d-%H%M%S")
+    out_dir = Path(".recordings") / f"capture-{ts}-{os.getpid()}"
     out_dir.mkdir(parents=True, exist_ok=True)
 
     # 录制
-    webm_path = asyncio.run(
-        load_page_and_record(
-            url=url,
-            out_dir=out_dir,
-            width=args.width,
-            height=args.height,
-            fps=args.fps,
-            headless=args.headless,
-            slow_mo=args.slow_mo,
-            wait_until=args.wait_until,
-            timeout=args.timeout,
-            start_delay=args.start_delay,
-            duration=args.duration,
-            background=args.background,
-            script_steps=steps,
-            end_selector=args.end_selector,
-            end_event=args.end_event,
-            end_function=args.end_function,
-            end_timeout=args.end_timeout,
+    if args.segments != 1:
+        try:
+            from scripts.segmented_record import record_segmented
+        except ImportError:
+            from segmented_record import record_segmented
+
+        info = asyncio.run(
+            record_segmented(
+                url=url,
+                out_dir=out_dir,
+                width=args.width,
+                height=args.height,
+                fps=args.fps,
+                headless=args.headless,
+                wait_until=args.wait_until,
+                timeout=args.timeout,
+                duration=args.duration,
+                segments=args.segments,
+                background=args.background,
+                network_policy=policy,
+            )
+        )
+        webm_path = info["path"]
+        print(f"分段录制: {len(info['segments'])} 段, 实时倍率 {info['realtime_factor']}x")
+        for seam in info["seams"]:
+            print(f"  接缝 {seam['boundary']}: {'OK' if seam.get('ok') else '异常'} {seam}")
+    else:
+        webm_path = asyncio.run(
+            load_page_and_record(
+                url=url,
+                out_dir=out_dir,
+                width=args.width,
+                height=args.height,
+                fps=args.fps,
+                headless=args.headless,
+                slow_mo=args.slow_mo,
+                wait_until=args.wait_until,
+                timeout=args.timeout,
+                start_delay=args.start_delay,
+                duration=args.duration,
+                background=args.background,
+                script_steps=steps,
+                end_selector=args.end_selector,
+                end_event=args.end_event,
+                end_function=args.end_function,
+                end_timeout=args.end_timeout,
+                idle_seconds=args.idle_seconds,
+                idle_trim=not args.no_idle_trim,
+                network_policy=policy,
+            )
         )
-    )
     print(f"生成 webm: {webm_path}")
+    if policy is not None:
+        print(f"网络拦截: {policy.stats}")
 
     # 推断输出基名
-    ts = time.strftime("%Y%m%d-%H%M%S")
     base = Path(args.out).with_suffix("") if args.out else Path(f"capture-{ts}")
 
-    # mp4 转码
-    if args.mp4:
-        if not which("ffmpeg"):
-            print("未找到 ffmpeg，可执行不在 PATH 中", file=sys.stderr)
-            sys.exit(2)
-        mp4_path = base.with_suffix(".mp4")
-        run_ffmpeg(["-i", str(webm_path), "-c:v", "libx264", "-pix_fmt", "yuv420p", str(mp4_path)])
-        print(f"生成 mp4: {mp4_path}")
-
-    # gif 生成（palettegen + paletteuse）
-    if args.gif:
-        if not which("ffmpeg"):
-            print("未找到 ffmpeg，可执行不在 PATH 中", file=sys.stderr)
-            sys.exit(2)
-        palette = base.with_suffix(".png")
-        gif_path = base.with_suffix(".gif")
-        run_ffmpeg([
-            "-i", str(webm_path),
-            "-vf", f"fps={args.gif_fps},scale={args.gif_width}:-1:flags=lanczos,palettegen",
-            str(palette),
-        ])
-        run_ffmpeg([
-            "-i", str(webm_path),
-            "-i", str(palette),
-            "-lavfi", f"fps={args.gif_fps},scale={args.gif_width}:-1:flags=lanczos,paletteuse=dither={args.gif_dither}",
-            str(gif_path),
-        ])
-        print(f"生成 gif: {gif_path}")
+    if (args.mp4 or args.gif) and not which("ffmpeg"):
+        print("未找到 ffmpeg，可执行不在 PATH 中", file=sys.stderr)
+        sys.exit(2)
+    outputs = transcode_outputs(
+        webm_path, base,
+        mp4=args.mp4, gif=args.gif,
+        gif_fps=args.gif_fps, gif_width=args.gif_width, gif_dither=args.gif_dither,
+    )
+    for kind, path in outputs.items():
+        print(f"生成 {kind}: {path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+产物保留策略：定期清理 .recordings / output / .generated_html
+
+每个目录可独立配置最大保留天数、最大总字节数与最大文件数。
+目录下的每个一级条目（文件或子目录）视为一个产物，按修改时间从新到旧保留，
+超出配额或过期的条目被删除；仍被缓存或进行中的任务引用的产物受保护。
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+
+@dataclass
+class RetentionPolicy:
+    """单个目录的保留策略（None 表示不限制）"""
+    directory: Path
+    max_age_days: Optional[float] = None
+    max_total_bytes: Optional[int] = None
+    max_count: Optional[int] = None
+    # 新产物的保护期：避免删除刚写入、尚未登记的文件
+    min_age_seconds: float = 600.0
+
+
+# 目录名 -> (环境变量前缀, 默认天数, 默认字节数, 默认数量)
+_DEFAULTS = {
+    ".recordings": ("RECORDINGS", 7, 5 * 1024 ** 3, 500),
+    "output": ("OUTPUT", 30, 20 * 1024 ** 3, 2000),
+    ".generated_html": ("GENERATED_HTML", 30, 1024 ** 3, 5000),
+}
+
+
+def _env_number(name: str, default: Optional[float]) -> Optional[float]:
+    raw = os.environ.get(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        return default
+    # 0 或负数表示关闭该项限制
+    return value if value > 0 else None
+
+
+def default_policies(root: Optional[Path] = None) -> List[RetentionPolicy]:
+    """
+    根据环境变量构建默认策略，例如：
+    RETENTION_RECORDINGS_MAX_AGE_DAYS / RETENTION_RECORDINGS_MAX_BYTES / RETENTION_RECORDINGS_MAX_COUNT
+    """
+    root = root or Path(".")
+    policies = []
+    for dirname, (prefix, days, max_bytes, count) in _DEFAULTS.items():
+        max_total = _env_number(f"RETENTION_{prefix}_MAX_BYTES", max_bytes)
+        max_count = _env_number(f"RETENTION_{prefix}_MAX_COUNT", count)
+        policies.append(RetentionPolicy(
+            directory=root / dirname,
+            max_age_days=_env_number(f"RETENTION_{prefix}_MAX_AGE_DAYS", days),
+            max_total_bytes=int(max_total) if max_total else None,
+            max_count=int(max_count) if max_count else None,
+        ))
+    return policies
+
+
+def _entry_stats(path: str, is_dir: bool) -> tuple[int, float]:
+    """返回 (总字节数, 最新修改时间)，目录递归统计"""
+    if not is_dir:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime
+
+    total = 0
+    newest = os.stat(path).st_mtime
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    total += st.st_size
+                    newest = max(newest, st.st_mtime)
+        except OSError:
+            continue
+    return total, newest
+
+
+class RetentionManager:
+    """后台产物清理管理器（在独立的低优先级线程中运行，不占用事件循环）"""
+
+    def __init__(
+        self,
+        policies: List[RetentionPolicy],
+        interval: float = 3600.0,
+        dry_run: bool = False,
+        logger: Any = None,
+        leader: Optional[Callable[[], bool]] = None,
+        on_delete: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        :param leader: 可选，返回本进程是否应执行本轮清理（多 worker 时只由持有租约的 worker 执行）
+        :param on_delete: 可选，每个条目删除成功后以其路径调用（如同步产物目录）
+        """
+        self.policies = policies
+        self.interval = interval
+        self.dry_run = dry_run
+        self.logger = logger
+        self.leader = leader
+        self.on_delete = on_delete
+        self._protected: Dict[str, int] = {}
+        self._providers: List[Callable[[], Iterable[Path]]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    # ------------------------------------------------------------------
+    # 受保护产物登记
+    # ------------------------------------------------------------------
+    @contextmanager
+    def protect(self, *paths: Optional[Path]) -> Iterator[Callable[[Optional[Path]], None]]:
+        """
+        在任务执行期间保护指定路径（按引用计数释放）
+
+        返回的 add 函数可在任务中途追加新产生的路径：
+            with manager.protect(html_path) as protect_path:
+                protect_path(mp4_path)
+        """
+        keys: List[str] = []
+
+        def add(path: Optional[Path]) -> None:
+            if not path:
+                return
+            key = str(Path(path).resolve())
+            with self._lock:
+                self._protected[key] = self._protected.get(key, 0) + 1
+            keys.append(key)
+
+        for p in paths:
+            add(p)
+        try:
+            yield add
+        finally:
+            with self._lock:
+                for key in keys:
+                    remaining = self._protected.get(key, 1) - 1
+                    if remaining > 0:
+                        self._protected[key] = remaining
+                    else:
+                        self._protected.pop(key, None)
+
+    def add_protected_provider(self, provider: Callable[[], Iterable[Path]]) -> None:
+        """注册额外的受保护路径来源（例如缓存索引）"""
+        self._providers.append(provider)
+
+    def _protected_paths(self) -> Set[str]:
+        with self._lock:
+            protected = set(self._protected)
+        for provider in self._providers:
+            try:
+                protected.update(str(Path(p).resolve()) for p in provider())
+            except Exception as e:
+                self._log("warning", f"[retention] 获取受保护路径失败: {e}")
+        return protected
+
+    @staticmethod
+    def _is_protected(path: str, protected: Set[str]) -> bool:
+        # 条目本身或其内部任一文件被引用都视为受保护
+        if path in protected:
+            return True
+        prefix = path + os.sep
+        return any(p.startswith(prefix) for p in protected)
+
+    # ------------------------------------------------------------------
+    # 清理逻辑
+    # ------------------------------------------------------------------
+    def _plan_directory(self, policy: RetentionPolicy, protected: Set[str], now: float) -> Dict[str, Any]:
+        directory = policy.directory.resolve()
+        report: Dict[str, Any] = {
+            "directory": str(policy.directory),
+            "scanned": 0,
+            "protected": 0,
+            "bytes_before": 0,
+            "bytes_after": 0,
+            "delete": [],
+        }
+        if not directory.is_dir():
+            return report
+
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    size, mtime = _entry_stats(entry.path, entry.is_dir(follow_symlinks=False))
+                except OSError:
+                    continue
+                entries.append((entry.path, size, mtime))
+
+        # 从新到旧遍历，先到先得地占用配额
+        entries.sort(key=lambda e: e[2], reverse=True)
+        kept_count = 0
+        kept_bytes = 0
+        for path, size, mtime in entries:
+            report["scanned"] += 1
+            report["bytes_before"] += size
+            age = now - mtime
+
+            reason = None
+            if self._is_protected(path, protected):
+                report["protected"] += 1
+            elif age < policy.min_age_seconds:
+                pass
+            elif policy.max_age_days is not None and age > policy.max_age_days * 86400:
+                reason = "max_age"
+            elif policy.max_count is not None and kept_count + 1 > policy.max_count:
+                reason = "max_count"
+            elif policy.max_total_bytes is not None and kept_bytes + size > policy.max_total_bytes:
+                reason = "max_total_bytes"
+
+            if reason:
+                report["delete"].append({
+                    "path": path,
+                    "bytes": size,
+                    "age_days": round(age / 86400, 2),
+                    "reason": reason,
+                })
+            else:
+                kept_count += 1
+                kept_bytes += size
+
+        report["bytes_after"] = kept_bytes
+        return report
+
+    def run_once(self, dry_run: Optional[bool] = None) -> Dict[str, Any]:
+        """执行一轮清理；dry_run=True 时只返回计划删除的条目"""
+        dry_run = self.dry_run if dry_run is None else dry_run
+        protected = self._protected_paths()
+        now = time.time()
+        started = time.monotonic()
+
+        directories = []
+        freed = 0
+        for policy in self.policies:
+            try:
+                plan = self._plan_directory(policy, protected, now)
+            except OSError as e:
+                self._log("warning", f"[retention] 扫描目录失败 {policy.directory}: {e}")
+                continue
+
+            if not dry_run:
+                # 删除前再检查一次保护状态，避免与新任务竞争
+                protected = self._protected_paths()
+                for item in plan["delete"]:
+                    if self._is_protected(item["path"], protected):
+                        item["skipped"] = "protected"
+                        continue
+                    try:
+                        if os.path.isdir(item["path"]) and not os.path.islink(item["path"]):
+                            shutil.rmtree(item["path"])
+                        else:
+                            os.remove(item["path"])
+                        freed += item["bytes"]
+                    except OSError as e:
+                        item["error"] = str(e)
+                        continue
+                    if self.on_delete is not None:
+                        try:
+                            self.on_delete(item["path"])
+                        except Exception as e:
+                            self._log("warning", f"[retention] 删除回调失败 {item['path']}: {e}")
+            else:
+                freed += sum(item["bytes"] for item in plan["delete"])
+            directories.append(plan)
+
+        report = {
+            "dry_run": dry_run,
+            "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+            "freed_bytes": freed,
+            "directories": directories,
+        }
+        self.last_report = report
+        deleted = sum(len(d["delete"]) for d in directories)
+        self._log(
+            "info",
+            f"[retention] {'预演' if dry_run else '清理'}完成: {deleted} 个条目, "
+            f"{freed / 1024 / 1024:.1f} MB, 耗时 {report['elapsed_ms']} ms",
+        )
+        return report
+
+    # ------------------------------------------------------------------
+    # 后台调度
+    # ------------------------------------------------------------------
+    def start(self, initial_delay: float = 60.0) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, args=(initial_delay,), name="retention", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self, initial_delay: float) -> None:
+        # Linux 下 setpriority 作用于单个线程，降低清理线程的调度优先级
+        if hasattr(os, "setpriority") and hasattr(threading, "get_native_id"):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+            except OSError:
+                pass
+
+        if self._stop.wait(initial_delay):
+            return
+        while not self._stop.is_set():
+            try:
+                if self.leader is None or self.leader():
+                    self.run_once()
+            except Exception as e:
+                self._log("error", f"[retention] 清理失败: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+    def _log(self, level: str, message: str) -> None:
+        if self.logger is not None:
+            getattr(self.logger, level)(message)
+        elif level != "info":
+            print(message, file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="按配额清理录制与导出产物")
+    parser.add_argument("--root", default=".", help="项目根目录（默认当前目录）")
+    parser.add_argument("--dry-run", action="store_true", help="仅输出将被删除的条目，不实际删除")
+    parser.add_argument("--max-age-days", type=float, help="覆盖所有目录的最大保留天数")
+    parser.add_argument("--max-bytes", type=int, help="覆盖所有目录的最大总字节数")
+    parser.add_argument("--max-count", type=int, help="覆盖所有目录的最大条目数")
+    args = parser.parse_args()
+
+    policies = default_policies(Path(args.root))
+    for policy in policies:
+        if args.max_age_days is not None:
+            policy.max_age_days = args.max_age_days
+        if args.max_bytes is not None:
+            policy.max_total_bytes = args.max_bytes
+        if args.max_count is not None:
+            policy.max_count = args.max_count
+
+    report = RetentionManager(policies).run_once(dry_run=args.dry_run)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
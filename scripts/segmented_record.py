@@ -0,0 +1,265 @@
+"""
+分段并行录制：把动画时间轴切成 K 段，在多个浏览器上下文中并行录制，
+每段通过受控的页面时钟跳转到起始偏移，最后用 FFmpeg concat 分离器无损拼接。
+
+适用于时长已知（duration）的动画；end_* 结束条件与交互脚本在该模式下不生效。
+"""
+import asyncio
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    from scripts.record_media import async_playwright, ffmpeg_bin, goto_ready, metrics, run_ffmpeg, tracing
+except ImportError:  # 以 python scripts/record_media.py 方式运行时
+    from record_media import async_playwright, ffmpeg_bin, goto_ready, metrics, run_ffmpeg, tracing
+
+
+# 记录每个元素最近一次被插入/修改 class、style 的（虚拟）时间，用于跳转时换算 CSS 动画进度
+_BIRTH_TRACKER_JS = """
+(() => {
+  const births = new WeakMap();
+  window.__segBirths = births;
+  const mark = (el) => { if (el && el.nodeType === 1) births.set(el, performance.now()); };
+  new MutationObserver((records) => {
+    for (const r of records) {
+      if (r.type === 'attributes') { mark(r.target); continue; }
+      r.addedNodes.forEach((n) => { mark(n); if (n.querySelectorAll) n.querySelectorAll('*').forEach(mark); });
+    }
+  }).observe(document, { subtree: true, childList: true, attributes: true, attributeFilter: ['class', 'style'] });
+})();
+"""
+
+# 将所有 CSS/Web Animations 对齐到虚拟时间轴上的 offset（毫秒）
+_SEEK_ANIMATIONS_JS = """
+(offset) => {
+  const origin = window.__segOrigin || 0;
+  const births = window.__segBirths;
+  let count = 0;
+  for (const a of document.getAnimations()) {
+    const target = a.effect && a.effect.target;
+    const born = (births && target && births.get(target)) || origin;
+    a.currentTime = Math.max(0, offset - (Math.max(born, origin) - origin));
+    count += 1;
+  }
+  return count;
+}
+"""
+
+# 接缝检测使用的灰度缩略帧尺寸
+_PROBE_W, _PROBE_H = 64, 36
+
+
+def auto_segment_count(duration: float, min_segment: float = 10.0) -> int:
+    """按 CPU 核数与最短分段时长估算分段数"""
+    cpus = os.cpu_count() or 1
+    return max(1, min(cpus, int(duration // min_segment) or 1))
+
+
+async def _record_segment(
+    browser: Any,
+    index: int,
+    offset: float,
+    length: float,
+    url: str,
+    out_dir: Path,
+    width: int,
+    height: int,
+    wait_until: str,
+    timeout: int,
+    background: Optional[str],
+    network_policy: Optional[Any],
+) -> Dict[str, Any]:
+    seg_dir = out_dir / f"seg{index:02d}"
+    seg_dir.mkdir(parents=True, exist_ok=True)
+    context = await browser.new_context(
+        viewport={"width": width, "height": height},
+        record_video_dir=str(seg_dir),
+        record_video_size={"width": width, "height": height},
+        color_scheme="light",
+    )
+    try:
+        if network_policy is not None:
+            await network_policy.install(context)
+        await context.add_init_script(_BIRTH_TRACKER_JS)
+        video_started = time.monotonic()
+        page = await context.new_page()
+        page.set_default_timeout(timeout)
+
+        # 加载期间暂停页面时钟，所有分段都从同一个虚拟零点开始
+        base = time.time()
+        await page.clock.install(time=base)
+        await page.clock.pause_at(base + 1)
+        await goto_ready(page, url, wait_until)
+        if background:
+            await page.evaluate("(color) => { document.body.style.background = color }", background)
+
+        await page.evaluate("() => { window.__segOrigin = performance.now(); }")
+        if offset > 0:
+            # 触发 [0, offset) 内的全部 JS 定时器 / rAF，再把 CSS 动画对齐到同一时刻
+            await page.clock.run_for(int(offset * 1000))
+        animations = await page.evaluate(_SEEK_ANIMATIONS_JS, offset * 1000)
+        await page.clock.resume()
+        head = time.monotonic() - video_started
+
+        await asyncio.sleep(length)
+        video = page.video
+    finally:
+        await context.close()
+
+    if video is None:
+        raise RuntimeError(f"分段 {index} 未生成 webm 文件")
+    return {
+        "index": index,
+        "offset": round(offset, 3),
+        "length": round(length, 3),
+        "head_trim": round(head, 3),
+        "animations": animations,
+        "raw": Path(await video.path()),
+    }
+
+
+def _normalize_segment(seg: Dict[str, Any], fps: int, dest: Path) -> None:
+    """裁掉加载与跳转阶段，并以统一参数重新编码，保证拼接时可直接复制码流"""
+    run_ffmpeg([
+        "-ss", f"{seg['head_trim']:.3f}",
+        "-i", str(seg["raw"]),
+        "-t", f"{seg['length']:.3f}",
+        "-r", str(fps),
+        "-an",
+        "-c:v", "libvpx", "-crf", "10", "-b:v", "8M",
+        "-deadline", "realtime", "-cpu-used", "8", "-auto-alt-ref", "0",
+        str(dest),
+    ])
+
+
+def _gray_frames(path: Path, tail: bool, count: int = 2) -> List[bytes]:
+    """读取开头或结尾的若干帧（灰度缩略图原始字节）"""
+    args = [ffmpeg_bin(), "-v", "error"]
+    if tail:
+        args += ["-sseof", "-0.5"]
+    args += ["-i", str(path)]
+    if not tail:
+        args += ["-frames:v", str(count)]
+    args += ["-vf", f"scale={_PROBE_W}:{_PROBE_H},format=gray", "-f", "rawvideo", "-"]
+    data = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    size = _PROBE_W * _PROBE_H
+    frames = [data[i:i + size] for i in range(0, len(data) - size + 1, size)]
+    return frames[-count:] if tail else frames[:count]
+
+
+def _frame_diff(a: bytes, b: bytes) -> float:
+    """两帧的平均绝对差（0~1）"""
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    return sum(abs(x - y) for x, y in zip(a, b)) / (255.0 * len(a))
+
+
+def check_seams(paths: List[Path], threshold: float = 0.08) -> List[Dict[str, Any]]:
+    """
+    比较相邻分段的接缝：接缝两侧帧差应与分段内部相邻帧差处于同一量级。
+    差异明显偏大通常意味着跳转不准确（页面状态与时间轴不一致）。
+    """
+    seams = []
+    for i in range(len(paths) - 1):
+        tail = _gray_frames(paths[i], tail=True)
+        head = _gray_frames(paths[i + 1], tail=False)
+        if not tail or not head:
+            seams.append({"boundary": i, "ok": False, "error": "无法读取接缝帧"})
+            continue
+        diff = _frame_diff(tail[-1], head[0])
+        baseline = _frame_diff(tail[0], tail[-1]) if len(tail) > 1 else 0.0
+        seams.append({
+            "boundary": i,
+            "diff": round(diff, 4),
+            "baseline": round(baseline, 4),
+            "ok": diff <= max(threshold, baseline * 3),
+        })
+    return seams
+
+
+async def record_segmented(
+    url: str,
+    out_dir: Path,
+    width: int,
+    height: int,
+    fps: int,
+    headless: bool,
+    wait_until: str,
+    timeout: int,
+    duration: float,
+    segments: int = 0,
+    background: Optional[str] = None,
+    seam_threshold: float = 0.08,
+    network_policy: Optional[Any] = None,
+) -> Dict[str, Any]:
+    """
+    并行分段录制并拼接为单个 webm
+
+    :param segments: 分段数，0 表示按 CPU 核数自动选择
+    :return: {"path": 拼接后的 webm, "segments": [...], "seams": [...], "seams_ok": bool}
+    """
+    if async_playwright is None:
+        raise RuntimeError("未安装 Playwright，请先 pip install playwright 并 playwright install chromium")
+    if duration <= 0:
+        raise ValueError("分段录制需要指定动画总时长 duration")
+
+    count = segments if segments > 0 else auto_segment_count(duration)
+    seg_len = duration / count
+    out_dir.mkdir(parents=True, exist_ok=True)
+    started = time.monotonic()
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        metrics.BROWSERS.inc()
+        metrics.RECORDINGS_IN_FLIGHT.inc()
+        try:
+            parts = await asyncio.gather(*[
+                _record_segment(
+                    browser, i, i * seg_len, min(seg_len, duration - i * seg_len),
+                    url, out_dir, width, height, wait_until, timeout, background, network_policy,
+                )
+                for i in range(count)
+            ])
+        finally:
+            await browser.close()
+            metrics.BROWSERS.dec()
+            metrics.RECORDINGS_IN_FLIGHT.dec()
+    record_elapsed = time.monotonic() - started
+    tracing.record_span("segment_capture", time.perf_counter() - record_elapsed, segments=count)
+    metrics.RECORDING_WALL.observe(record_elapsed, mode="segmented")
+    metrics.RECORDING_VIDEO.observe(duration, mode="segmented")
+    metrics.RECORDING_OVERHEAD.observe(record_elapsed / duration, mode="segmented")
+
+    # 并行裁剪、统一编码参数
+    normalized = [out_dir / f"part{seg['index']:02d}.webm" for seg in parts]
+    await asyncio.gather(*[
+        asyncio.to_thread(_normalize_segment, seg, fps, dest)
+        for seg, dest in zip(parts, normalized)
+    ])
+
+    # concat 分离器 + 流复制：无二次编码
+    list_file = out_dir / "segments.txt"
+    list_file.write_text(
+        "".join(f"file '{p.resolve().as_posix()}'\n" for p in normalized), encoding="utf-8"
+    )
+    final_path = out_dir / "segmented.webm"
+    await asyncio.to_thread(
+        run_ffmpeg, ["-f", "concat", "-safe", "0", "-i", str(list_file), "-c", "copy", str(final_path)]
+    )
+
+    seams = await asyncio.to_thread(check_seams, normalized, seam_threshold)
+    for seg in parts:
+        seg["raw"] = str(seg["raw"])
+    return {
+        "path": final_path,
+        "segments": parts,
+        "seams": seams,
+        "seams_ok": all(s.get("ok") for s in seams),
+        "record_seconds": round(record_elapsed, 3),
+        "total_seconds": round(time.monotonic() - started, 3),
+        "realtime_factor": round(duration / max(record_elapsed, 1e-6), 2),
+        "network": network_policy.stats if network_policy is not None else None,
+    }
@@ -0,0 +1,385 @@
+"""
+多 worker 共享状态（uvicorn --workers N）
+
+保存需要在 worker 之间保持一致的少量状态：设置页保存的配置、渐进式录制任务记录、
+/test-config 结果缓存等。默认后端为 SQLite（WAL 模式，读写互不阻塞），可通过 STATE_URL 切换：
+
+    STATE_URL=sqlite:///.state/shared.db   默认
+    STATE_URL=memory://                    仅当前进程（单 worker / 调试）
+
+变更通知：每个命名空间有一个版本号，写入时递增；ChangeFeed 先用 PRAGMA data_version
+（只有其他连接提交过写入时才会变化，几乎没有开销）判断是否需要查询版本号，因此轮询很便宜。
+
+数据库文件在第一次写入时才创建，只读访问不存在的数据库不会产生任何文件。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+DEFAULT_STATE_URL = "sqlite:///.state/shared.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    namespace TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def connect_sqlite(path: Path, busy_timeout_ms: int = 5000) -> sqlite3.Connection:
+    """
+    打开多进程共用的 SQLite 数据库：WAL（读写互不阻塞）+ busy_timeout（写入排队而不是立即报错）
+
+    连接为自动提交模式（写事务需显式 BEGIN），允许跨线程使用（调用方自行加锁）。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=busy_timeout_ms / 1000,
+                           isolation_level=None, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL 下 NORMAL 只在断电时可能丢失最近的提交，不会损坏数据库
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class StateStore:
+    """共享状态接口（值为可 JSON 序列化的对象）"""
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        """命名空间内未过期的全部条目（按更新时间从旧到新）"""
+        raise NotImplementedError
+
+    def prune(self, namespace: str, keep: int, pinned: Optional[Callable[[Any], bool]] = None) -> None:
+        """
+        只保留最近更新的 keep 条，并删除已过期条目
+
+        :param pinned: 可选，对值返回 True 的条目（如进行中的任务）不删除、也不计入 keep
+        """
+        raise NotImplementedError
+
+    def versions(self, namespaces: Iterable[str]) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def data_version(self) -> Optional[int]:
+        """其他进程提交写入后变化的计数；不支持时返回 None（每次都查询版本号）"""
+        return None
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """获取或续期租约（同一时刻只有一个 owner 持有）"""
+        raise NotImplementedError
+
+    def release_lease(self, name: str, owner: str) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryStore(StateStore):
+    """进程内实现：单 worker 时与 SQLite 行为一致，但不跨进程共享"""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._leases: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _bump(self, namespace: str) -> None:
+        self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(namespace, {}).get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+            return None
+        return entry[0]
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        # 与 SQLite 后端一致：保存的是 JSON 副本
+        value = json.loads(json.dumps(value, ensure_ascii=False))
+        with self._lock:
+            space = self._data.setdefault(namespace, {})
+            space.pop(key, None)
+            space[key] = (value, time.time() + ttl if ttl else None)
+            self._bump(namespace)
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            if self._data.get(namespace, {}).pop(key, None) is not None:
+                self._bump(namespace)
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            space = dict(self._data.get(namespace, {}))
+        return {k: v for k, (v, expires) in space.items() if expires is None or expires > now}
+
+    def prune(self, namespace: str, keep: int, pinned: Optional[Callable[[Any], bool]] = None) -> None:
+        now = time.time()
+        with self._lock:
+            space = self._data.get(namespace, {})
+            live = [k for k, (_, expires) in space.items() if expires is None or expires > now]
+            candidates = [k for k in live if pinned is None or not pinned(space[k][0])]
+            drop = [k for k in space if k not in live] + (candidates[:-keep] if keep > 0 else candidates)
+            for key in drop:
+                space.pop(key, None)
+            if drop:
+                self._bump(namespace)
+
+    def versions(self, namespaces: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            return {ns: self._versions.get(ns, 0) for ns in namespaces}
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            current = self._leases.get(name)
+            if current is None or current[0] == owner or current[1] <= now:
+                self._leases[name] = (owner, now + ttl)
+                return True
+            return False
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == owner:
+                self._leases.pop(name, None)
+
+
+class SQLiteStore(StateStore):
+    """
+    SQLite 实现：WAL 模式 + busy_timeout，多个 worker 进程可同时读写
+
+    每个进程持有一个连接（由锁串行化，单次操作在亚毫秒级）。
+    """
+
+    def __init__(self, path: Path, busy_timeout_ms: int = 5000):
+        self.path = Path(path)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self, create: bool) -> Optional[sqlite3.Connection]:
+        if self._conn is not None:
+            return self._conn
+        if not create and not self.path.exists():
+            return None
+        conn = connect_sqlite(self.path, self.busy_timeout_ms)
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+        return conn
+
+    def _bump(self, conn: sqlite3.Connection, namespace: str) -> None:
+        conn.execute(
+            "INSERT INTO versions (namespace, version) VALUES (?, 1) "
+            "ON CONFLICT(namespace) DO UPDATE SET version = version + 1",
+            (namespace,),
+        )
+
+    def _write(self, fn: Any) -> Any:
+        with self._lock:
+            conn = self._connect(create=True)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+
+        def write(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, "
+                "expires_at = excluded.expires_at, updated_at = excluded.updated_at",
+                (namespace, key, payload, now + ttl if ttl else None, now),
+            )
+            self._bump(conn, namespace)
+
+        self._write(write)
+
+    def delete(self, namespace: str, key: str) -> None:
+        def write(conn: sqlite3.Connection) -> None:
+            if conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).rowcount:
+                self._bump(conn, namespace)
+
+        if self.path.exists():
+            self._write(write)
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return {}
+            rows = conn.execute(
+                "SELECT key, value FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?) "
+                "ORDER BY updated_at",
+                (namespace, time.time()),
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def prune(self, namespace: str, keep: int, pinned: Optional[Callable[[Any], bool]] = None) -> None:
+        def write(conn: sqlite3.Connection) -> None:
+            removed = conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (namespace, time.time()),
+            ).rowcount
+            if pinned is None:
+                removed += conn.execute(
+                    "DELETE FROM kv WHERE namespace = ? AND key NOT IN ("
+                    "SELECT key FROM kv WHERE namespace = ? ORDER BY updated_at DESC LIMIT ?)",
+                    (namespace, namespace, max(0, keep)),
+                ).rowcount
+            else:
+                rows = conn.execute(
+                    "SELECT key, value FROM kv WHERE namespace = ? ORDER BY updated_at DESC", (namespace,)
+                ).fetchall()
+                candidates = [key for key, value in rows if not pinned(json.loads(value))]
+                drop = candidates[max(0, keep):]
+                conn.executemany("DELETE FROM kv WHERE namespace = ? AND key = ?", [(namespace, key) for key in drop])
+                removed += len(drop)
+            if removed:
+                self._bump(conn, namespace)
+
+        if self.path.exists():
+            self._write(write)
+
+    def versions(self, namespaces: Iterable[str]) -> Dict[str, int]:
+        namespaces = list(namespaces)
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return {ns: 0 for ns in namespaces}
+            rows = dict(conn.execute(
+                f"SELECT namespace, version FROM versions WHERE namespace IN ({','.join('?' * len(namespaces))})",
+                namespaces,
+            ).fetchall()) if namespaces else {}
+        return {ns: rows.get(ns, 0) for ns in namespaces}
+
+    def data_version(self) -> Optional[int]:
+        with self._lock:
+            conn = self._connect(create=False)
+            if conn is None:
+                return -1
+            return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+
+        def write(conn: sqlite3.Connection) -> bool:
+            return bool(conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+                (name, owner, now + ttl, now),
+            ).rowcount)
+
+        return self._write(write)
+
+    def release_lease(self, name: str, owner: str) -> None:
+        if self.path.exists():
+            self._write(lambda conn: conn.execute(
+                "DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner)))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class ChangeFeed:
+    """
+    轮询其他 worker 对指定命名空间的修改（节流，未到检查时间时只有一次时间比较）
+
+    poll() 返回自上次检查以来版本号发生变化的命名空间；本进程自己的写入同样会被报告一次，
+    调用方应保证重复处理是幂等的。
+    """
+
+    def __init__(self, store: StateStore, namespaces: Iterable[str], interval: float = 1.0):
+        self.store = store
+        self.namespaces = list(namespaces)
+        self.interval = interval
+        self._next_check = 0.0
+        self._data_version = store.data_version()
+        self._versions = store.versions(self.namespaces)
+
+    def poll(self, now: Optional[float] = None) -> Set[str]:
+        now = now if now is not None else time.monotonic()
+        if now < self._next_check:
+            return set()
+        self._next_check = now + self.interval
+        data_version = self.store.data_version()
+        if data_version is not None and data_version == self._data_version:
+            return set()
+        self._data_version = data_version
+        versions = self.store.versions(self.namespaces)
+        changed = {ns for ns, version in versions.items() if version != self._versions.get(ns)}
+        self._versions = versions
+        return changed
+
+    def mark_seen(self) -> None:
+        """本进程写入后调用，避免把自己的修改当作外部变更"""
+        self._versions = self.store.versions(self.namespaces)
+
+
+def open_store(url: Optional[str] = None) -> StateStore:
+    """
+    按 URL 创建后端：sqlite:///相对路径、sqlite:////绝对路径、memory://
+
+    :raises ValueError: 不支持的 URL
+    """
+    url = url or os.getenv("STATE_URL") or DEFAULT_STATE_URL
+    if url.startswith("memory:"):
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(Path(url[len("sqlite:///"):]))
+    raise ValueError(f"不支持的 STATE_URL: {url}")
+
+
+def worker_id() -> str:
+    """当前 worker 的标识（主机名 + PID），用于租约与任务归属"""
+    import socket
+    return f"{socket.gethostname()}:{os.getpid()}"
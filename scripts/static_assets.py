@@ -0,0 +1,270 @@
+"""
+静态资源构建与预压缩分发
+
+构建（部署前执行一次，static/ 内容变化后重新执行）：
+
+    python -m scripts.static_assets            # 输出到 .static_build（STATIC_BUILD_DIR）
+
+为 static/ 下的每个文件生成：
+- 内容哈希文件名的副本（script.js → script.3f2a9c1b0d.js），以 Cache-Control: immutable 长期缓存
+- 可压缩类型的 .gz（gzip -9）与 .br（需安装 brotli；未安装时跳过）预压缩版本
+- manifest.json：源文件 → 哈希文件名、构建时的大小与修改时间
+
+运行时 PrecompressedStaticFiles 按 Accept-Encoding 选择 .br / .gz / 原文件（Vary: Accept-Encoding）。
+未带哈希的地址使用 Cache-Control: no-cache（ETag 协商）；源文件在构建后被修改时不再使用过期的预压缩
+版本与哈希地址，退回原文件与 ?v=<mtime>。
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import stat
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+DEFAULT_BUILD_DIR = ".static_build"
+MANIFEST_NAME = "manifest.json"
+
+# 值得压缩的类型（图片、字体等已压缩格式不处理）
+COMPRESSIBLE_SUFFIXES = {".js", ".mjs", ".css", ".svg", ".html", ".json", ".map", ".txt", ".vtt", ".xml"}
+# 小于此大小的文件压缩收益可忽略
+MIN_COMPRESS_BYTES = 256
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# 协商顺序：优先 brotli
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def build_dir_from_env() -> Path:
+    return Path(os.getenv("STATIC_BUILD_DIR") or DEFAULT_BUILD_DIR)
+
+
+def hashed_name(relative: str, digest: str) -> str:
+    path = Path(relative)
+    return str(path.with_name(f"{path.stem}.{digest[:10]}{path.suffix}"))
+
+
+def accepted_encodings(header: str) -> Set[str]:
+    """解析 Accept-Encoding（忽略 q=0 的编码）"""
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(name)
+    if "*" in accepted:
+        accepted.update(encoding for encoding, _ in _ENCODINGS)
+    return accepted
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _write_compressed(source: Path, brotli_module: Any) -> list:
+    """写入 source.gz / source.br（仅在比原文件小时保留），返回生成的编码"""
+    data = source.read_bytes()
+    encodings = []
+    variants = [("gzip", ".gz", lambda b: gzip.compress(b, compresslevel=9, mtime=0))]
+    if brotli_module is not None:
+        variants.insert(0, ("br", ".br", lambda b: brotli_module.compress(b, quality=11)))
+    for encoding, suffix, compress in variants:
+        target = source.with_name(source.name + suffix)
+        compressed = compress(data)
+        if len(compressed) < len(data):
+            target.write_bytes(compressed)
+            encodings.append(encoding)
+        elif target.exists():
+            target.unlink()
+    return encodings
+
+
+def build(source_dir: Path, build_dir: Path) -> Dict[str, Any]:
+    """构建哈希文件名副本与预压缩版本，返回写入的清单"""
+    source_dir = Path(source_dir)
+    build_dir = Path(build_dir)
+    if build_dir.exists():
+        shutil.rmtree(build_dir)
+    build_dir.mkdir(parents=True)
+    brotli_module = _brotli()
+
+    files: Dict[str, Any] = {}
+    for path in sorted(source_dir.rglob("*")):
+        if not path.is_file():
+            continue
+        relative = path.relative_to(source_dir).as_posix()
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        hashed = hashed_name(relative, digest)
+        st = path.stat()
+        entry: Dict[str, Any] = {
+            "hashed": hashed,
+            "sha256": digest,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "encodings": [],
+        }
+        target = build_dir / hashed
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        if path.suffix.lower() in COMPRESSIBLE_SUFFIXES and len(data) >= MIN_COMPRESS_BYTES:
+            entry["encodings"] = _write_compressed(target, brotli_module)
+        files[relative] = entry
+
+    manifest = {"source": str(source_dir), "brotli": brotli_module is not None, "files": files}
+    (build_dir / MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    return manifest
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    在 StaticFiles 基础上支持构建产物：哈希文件名（immutable 缓存）与 .br / .gz 预压缩版本
+
+    构建目录不存在时行为与 StaticFiles 相同（另加 no-cache 协商缓存头）。
+    """
+
+    def __init__(self, *, directory: str, build_dir: Optional[Path] = None, prefix: str = "/static", **kwargs: Any):
+        super().__init__(directory=directory, **kwargs)
+        self.build_dir = Path(build_dir) if build_dir is not None else build_dir_from_env()
+        self.prefix = prefix.rstrip("/")
+        # 哈希文件只存在于构建目录：源目录优先，其次构建目录
+        self.all_directories.append(str(self.build_dir))
+        self._manifest: Dict[str, Any] = {}
+        self._hashed: Dict[str, str] = {}
+        self._manifest_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        """读取构建清单（重新构建后自动刷新）"""
+        try:
+            mtime = (self.build_dir / MANIFEST_NAME).stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime != self._manifest_mtime:
+                files: Dict[str, Any] = {}
+                if mtime is not None:
+                    try:
+                        files = json.loads((self.build_dir / MANIFEST_NAME).read_text(encoding="utf-8"))["files"]
+                    except (OSError, ValueError, KeyError):
+                        files = {}
+                self._manifest = files
+                self._hashed = {entry["hashed"]: name for name, entry in files.items()}
+                self._manifest_mtime = mtime
+            return self._manifest
+
+    def _fresh_entry(self, name: str) -> Optional[Dict[str, Any]]:
+        """源文件自构建后未被修改时返回其清单条目"""
+        entry = self._load_manifest().get(name)
+        if entry is None:
+            return None
+        try:
+            st = os.stat(os.path.join(str(self.directory), name))
+        except OSError:
+            return None
+        if st.st_size != entry["size"] or st.st_mtime_ns != entry["mtime_ns"]:
+            return None
+        return entry
+
+    def url_for(self, name: str) -> str:
+        """模板中引用静态资源的地址：已构建时为哈希文件名，否则附加修改时间作为版本号"""
+        entry = self._fresh_entry(name)
+        if entry is not None:
+            return f"{self.prefix}/{entry['hashed']}"
+        try:
+            version = int(os.stat(os.path.join(str(self.directory), name)).st_mtime)
+        except OSError:
+            return f"{self.prefix}/{name}"
+        return f"{self.prefix}/{name}?v={version}"
+
+    def _negotiate(self, path: str, accept_encoding: str) -> Optional[Tuple[str, os.stat_result, Optional[str], bool, str]]:
+        """返回 (实际文件, stat, Content-Encoding, 是否 immutable, 用于推断类型的文件名)"""
+        full_path, stat_result = self.lookup_path(path)
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            return None
+        self._load_manifest()
+        name = Path(path).as_posix()
+        immutable = name in self._hashed and not os.path.exists(os.path.join(str(self.directory), path))
+        entry = self._manifest.get(self._hashed[name]) if immutable else self._fresh_entry(name)
+        if entry is not None and entry["encodings"]:
+            accepted = accepted_encodings(accept_encoding)
+            for encoding, suffix in _ENCODINGS:
+                if encoding in accepted and encoding in entry["encodings"]:
+                    variant = self.build_dir / (entry["hashed"] + suffix)
+                    try:
+                        return str(variant), variant.stat(), encoding, immutable, full_path
+                    except OSError:
+                        break
+        return full_path, stat_result, None, immutable, full_path
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        request_headers = Headers(scope=scope)
+        try:
+            found = await anyio.to_thread.run_sync(self._negotiate, path, request_headers.get("accept-encoding", ""))
+        except (OSError, ValueError):
+            found = None
+        if found is None:
+            return await super().get_response(path, scope)
+
+        full_path, stat_result, encoding, immutable, media_path = found
+        media_type = mimetypes.guess_type(media_path)[0] or "application/octet-stream"
+        response = FileResponse(full_path, stat_result=stat_result, media_type=media_type)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        if Path(media_path).suffix.lower() in COMPRESSIBLE_SUFFIXES:
+            response.headers["Vary"] = "Accept-Encoding"
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="构建静态资源：哈希文件名 + gzip / brotli 预压缩")
+    parser.add_argument("--source", default="static", help="静态资源目录（默认 static）")
+    parser.add_argument("--out", default=None, help=f"输出目录（默认 STATIC_BUILD_DIR 或 {DEFAULT_BUILD_DIR}）")
+    args = parser.parse_args()
+
+    out = Path(args.out) if args.out else build_dir_from_env()
+    manifest = build(Path(args.source), out)
+    if not manifest["brotli"]:
+        print("未安装 brotli（pip install brotli），仅生成 gzip 版本")
+    for name, entry in manifest["files"].items():
+        sizes = []
+        for encoding, suffix in _ENCODINGS:
+            if encoding in entry["encodings"]:
+                sizes.append(f"{encoding} {(out / (entry['hashed'] + suffix)).stat().st_size}")
+        print(f"{name:<16} → {entry['hashed']:<28} {entry['size']} B  {'  '.join(sizes)}")
+    print(f"清单已写入: {out / MANIFEST_NAME}")
+
+
+if __name__ == "__main__":
+    main()
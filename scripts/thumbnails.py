@@ -0,0 +1,117 @@
+"""
+封面图、预览雪碧图与 WebVTT 缩略图轨道
+
+与主输出（mp4）共用同一次解码：通过 filter_complex 的 split 把解码后的画面
+分给 mp4 编码、封面截取和雪碧图拼接三个分支，只需运行一次 FFmpeg。
+"""
+import math
+import re
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+def probe_duration(ffmpeg_bin: str, path: Path) -> Optional[float]:
+    """从 ffmpeg -i 的输出读取时长（Playwright 生成的 webm 可能没有时长信息，返回 None）"""
+    proc = subprocess.run([ffmpeg_bin, "-hide_banner", "-i", str(path)], stderr=subprocess.PIPE, text=True)
+    m = _DURATION_RE.search(proc.stderr or "")
+    if not m:
+        return None
+    h, mnt, sec = m.groups()
+    return int(h) * 3600 + int(mnt) * 60 + float(sec)
+
+
+def _ts(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    h, ms = divmod(ms, 3600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+
+
+class ThumbnailPlan:
+    """一次录制的封面 / 雪碧图 / VTT 输出规划"""
+
+    def __init__(
+        self,
+        base_path: Path,
+        duration: float,
+        width: int,
+        height: int,
+        count: int = 20,
+        thumb_width: int = 160,
+        columns: int = 5,
+        poster_at: float = 0.5,
+        poster_format: str = "jpg",
+    ):
+        self.duration = max(duration, 0.1)
+        self.count = max(1, count)
+        self.columns = min(columns, self.count)
+        self.rows = math.ceil(self.count / self.columns)
+        self.thumb_width = thumb_width
+        # 保持宽高比，高度取偶数
+        self.thumb_height = max(2, int(round(thumb_width * height / width / 2)) * 2)
+        self.interval = self.duration / self.count
+        self.poster_time = min(self.duration * poster_at, max(self.duration - 0.1, 0))
+        self.width = width
+
+        fmt = "webp" if poster_format == "webp" else "jpg"
+        self.poster = base_path.with_name(f"{base_path.name}-poster.{fmt}")
+        self.sprite = base_path.with_name(f"{base_path.name}-sprite.jpg")
+        self.vtt = base_path.with_name(f"{base_path.name}-thumbnails.vtt")
+
+    def filter_branches(self, source: str) -> List[str]:
+        """返回 filter_complex 片段：从 source 标签派生 [poster] 与 [sprite] 两个输出标签"""
+        return [
+            f"{source}split=2[pin][sin]",
+            f"[pin]trim=start={self.poster_time:.3f},setpts=PTS-STARTPTS,scale={self.width}:-2[poster]",
+            f"[sin]fps=1/{self.interval:.4f},scale={self.thumb_width}:{self.thumb_height},"
+            f"tile={self.columns}x{self.rows}[sprite]",
+        ]
+
+    def output_args(self) -> List[str]:
+        poster_codec = ["-c:v", "libwebp", "-quality", "80"] if self.poster.suffix == ".webp" else ["-q:v", "3"]
+        return [
+            "-map", "[poster]", "-frames:v", "1", "-update", "1", *poster_codec, str(self.poster),
+            "-map", "[sprite]", "-frames:v", "1", "-update", "1", "-q:v", "5", str(self.sprite),
+        ]
+
+    def write_vtt(self) -> None:
+        """WebVTT 缩略图轨道：每个时间区间指向雪碧图中的一个区域（#xywh）"""
+        lines = ["WEBVTT", ""]
+        for i in range(self.count):
+            x = (i % self.columns) * self.thumb_width
+            y = (i // self.columns) * self.thumb_height
+            lines.append(f"{_ts(i * self.interval)} --> {_ts(min((i + 1) * self.interval, self.duration))}")
+            lines.append(f"{self.sprite.name}#xywh={x},{y},{self.thumb_width},{self.thumb_height}")
+            lines.append("")
+        self.vtt.write_text("\n".join(lines), encoding="utf-8")
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "poster": str(self.poster),
+            "sprite": str(self.sprite),
+            "vtt": str(self.vtt),
+            "tiles": self.count,
+            "grid": f"{self.columns}x{self.rows}",
+            "interval": round(self.interval, 3),
+        }
+
+
+def transcode_args(src: Path, mp4_path: Optional[Path], plan: ThumbnailPlan) -> List[str]:
+    """
+    构建单次解码的 FFmpeg 参数：可选 mp4 主输出 + 封面 + 雪碧图
+    """
+    if mp4_path is None:
+        graph = plan.filter_branches("[0:v]")
+        return ["-i", str(src), "-filter_complex", ";".join(graph), *plan.output_args()]
+
+    graph = ["[0:v]split=2[main][thumbs]", *plan.filter_branches("[thumbs]")]
+    return [
+        "-i", str(src),
+        "-filter_complex", ";".join(graph),
+        "-map", "[main]", "-c:v", "libx264", "-pix_fmt", "yuv420p", str(mp4_path),
+        *plan.output_args(),
+    ]
@@ -0,0 +1,214 @@
+"""
+请求级追踪（轻量 span）
+
+- 每个 HTTP 请求一个 Trace：ID 取自请求头 X-Trace-Id（仅限 1~64 个字母、数字、_、-），没有或不合法则生成
+- 代码中用 `with span("page_load"):` 记录耗时；当前 Trace / 父 span 通过 contextvars 传递，
+  asyncio 任务与 asyncio.to_thread 中的调用会自动继承
+- 请求结束时整条 Trace 以一行 JSON 写入日志（logger "ai_animation.trace"），
+  响应头返回 X-Trace-Id 与 Server-Timing（响应头发送前已完成的 span）
+- 没有活动 Trace 时（如命令行录制）span() 只是空操作
+"""
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACE_HEADER = "x-trace-id"
+# 静态资源与高频轮询不生成 Trace，避免日志噪声
+UNTRACED_PREFIXES = ("/static/", "/recordings/", "/output/", "/metrics", "/record/jobs/", "/favicon")
+trace_logger = logging.getLogger("ai_animation.trace")
+# Trace ID 会用作日志字段与文件名（采样结果），只接受安全字符
+TRACE_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def valid_trace_id(value: Optional[str]) -> bool:
+    return bool(value) and TRACE_ID_PATTERN.fullmatch(value) is not None
+
+
+class Trace:
+    def __init__(self, trace_id: Optional[str] = None, name: str = "request", **attrs: Any):
+        self.trace_id = trace_id if valid_trace_id(trace_id) else uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs: Dict[str, Any] = dict(attrs)
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _new_span_id(self) -> int:
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def add_span(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(record)
+
+    def server_timing(self) -> str:
+        """Server-Timing 头：同名 span 累加（例如多次 ffmpeg 调用）"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for record in self.spans:
+                totals[record["name"]] = totals.get(record["name"], 0.0) + record["duration_ms"]
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in totals.items())
+
+    def to_record(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda r: r["start_ms"])
+        return {
+            "type": "trace",
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "ts": round(self.started_at, 3),
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            **self.attrs,
+            "spans": spans,
+        }
+
+    def emit(self) -> None:
+        record = self.to_record()
+        trace_logger.info(json.dumps(record, ensure_ascii=False, default=str), extra={"data": record})
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("ai_animation_trace", default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar("ai_animation_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def set_attr(key: str, value: Any) -> None:
+    """给当前 Trace 附加属性（如 model、upstream），无活动 Trace 时忽略"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs[key] = value
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    记录一个 span；yield 的字典可在执行中补充属性（例如结束方式、返回码）
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield {}
+        return
+    span_id = trace._new_span_id()
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    extra: Dict[str, Any] = dict(attrs)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield extra
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        ended = time.perf_counter()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # 在异步生成器中跨 yield 使用时，退出可能发生在另一个上下文
+            _current_span.set(parent)
+        record: Dict[str, Any] = {
+            "name": name,
+            "id": span_id,
+            "parent": parent,
+            "start_ms": round((started - trace.started) * 1000, 1),
+            "duration_ms": round((ended - started) * 1000, 1),
+        }
+        if extra:
+            record["attrs"] = extra
+        if error:
+            record["error"] = error
+        trace.add_span(record)
+
+
+def record_span(name: str, started: float, ended: Optional[float] = None, **attrs: Any) -> None:
+    """记录一段已测量的区间（started / ended 为 time.perf_counter() 的值），适用于无法用 with 包裹的代码"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    ended = ended if ended is not None else time.perf_counter()
+    record: Dict[str, Any] = {
+        "name": name,
+        "id": trace._new_span_id(),
+        "parent": _current_span.get(),
+        "start_ms": round((started - trace.started) * 1000, 1),
+        "duration_ms": round((ended - started) * 1000, 1),
+    }
+    if attrs:
+        record["attrs"] = attrs
+    trace.add_span(record)
+
+
+@contextmanager
+def trace(trace_id: Optional[str] = None, name: str = "request", **attrs: Any) -> Iterator[Trace]:
+    """开启一条新的 Trace，退出时写入日志（用于后台任务等非 HTTP 场景）"""
+    current = Trace(trace_id, name, **attrs)
+    trace_token = _current_trace.set(current)
+    span_token = _current_span.set(None)
+    try:
+        yield current
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        current.emit()
+
+
+class TraceIdFilter(logging.Filter):
+    """为日志记录注入 trace_id（格式串中使用 %(trace_id)s），无活动 Trace 时为 "-" """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+
+class TracingMiddleware:
+    """
+    纯 ASGI 中间件（不缓冲响应体，SSE 流不受影响）
+
+    响应头在 http.response.start 时发送，Server-Timing 只包含此前完成的 span；
+    流式响应的完整耗时见日志中的 Trace 记录。
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope.get("path", "").startswith(UNTRACED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope.get("headers") or []:
+            if key == TRACE_HEADER.encode():
+                incoming = value.decode("latin-1")
+                break
+        with trace(incoming, method=scope.get("method"), path=scope.get("path")) as current:
+            async def send_wrapper(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    current.attrs["status"] = message.get("status")
+                    headers = list(message.get("headers") or [])
+                    headers.append((b"x-trace-id", current.trace_id.encode("latin-1")))
+                    timing = current.server_timing()
+                    elapsed = (time.perf_counter() - current.started) * 1000
+                    timing = f"{timing}, total;dur={elapsed:.1f}" if timing else f"total;dur={elapsed:.1f}"
+                    headers.append((b"server-timing", timing.encode("latin-1", "ignore")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
@@ -86,6 +86,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
     let conversationHistory = [];
     let accumulatedCode = '';
+    // 生成流连接中断时的最大续传次数
+    const MAX_RESUME_ATTEMPTS = 5;
     let placeholderInterval;
 
     function handleFormSubmit(e) {
@@ -131,23 +133,64 @@ document.addEventListener('DOMContentLoaded', () => {
             });
 
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            // 生成 ID：连接中断时用于续传；产物 ID：录制时回传以关联来源（产物目录）
+            const generationId = response.headers.get('X-Generation-Id');
+            const artifactId = response.headers.get('X-Artifact-Id');
 
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
+            let reader = response.body.getReader();
+            let decoder = new TextDecoder();
             let buffer = '';
+            let lastEventId = '0';
+            let resumeAttempts = 0;
+
+            // 读取下一段数据；连接中断或在 [DONE] 之前结束时，带 Last-Event-ID 续传（服务端重放之后的事件）
+            const readNext = async () => {
+                while (true) {
+                    try {
+                        const result = await reader.read();
+                        if (!result.done) return result;
+                    } catch (err) {
+                        if (!generationId || resumeAttempts >= MAX_RESUME_ATTEMPTS) throw err;
+                        console.warn('Stream interrupted, resuming:', err);
+                    }
+                    if (!generationId || resumeAttempts >= MAX_RESUME_ATTEMPTS) return { done: true };
+                    resumeAttempts += 1;
+                    await new Promise(resolve => setTimeout(resolve, 500 * resumeAttempts));
+                    let resumed;
+                    try {
+                        resumed = await fetch(`${config.apiBaseUrl}/generate/${encodeURIComponent(generationId)}`, {
+                            headers: { 'Last-Event-ID': lastEventId },
+                            cache: 'no-store'
+                        });
+                    } catch (err) {
+                        if (resumeAttempts >= MAX_RESUME_ATTEMPTS) throw err;
+                        continue;
+                    }
+                    if (!resumed.ok) throw new Error(`HTTP error! status: ${resumed.status}`);
+                    // 未完整收到的事件会被重放，丢弃旧连接的残余数据
+                    reader = resumed.body.getReader();
+                    decoder = new TextDecoder();
+                    buffer = '';
+                }
+            };
 
             while (true) {
-                const { done, value } = await reader.read();
+                const { done, value } = await readNext();
                 if (done) break;
 
                 buffer += decoder.decode(value, { stream: true });
-                const lines = buffer.split('\n\n');
-                buffer = lines.pop();
-
-                for (const line of lines) {
-                    if (!line.startsWith('data: ')) continue;
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+
+                for (const event of events) {
+                    let dataLine = null;
+                    for (const field of event.split('\n')) {
+                        if (field.startsWith('id: ')) lastEventId = field.substring(4);
+                        else if (field.startsWith('data: ')) dataLine = field;
+                    }
+                    if (dataLine === null) continue;
 
-                    const jsonStr = line.substring(6);
+                    const jsonStr = dataLine.substring(6);
                     if (jsonStr.includes('[DONE]')) {
                         console.log('Streaming complete');
                         conversationHistory.push({ role: 'assistant', content: accumulatedCode });
@@ -166,7 +209,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
                         try {
                             if (accumulatedCode) {
-                                appendAnimationPlayer(accumulatedCode, topic);
+                                appendAnimationPlayer(accumulatedCode, topic, artifactId);
                             }
                         } catch (err) {
                             console.error('appendAnimationPlayer failed:', err);
@@ -278,7 +321,7 @@ document.addEventListener('DOMContentLoaded', () => {
         codeBlockElement.querySelector('.code-details').removeAttribute('open');
     }
 
-    function appendAnimationPlayer(htmlContent, topic) {
+    function appendAnimationPlayer(htmlContent, topic, artifactId) {
         console.log('Appending animation player with topic:', topic);
         const node = templates.player.content.cloneNode(true);
         const playerElement = node.firstElementChild;
@@ -328,29 +371,23 @@ document.addEventListener('DOMContentLoaded', () => {
             try {
                 const htmlText = iframe?.srcdoc || htmlContent || '';
 
-                // 验证 HTML 是否完整（检查是否有 </html> 闭合标签）
-                if (!htmlText.includes('</html>')) {
-                    console.warn('警告: 生成的 HTML 代码不完整，可能导致录制问题');
-                }
-
-                // 检查是否包含 markAnimationFinished 调用
-                const hasFinishCall = /markAnimationFinished\s*\(\s*\)/.test(htmlText) &&
-                                     htmlText.split('markAnimationFinished').length > 2; // 至少2次出现（定义+调用）
-
                 const resp = await fetch('/record', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({
                         html_text: htmlText,
+                        generation_id: artifactId || undefined,
+                        topic: topic,
                         width: 1280,
                         height: 720,
                         fps: 24,
-                        wait_until: 'networkidle',
+                        wait_until: 'ready',
                         timeout: 180000,
-                        end_event: 'recording:finished',
-                        // 如果没有完成标记，使用较短的超时时间（60秒）
-                        end_timeout: hasFinishCall ? 180000 : 60000,
+                        // 结束条件由服务端预检根据 HTML 内容推导（完结事件 / 画面静止）
                         mp4: true,
+                        thumbnails: true,
+                        // 渐进式输出：录制过程中即可通过 HLS 播放，结束后合并为 MP4
+                        stream: true,
                         headless: true,
                     })
                 });
@@ -358,7 +395,45 @@ document.addEventListener('DOMContentLoaded', () => {
                     const err = await resp.json().catch(() => ({}));
                     throw new Error(err.error || `HTTP ${resp.status}`);
                 }
-                const data = await resp.json();
+                const job = await resp.json();
+
+                // 内联在线播放预览：先播放 HLS 直播流，完成后切换为 MP4
+                const container = playerElement.querySelector('.player-container');
+                let preview = playerElement.querySelector('.exported-video-preview');
+                if (!preview) {
+                    preview = document.createElement('div');
+                    preview.className = 'exported-video-preview';
+                    preview.style.cssText = 'margin-top:12px;padding:12px;border-radius:12px;background:#f7f9fc;border:1px solid #e6edf5;';
+                    const title = document.createElement('div');
+                    title.style.cssText = 'font-size:14px;color:#445;opacity:0.9;margin-bottom:8px;';
+                    const video = document.createElement('video');
+                    video.setAttribute('controls', '');
+                    video.setAttribute('preload', 'metadata');
+                    video.muted = true;
+                    video.style.width = '100%';
+                    video.style.maxHeight = '480px';
+                    video.style.borderRadius = '8px';
+                    preview.appendChild(title);
+                    preview.appendChild(video);
+                    container.appendChild(preview);
+                }
+                const previewTitle = preview.firstElementChild;
+                const video = preview.querySelector('video');
+                previewTitle.textContent = '录制中预览（实时）';
+
+                let streamAttached = false;
+                let detachStream = null;
+                const data = await waitForRecordJob(job.status_url, async (status) => {
+                    if (!streamAttached && status.playlist_ready && job.playlist_url) {
+                        streamAttached = true;
+                        detachStream = await attachLiveStream(video, job.playlist_url);
+                    }
+                });
+                if (detachStream) detachStream();
+
+                if (data.preflight && data.preflight.warnings.length) {
+                    console.warn('录制预检:', data.preflight.warnings);
+                }
                 const mp4Url = data.mp4_url || '';
                 if (!mp4Url) {
                     throw new Error('未获取到 MP4 下载地址，请检查服务端 FFmpeg 是否已安装并成功转码。');
@@ -379,32 +454,9 @@ document.addEventListener('DOMContentLoaded', () => {
                 a.click();
                 a.remove();
 
-                // 仅在生成 MP4 成功时，展示内联在线播放预览
-                if (mp4Url) {
-                    const container = playerElement.querySelector('.player-container');
-                    let preview = playerElement.querySelector('.exported-video-preview');
-                    if (!preview) {
-                        preview = document.createElement('div');
-                        preview.className = 'exported-video-preview';
-                        preview.style.cssText = 'margin-top:12px;padding:12px;border-radius:12px;background:#f7f9fc;border:1px solid #e6edf5;';
-                        const title = document.createElement('div');
-                        title.textContent = '导出视频预览（MP4）';
-                        title.style.cssText = 'font-size:14px;color:#445;opacity:0.9;margin-bottom:8px;';
-                        const video = document.createElement('video');
-                        video.setAttribute('controls', '');
-                        video.setAttribute('preload', 'metadata');
-                        video.style.width = '100%';
-                        video.style.maxHeight = '480px';
-                        video.style.borderRadius = '8px';
-                        video.src = cacheBustedMp4Url;
-                        preview.appendChild(title);
-                        preview.appendChild(video);
-                        container.appendChild(preview);
-                    } else {
-                        const video = preview.querySelector('video');
-                        if (video) video.src = cacheBustedMp4Url;
-                    }
-                }
+                previewTitle.textContent = '导出视频预览（MP4）';
+                video.poster = data.poster_url || '';
+                video.src = cacheBustedMp4Url;
             } catch (e) {
                 console.error('导出视频失败:', e);
                 showWarning((e && e.message) || '导出视频失败');
@@ -442,28 +494,19 @@ document.addEventListener('DOMContentLoaded', () => {
             try {
                 const htmlText = iframe?.srcdoc || htmlContent || '';
 
-                // 验证 HTML 是否完整
-                if (!htmlText.includes('</html>')) {
-                    console.warn('警告: 生成的 HTML 代码不完整，可能导致录制问题');
-                }
-
-                // 检查是否包含 markAnimationFinished 调用
-                const hasFinishCall = /markAnimationFinished\s*\(\s*\)/.test(htmlText) &&
-                                     htmlText.split('markAnimationFinished').length > 2;
-
                 const resp = await fetch('/record', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({
                         html_text: htmlText,
+                        generation_id: artifactId || undefined,
+                        topic: topic,
                         width: 1280,
                         height: 720,
                         fps: 24,
-                        wait_until: 'networkidle',
+                        wait_until: 'ready',
                         timeout: 180000,
-                        end_event: 'recording:finished',
-                        // 如果没有完成标记，使用较短的超时时间（60秒）
-                        end_timeout: hasFinishCall ? 180000 : 60000,
+                        // 结束条件由服务端预检根据 HTML 内容推导（完结事件 / 画面静止）
                         gif: true,
                         gif_fps: 10,
                         gif_width: 800,
@@ -475,6 +518,9 @@ document.addEventListener('DOMContentLoaded', () => {
                     throw new Error(err.error || `HTTP ${resp.status}`);
                 }
                 const data = await resp.json();
+                if (data.preflight && data.preflight.warnings.length) {
+                    console.warn('录制预检:', data.preflight.warnings);
+                }
                 const gifUrl = data.gif_url || '';
                 if (!gifUrl) {
                     throw new Error('未获取到 GIF 下载地址，请检查服务端 FFmpeg 是否已安装并成功转码。');
@@ -707,6 +753,59 @@ document.addEventListener('DOMContentLoaded', () => {
     init();
 });
 
+// 轮询渐进式录制任务，直到完成；每次状态更新时回调 onUpdate
+async function waitForRecordJob(statusUrl, onUpdate, interval = 1000) {
+    for (;;) {
+        const resp = await fetch(statusUrl, { cache: 'no-store' });
+        const status = await resp.json().catch(() => ({}));
+        if (!resp.ok || !status.ok) {
+            throw new Error(status.error || `HTTP ${resp.status}`);
+        }
+        await onUpdate(status);
+        if (status.status === 'done') return status.result;
+        if (status.status === 'failed') {
+            throw new Error((status.result && status.result.error) || '录制失败');
+        }
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+}
+
+// 播放 HLS 播放列表：Safari 等原生支持时直接播放，否则按需加载 hls.js（MSE）
+let hlsJsPromise = null;
+function loadHlsJs() {
+    if (window.Hls) return Promise.resolve(window.Hls);
+    if (!hlsJsPromise) {
+        hlsJsPromise = new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = 'https://cdnjs.cloudflare.com/ajax/libs/hls.js/1.5.13/hls.min.js';
+            script.onload = () => resolve(window.Hls);
+            script.onerror = () => { hlsJsPromise = null; reject(new Error('hls.js 加载失败')); };
+            document.head.appendChild(script);
+        });
+    }
+    return hlsJsPromise;
+}
+
+async function attachLiveStream(video, playlistUrl) {
+    if (video.canPlayType('application/vnd.apple.mpegurl')) {
+        video.src = playlistUrl;
+        video.play().catch(() => {});
+        return () => {};
+    }
+    try {
+        const Hls = await loadHlsJs();
+        if (!Hls || !Hls.isSupported()) return null;
+        const hls = new Hls({ liveDurationInfinity: true });
+        hls.loadSource(playlistUrl);
+        hls.attachMedia(video);
+        hls.on(Hls.Events.MANIFEST_PARSED, () => video.play().catch(() => {}));
+        return () => hls.destroy();
+    } catch (e) {
+        console.warn('实时预览不可用:', e);
+        return null;
+    }
+}
+
 function showWarning(message) {
     const box = document.getElementById('warning-box');
     const overlay = document.getElementById('overlay');
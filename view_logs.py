@@ -24,7 +24,64 @@ def list_all_logs():
     log_files = sorted(log_dir.glob("app_*.log"), reverse=True)
     return log_files
 
-def view_log(log_file, lines=100, level=None):
+LEVELS = ['INFO', 'WARNING', 'ERROR', 'DEBUG']
+BLOCK_SIZE = 64 * 1024
+
+def line_matches(line, level=None, keyword=None):
+    """级别 / 关键词过滤（同时支持文本行 "[ERROR]" 与 JSON 行 "level": "ERROR"）"""
+    if level and f"[{level}]" not in line and f'"level": "{level}"' not in line:
+        return False
+    if keyword and keyword.lower() not in line.lower():
+        return False
+    return True
+
+def print_line(line):
+    """按级别着色输出一行"""
+    line = line.rstrip("\r\n")
+    if "[ERROR]" in line or '"level": "ERROR"' in line:
+        print(f"\033[91m{line}\033[0m")  # 红色
+    elif "[WARNING]" in line or '"level": "WARNING"' in line:
+        print(f"\033[93m{line}\033[0m")  # 黄色
+    elif "[INFO]" in line or '"level": "INFO"' in line:
+        print(f"\033[92m{line}\033[0m")  # 绿色
+    else:
+        print(line)
+
+def reverse_lines(log_file, end=None, block_size=BLOCK_SIZE):
+    """
+    从文件末尾（或 end 偏移处）按块向前读取，逐行倒序返回
+
+    内存占用只有一个块加一行残余，与文件大小无关
+    """
+    with open(log_file, 'rb') as f:
+        pos = f.seek(0, 2) if end is None else end
+        remainder = b""
+        while pos > 0:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            chunk = f.read(size) + remainder
+            parts = chunk.split(b"\n")
+            # 第一段可能是上一块的后半行，留到下一轮拼接
+            remainder = parts[0]
+            for part in reversed(parts[1:]):
+                if part:
+                    yield part.decode('utf-8', 'replace')
+        if remainder:
+            yield remainder.decode('utf-8', 'replace')
+
+def tail_lines(log_file, lines, level=None, keyword=None, end=None):
+    """最后 N 条匹配的行（按原顺序），只读取需要的字节"""
+    found = []
+    for line in reverse_lines(log_file, end=end):
+        if line_matches(line, level, keyword):
+            found.append(line)
+            if len(found) >= lines:
+                break
+    found.reverse()
+    return found
+
+def view_log(log_file, lines=100, level=None, keyword=None):
     """查看日志文件"""
     if not log_file.exists():
         print(f"❌ 日志文件不存在: {log_file}")
@@ -33,48 +90,355 @@ def view_log(log_file, lines=100, level=None):
     print(f"\n📋 查看日志: {log_file}")
     print(f"{'=' * 80}\n")
 
-    with open(log_file, 'r', encoding='utf-8') as f:
-        all_lines = f.readlines()
+    if lines:
+        for line in tail_lines(log_file, lines, level, keyword):
+            print_line(line)
+        return
+
+    # 全部显示：顺序流式读取
+    with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if line_matches(line, level, keyword):
+                print_line(line)
 
-        # 过滤日志级别
-        if level:
-            filtered_lines = [line for line in all_lines if f"[{level}]" in line]
-            display_lines = filtered_lines[-lines:] if lines else filtered_lines
-        else:
-            display_lines = all_lines[-lines:] if lines else all_lines
-
-        for line in display_lines:
-            # 添加颜色（可选）
-            if "[ERROR]" in line:
-                print(f"\033[91m{line.rstrip()}\033[0m")  # 红色
-            elif "[WARNING]" in line:
-                print(f"\033[93m{line.rstrip()}\033[0m")  # 黄色
-            elif "[INFO]" in line:
-                print(f"\033[92m{line.rstrip()}\033[0m")  # 绿色
-            else:
-                print(line.rstrip())
-
-def search_log(log_file, keyword):
-    """搜索日志内容"""
-    if not log_file.exists():
-        print(f"❌ 日志文件不存在: {log_file}")
+def follow_log(log_file=None, lines=10, level=None, keyword=None, interval=0.5):
+    """
+    持续输出新写入的日志（类似 tail -F）
+
+    log_file 为 None 时跟随"今天"的日志，跨天自动切换到新文件；
+    文件被截断或替换（inode 变化）时从头重新读取。过滤逐行进行，内存占用恒定。
+    """
+    import os
+    import time
+
+    follow_today = log_file is None
+    current = get_today_log() if follow_today else log_file
+    print(f"\n👀 跟随日志: {current}（Ctrl+C 退出）")
+    print(f"{'=' * 80}\n")
+
+    f = None
+    inode = None
+    partial = ""
+    if current.exists():
+        f = open(current, 'r', encoding='utf-8', errors='replace')
+        end = f.seek(0, 2)
+        inode = os.fstat(f.fileno()).st_ino
+        if lines:
+            for line in tail_lines(current, lines, level, keyword, end=end):
+                print_line(line)
+
+    try:
+        while True:
+            if f is not None:
+                chunk = f.readline()
+                while chunk:
+                    if chunk.endswith("\n"):
+                        line, partial = partial + chunk, ""
+                        if line_matches(line, level, keyword):
+                            print_line(line)
+                    else:
+                        # 写入尚未完成的半行，等下次补全
+                        partial += chunk
+                    chunk = f.readline()
+                sys.stdout.flush()
+
+            time.sleep(interval)
+
+            target = get_today_log() if follow_today else current
+            if target != current:
+                print(f"\n📅 切换到新日志: {target}\n")
+            try:
+                st = os.stat(target)
+            except FileNotFoundError:
+                continue
+            rotated = target != current or f is None or st.st_ino != inode
+            truncated = f is not None and not rotated and st.st_size < f.tell()
+            if rotated or truncated:
+                if f is not None:
+                    f.close()
+                current = target
+                f = open(current, 'r', encoding='utf-8', errors='replace')
+                inode = os.fstat(f.fileno()).st_ino
+                partial = ""
+    finally:
+        if f is not None:
+            f.close()
+
+def parse_day(value, today=None):
+    """日期参数：YYYY-MM-DD / YYYYMMDD / today / yesterday / Nd（N 天前）"""
+    from datetime import timedelta
+
+    today = today or datetime.now(pytz.timezone("Asia/Shanghai")).date()
+    value = value.strip().lower()
+    if value == "today":
+        return today
+    if value == "yesterday":
+        return today - timedelta(days=1)
+    if value.endswith("d") and value[:-1].isdigit():
+        return today - timedelta(days=int(value[:-1]))
+    for fmt in ("%Y-%m-%d", "%Y%m%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"无法识别的日期: {value}（支持 YYYY-MM-DD、YYYYMMDD、today、yesterday、7d）")
+
+def logs_in_range(since=None, until=None):
+    """日期范围内的日志文件（按日期升序）"""
+    selected = []
+    for log_file in sorted(list_all_logs()):
+        stamp = log_file.stem[len("app_"):]
+        try:
+            day = datetime.strptime(stamp, "%Y%m%d").date()
+        except ValueError:
+            continue
+        if (since is None or day >= since) and (until is None or day <= until):
+            selected.append(log_file)
+    return selected
+
+def compile_pattern(keyword, regex=False):
+    """字节级正则（直接在 mmap 上匹配，不逐行解码 / 转小写）"""
+    import re
+
+    pattern = keyword.encode('utf-8') if regex else re.escape(keyword.encode('utf-8'))
+    return re.compile(pattern, re.IGNORECASE)
+
+def _map_file(log_file):
+    import mmap
+
+    with open(log_file, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _search_file(log_file, pattern_bytes, flags, limit):
+    """在单个文件上搜索（在工作进程中执行），返回匹配的整行"""
+    import re
+
+    pattern = re.compile(pattern_bytes, flags)
+    mm = _map_file(log_file)
+    if mm is None:
+        return log_file, [], False
+    found = []
+    truncated = False
+    with mm:
+        pos = 0
+        size = len(mm)
+        while pos < size:
+            m = pattern.search(mm, pos)
+            if not m:
+                break
+            start = mm.rfind(b"\n", 0, m.start()) + 1
+            end = mm.find(b"\n", m.end())
+            end = size if end == -1 else end
+            found.append(mm[start:end].decode('utf-8', 'replace'))
+            if limit and len(found) >= limit:
+                truncated = True
+                break
+            # 同一行只输出一次
+            pos = end + 1
+    return log_file, found, truncated
+
+def _run_parallel(func, log_files, *args):
+    """多个文件时用进程池并行处理（正则匹配会持有 GIL，线程无法并行）"""
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    if len(log_files) <= 1:
+        return [func(log_file, *args) for log_file in log_files]
+    workers = min(len(log_files), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, log_files, *[[arg] * len(log_files) for arg in args]))
+
+def search_logs(log_files, keyword, regex=False, limit=0):
+    """在多个日志文件中搜索（mmap + 字节正则，多文件并行）"""
+    log_files = [f for f in log_files if f.exists()]
+    if not log_files:
+        print("❌ 没有可搜索的日志文件")
         return
 
-    print(f"\n🔍 搜索关键词: '{keyword}'")
-    print(f"日志文件: {log_file}")
+    pattern = compile_pattern(keyword, regex)
+    print(f"\n🔍 搜索{'正则' if regex else '关键词'}: '{keyword}'")
+    print(f"日志文件: {', '.join(f.name for f in log_files)}")
     print(f"{'=' * 80}\n")
 
+    import re
+    highlight = re.compile(pattern.pattern.decode('utf-8'), re.IGNORECASE)
     count = 0
-    with open(log_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            if keyword.lower() in line.lower():
-                count += 1
-                # 高亮关键词
-                highlighted = line.replace(keyword, f"\033[93m{keyword}\033[0m")
-                print(highlighted.rstrip())
+    for log_file, found, truncated in _run_parallel(_search_file, log_files, pattern.pattern, pattern.flags, limit):
+        if len(log_files) > 1 and found:
+            print(f"── {log_file.name} ({len(found)}{'+' if truncated else ''})")
+        for line in found:
+            print(highlight.sub(lambda m: f"\033[93m{m.group(0)}\033[0m", line))
+        count += len(found)
 
     print(f"\n找到 {count} 条匹配记录")
 
+def search_log(log_file, keyword, regex=False):
+    """搜索日志内容"""
+    if not log_file.exists():
+        print(f"❌ 日志文件不存在: {log_file}")
+        return
+    search_logs([log_file], keyword, regex=regex)
+
+# --- 请求统计 -------------------------------------------------------------------
+
+TRACE_MARKER = b'"type": "trace"'
+
+def normalize_path(path):
+    """把路径中的 ID 段替换为 {id}，避免每个任务单独成为一个接口"""
+    import re
+
+    parts = []
+    for part in (path or "").split("/"):
+        if re.fullmatch(r"[0-9a-f]{8,}|\d+|\d{8}-\d{6}-[0-9a-f]+", part):
+            part = "{id}"
+        parts.append(part)
+    return "/".join(parts)
+
+def parse_trace_line(line):
+    """
+    从一行日志中取出 Trace 记录（tracing.Trace.emit 写入）
+
+    文本格式：... ai_animation.trace [...] - {"type": "trace", ...}
+    JSON 格式：{"logger": "ai_animation.trace", ..., "data": {"type": "trace", ...}}
+    """
+    import json
+
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', 'replace')
+    try:
+        if line.startswith("{"):
+            record = json.loads(line).get("data")
+        else:
+            record = json.loads(line[line.index('{"type": "trace"'):])
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(record, dict) or record.get("type") != "trace":
+        return None
+    return record
+
+def _collect_stats(log_file):
+    """单个文件的统计原始数据（在工作进程中执行）：{分组: {"durations": [...], "errors": n, "ttft": [...]}}"""
+    groups = {}
+
+    def bucket(key):
+        if key not in groups:
+            groups[key] = {"durations": [], "errors": 0, "server_errors": 0, "ttft": []}
+        return groups[key]
+
+    mm = _map_file(log_file)
+    if mm is None:
+        return groups
+    day = log_file.stem[len("app_"):]
+    with mm:
+        pos = 0
+        size = len(mm)
+        while True:
+            hit = mm.find(TRACE_MARKER, pos)
+            if hit == -1:
+                break
+            start = mm.rfind(b"\n", 0, hit) + 1
+            end = mm.find(b"\n", hit)
+            end = size if end == -1 else end
+            pos = end + 1
+            record = parse_trace_line(mm[start:end])
+            if record is None or record.get("name") != "request":
+                continue
+
+            status = record.get("status") or 0
+            duration = record.get("duration_ms")
+            ttft = next((span.get("attrs", {}).get("ttft_ms") for span in record.get("spans", [])
+                         if span.get("name") == "llm_stream"), None)
+            endpoint = f"{record.get('method', '')} {normalize_path(record.get('path'))}"
+            keys = [("endpoint", endpoint), ("day", day)]
+            if record.get("model"):
+                keys.append(("model", record["model"]))
+            for key in keys:
+                entry = bucket(key)
+                if duration is not None:
+                    entry["durations"].append(duration)
+                if status >= 400:
+                    entry["errors"] += 1
+                if status >= 500:
+                    entry["server_errors"] += 1
+                if ttft is not None:
+                    entry["ttft"].append(ttft)
+    return groups
+
+def percentile(sorted_values, q):
+    """线性插值百分位（sorted_values 已排序）"""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return round(sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo), 1)
+
+def summarize(groups):
+    """合并后的原始数据 -> 每个分组的请求数、错误率与耗时百分位"""
+    rows = []
+    for (kind, name), entry in sorted(groups.items()):
+        durations = sorted(entry["durations"])
+        ttft = sorted(entry["ttft"])
+        count = len(durations)
+        rows.append({
+            "group": kind,
+            "name": name,
+            "requests": count,
+            "errors": entry["errors"],
+            "error_rate": round(entry["errors"] / count, 4) if count else 0.0,
+            "server_errors": entry["server_errors"],
+            "p50_ms": percentile(durations, 0.5),
+            "p90_ms": percentile(durations, 0.9),
+            "p99_ms": percentile(durations, 0.99),
+            "max_ms": durations[-1] if durations else None,
+            "ttft_p50_ms": percentile(ttft, 0.5),
+            "ttft_p90_ms": percentile(ttft, 0.9),
+        })
+    return rows
+
+def log_stats(log_files, as_json=False):
+    """统计日志中的请求：按接口 / 模型 / 日期分组"""
+    log_files = [f for f in log_files if f.exists()]
+    if not log_files:
+        print("❌ 没有可统计的日志文件")
+        return []
+
+    groups = {}
+    for partial in _run_parallel(_collect_stats, log_files):
+        for key, entry in partial.items():
+            merged = groups.setdefault(key, {"durations": [], "errors": 0, "server_errors": 0, "ttft": []})
+            merged["durations"].extend(entry["durations"])
+            merged["ttft"].extend(entry["ttft"])
+            merged["errors"] += entry["errors"]
+            merged["server_errors"] += entry["server_errors"]
+    rows = summarize(groups)
+
+    if as_json:
+        import json
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return rows
+
+    def ms(value):
+        return "-" if value is None else f"{value:,.0f}"
+
+    print(f"\n📊 请求统计: {log_files[0].name} ~ {log_files[-1].name}（{len(log_files)} 个文件）")
+    titles = {"endpoint": "按接口", "model": "按模型", "day": "按日期"}
+    for kind in ("endpoint", "model", "day"):
+        selected = [row for row in rows if row["group"] == kind]
+        if not selected:
+            continue
+        print(f"\n{titles[kind]}")
+        print(f"{'=' * 104}")
+        print(f"{'':32s} {'请求数':>7s} {'错误率':>7s} {'5xx':>5s} {'p50':>8s} {'p90':>8s} {'p99':>8s} {'max':>8s} {'TTFT p50':>9s} {'TTFT p90':>9s}")
+        for row in selected:
+            print(f"{row['name'][:32]:32s} {row['requests']:>7d} {row['error_rate'] * 100:>6.1f}% {row['server_errors']:>5d} "
+                  f"{ms(row['p50_ms']):>8s} {ms(row['p90_ms']):>8s} {ms(row['p99_ms']):>8s} {ms(row['max_ms']):>8s} "
+                  f"{ms(row['ttft_p50_ms']):>9s} {ms(row['ttft_p90_ms']):>9s}")
+    print("\n（耗时单位 ms；/generate 为整个流式响应的耗时，TTFT 为首个 token 的耗时）\n")
+    return rows
+
 def main():
     """主函数"""
     import argparse
@@ -89,7 +453,12 @@ def main():
   python view_logs.py --all              # 查看今天所有日志
   python view_logs.py --level ERROR      # 只查看错误日志
   python view_logs.py --search "Anthropic"  # 搜索包含 Anthropic 的日志
+  python view_logs.py -F                 # 持续跟随今天的日志（跨天自动切换）
+  python view_logs.py -F -l ERROR -s 录制  # 跟随时只显示匹配的错误日志
   python view_logs.py --list             # 列出所有日志文件
+  python view_logs.py -s "超时" --since 7d  # 搜索最近 7 天的日志（多文件并行）
+  python view_logs.py -s "status\": 5\d\d" -E --since 2024-06-01 --until 2024-06-07  # 正则搜索
+  python view_logs.py --stats --since 2024-06-04 --until 2024-06-04  # 某天的请求数、错误率与耗时百分位
         """
     )
 
@@ -97,7 +466,7 @@ def main():
                       help='显示最后N行日志（默认: 100）')
     parser.add_argument('--all', '-a', action='store_true',
                       help='显示所有日志')
-    parser.add_argument('--level', '-l', choices=['INFO', 'WARNING', 'ERROR', 'DEBUG'],
+    parser.add_argument('--level', '-l', choices=LEVELS,
                       help='只显示特定级别的日志')
     parser.add_argument('--search', '-s', type=str,
                       help='搜索包含指定关键词的日志')
@@ -105,6 +474,20 @@ def main():
                       help='列出所有日志文件')
     parser.add_argument('--file', '-f', type=str,
                       help='指定日志文件（默认: 今天的日志）')
+    parser.add_argument('--regex', '-E', action='store_true',
+                      help='--search 按正则表达式匹配（忽略大小写）')
+    parser.add_argument('--since', type=str,
+                      help='起始日期（YYYY-MM-DD / YYYYMMDD / today / yesterday / 7d），搜索与统计跨多个日志文件')
+    parser.add_argument('--until', type=str,
+                      help='结束日期（含），格式同 --since')
+    parser.add_argument('--max', type=int, default=0,
+                      help='每个文件最多输出的匹配数（默认不限）')
+    parser.add_argument('--stats', action='store_true',
+                      help='统计请求数、错误率与耗时百分位（按接口 / 模型 / 日期）')
+    parser.add_argument('--json', action='store_true',
+                      help='--stats 以 JSON 输出')
+    parser.add_argument('--follow', '-F', action='store_true',
+                      help='持续输出新日志（可与 --level/--search 组合过滤）')
 
     args = parser.parse_args()
 
@@ -125,15 +508,27 @@ def main():
         print()
         return
 
-    # 确定日志文件
-    if args.file:
-        log_file = Path(args.file)
+    if args.follow:
+        follow_log(Path(args.file) if args.file else None,
+                   lines=0 if args.all else args.lines, level=args.level, keyword=args.search)
+        return
+
+    # 确定日志文件：指定日期范围时跨多个文件
+    if args.since or args.until:
+        since = parse_day(args.since) if args.since else None
+        until = parse_day(args.until) if args.until else None
+        log_files = logs_in_range(since, until)
+    elif args.file:
+        log_files = [Path(args.file)]
     else:
-        log_file = get_today_log()
+        log_files = [get_today_log()]
+    log_file = log_files[0] if log_files else get_today_log()
 
+    if args.stats:
+        log_stats(log_files, as_json=args.json)
     # 搜索模式
-    if args.search:
-        search_log(log_file, args.search)
+    elif args.search:
+        search_logs(log_files, args.search, regex=args.regex, limit=args.max)
     else:
         # 查看模式
         lines = None if args.all else args.lines